@@ -0,0 +1,79 @@
+"""Convert the stored metadata to a codec in batches.
+
+Does what the background conversion after startup does (see
+param_backfill), for running it ahead of time or switching codecs without
+starting the server: trains a compression dictionary if needed, then rewrites
+the shared graphs and every image's metadata batch by batch, one transaction
+each. --vacuum shrinks the database file afterwards, freed pages are
+otherwise only reused.
+
+Run from the backend directory:
+    python -m app.compress_metadata --codec zlib [--retrain] [--vacuum]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from sqlalchemy import text
+
+from . import config, crud, database
+from .metadata_codec import metadata_codec
+
+
+def _database_size() -> int:
+    path = database.engine.url.database
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--codec", choices=("zlib", "json"), default=config.METADATA_CODEC,
+                        help="Codec to convert to (default: GALLERYFLOW_METADATA_CODEC)")
+    parser.add_argument("--level", type=int, default=config.METADATA_COMPRESSION_LEVEL)
+    parser.add_argument("--retrain", action="store_true",
+                        help="Train a new dictionary even if there is one")
+    parser.add_argument("--batch-size", type=int, default=config.BACKFILL_BATCH_SIZE)
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+
+    metadata_codec.enabled = args.codec == "zlib"
+    metadata_codec.level = args.level
+    await database.create_db_and_tables()
+    size_before = _database_size()
+    started = time.perf_counter()
+    async with database.AsyncSessionLocal() as db:
+        await crud.load_metadata_dictionaries(db)
+        if metadata_codec.enabled and (args.retrain or not metadata_codec.dictionary_id):
+            dictionary_id = await crud.train_metadata_dictionary(db)
+            if dictionary_id is None:
+                print("Too few images to train a dictionary, compressing without one")
+            else:
+                print(f"Trained dictionary {dictionary_id}")
+        graphs = await crud.recode_metadata_graphs(db)
+        remaining = await crud.count_metadata_to_recode(db)
+    print(f"Converted {graphs} graphs; {remaining} images to convert")
+
+    processed = 0
+    last_id = 0
+    while True:
+        async with database.AsyncSessionLocal() as db:
+            count, last_id = await crud.recode_stored_metadata(db, last_id, args.batch_size)
+        if not count:
+            break
+        processed += count
+        elapsed = time.perf_counter() - started
+        print(f"\r{processed}/{remaining} images, {processed / elapsed:,.0f}/s", end="", flush=True)
+    print()
+
+    if args.vacuum:
+        async with database.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM"))
+    await database.engine.dispose()
+    print(f"Done in {time.perf_counter() - started:.1f}s; database "
+          f"{size_before / 2**20:.1f} MiB -> {_database_size() / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
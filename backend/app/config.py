@@ -0,0 +1,140 @@
+import os
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_int(name: str, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _get_int_list(name: str, default: str) -> list:
+    """Comma-separated positive integers, sorted; the default if there are none."""
+    values = set()
+    for value in os.getenv(name, default).split(","):
+        try:
+            values.add(int(value))
+        except ValueError:
+            continue
+    values = sorted(value for value in values if value > 0)
+    return values or [int(value) for value in default.split(",")]
+
+
+# --- Folder scans ---
+
+# Where metadata extraction and image probing run during scans: "thread" or
+# "process". Extraction is mostly json.loads and graph traversal, so it is
+# GIL-bound; "process" spreads it over all cores.
+SCAN_EXECUTOR = os.getenv("GALLERYFLOW_SCAN_EXECUTOR", "thread").strip().lower()
+# Number of workers (default: Python's default for the executor type)
+SCAN_WORKERS = _get_int("GALLERYFLOW_SCAN_WORKERS", None)
+# Files handed to a worker per task; larger chunks mean less IPC per file
+SCAN_CHUNK_SIZE = max(1, _get_int("GALLERYFLOW_SCAN_CHUNK_SIZE", 32))
+# Chunks that may wait in each queue of the scan pipeline (walk -> probe
+# workers -> DB writer) before the stage feeding it is paused (default: 2 per worker)
+SCAN_QUEUE_CHUNKS = _get_int("GALLERYFLOW_SCAN_QUEUE_CHUNKS", None)
+# Maximum number of folder scans running at the same time; more are queued
+SCAN_MAX_CONCURRENT_JOBS = max(1, _get_int("GALLERYFLOW_SCAN_MAX_CONCURRENT_JOBS", 2))
+# Minimum time between two scan progress updates sent to subscribers
+SCAN_PROGRESS_INTERVAL_SECONDS = _get_float("GALLERYFLOW_SCAN_PROGRESS_INTERVAL_SECONDS", 0.5)
+
+
+# --- Background maintenance ---
+
+# Rows per transaction when deriving generation-parameter columns for images
+# stored before those columns existed
+BACKFILL_BATCH_SIZE = max(1, _get_int("GALLERYFLOW_BACKFILL_BATCH_SIZE", 1000))
+
+
+# --- Metadata extraction ---
+
+# Comma-separated modules to import for their metadata_extractor.register_node_handler
+# calls, e.g. handlers for the nodes of a custom node pack
+METADATA_NODE_HANDLER_MODULES = [
+    module.strip()
+    for module in os.getenv("GALLERYFLOW_METADATA_NODE_HANDLER_MODULES", "").split(",")
+    if module.strip()
+]
+
+
+# --- Metadata storage ---
+
+# "zlib" compresses stored metadata with a dictionary trained on the library
+# (see metadata_codec); "json" stores it as plain JSON text. Either can read
+# both, and the background conversion recodes existing rows after a change.
+METADATA_CODEC = os.getenv("GALLERYFLOW_METADATA_CODEC", "json").strip().lower()
+# zlib level, 1 (fastest) to 9 (smallest)
+METADATA_COMPRESSION_LEVEL = min(9, max(1, _get_int("GALLERYFLOW_METADATA_COMPRESSION_LEVEL", 6)))
+
+
+# --- Prompt search ---
+
+# Searches matching more images than this return them newest first instead of
+# by relevance: bm25 has to score every match, which takes about a second for
+# a word found in a million images, while newest first streams from the index
+SEARCH_RANK_MAX_MATCHES = max(0, _get_int("GALLERYFLOW_SEARCH_RANK_MAX_MATCHES", 20000))
+
+
+# --- Thumbnails ---
+
+# "quality", "balanced" or "fast" (see thumbnail_generator.THUMBNAIL_PROFILES):
+# how far large sources are reduced while decoding, the resampling filter
+# and the WebP encoder effort
+THUMBNAIL_PROFILE = os.getenv("GALLERYFLOW_THUMBNAIL_PROFILE", "balanced").strip().lower()
+# Generate thumbnails in the background after scans and filesystem changes,
+# newest images first, instead of on the first request for each one (opt-in:
+# starts the thumbnail worker pool and thumbnails the whole library)
+THUMBNAIL_PREGENERATE = _get_bool("GALLERYFLOW_THUMBNAIL_PREGENERATE", False)
+# Thumbnail sizes to pre-generate; Image.thumbnail_path records the first
+THUMBNAIL_PREGENERATE_SIZES = [
+    size.strip()
+    for size in os.getenv("GALLERYFLOW_THUMBNAIL_PREGENERATE_SIZES", "medium,small").split(",")
+    if size.strip()
+] or ["medium"]
+# Width buckets for /api/thumbnail?width=: a requested width is snapped up to
+# the next bucket (or the widest), so each image has a few cached widths
+THUMBNAIL_WIDTHS = _get_int_list("GALLERYFLOW_THUMBNAIL_WIDTHS", "128,256,512,1024,2048")
+# Longest side of the "preview" rendition the image modals show
+THUMBNAIL_PREVIEW_SIZE = max(1, _get_int("GALLERYFLOW_THUMBNAIL_PREVIEW_SIZE", 2048))
+# Worker processes generating thumbnails, for requests first, then for
+# pre-generation (default: half the CPU cores, so scans and requests keep some)
+THUMBNAIL_WORKERS = _get_int("GALLERYFLOW_THUMBNAIL_WORKERS", None)
+# Disk budget of the thumbnail directory in GB (0 = unlimited); the least
+# recently used thumbnails are removed when it is exceeded
+THUMBNAIL_CACHE_MAX_GB = _get_float("GALLERYFLOW_THUMBNAIL_CACHE_MAX_GB", 0.0)
+# Remove thumbnails of deleted or changed images (and those of the old
+# per-size layout) once after startup; opt-in, as it deletes files
+THUMBNAIL_ORPHAN_SWEEP = _get_bool("GALLERYFLOW_THUMBNAIL_ORPHAN_SWEEP", False)
+# "files" (one file per thumbnail) or "pack" (appended to large pack files
+# indexed in SQLite, see thumbnail_store); thumbnails of the other store are
+# moved over by the orphan sweep (THUMBNAIL_ORPHAN_SWEEP)
+THUMBNAIL_STORE = os.getenv("GALLERYFLOW_THUMBNAIL_STORE", "files").strip().lower()
+
+
+# --- Folder watcher ---
+
+# Watch registered folders for new/changed/deleted images while the app runs
+WATCHER_ENABLED = _get_bool("GALLERYFLOW_WATCHER_ENABLED", True)
+# "auto" uses native OS events (inotify etc. via watchdog) when available,
+# "native" requires them, "polling" always polls directory mtimes
+WATCHER_BACKEND = os.getenv("GALLERYFLOW_WATCHER_BACKEND", "auto").strip().lower()
+# Quiet period after the last event before changes are applied
+WATCHER_DEBOUNCE_SECONDS = _get_float("GALLERYFLOW_WATCHER_DEBOUNCE_SECONDS", 0.5)
+# Upper bound on how long a continuous stream of events can delay a flush
+WATCHER_MAX_DELAY_SECONDS = _get_float("GALLERYFLOW_WATCHER_MAX_DELAY_SECONDS", 2.0)
+# Interval between directory checks in polling mode
+WATCHER_POLL_INTERVAL_SECONDS = _get_float("GALLERYFLOW_WATCHER_POLL_INTERVAL_SECONDS", 2.0)
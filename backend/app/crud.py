@@ -1,18 +1,21 @@
 # File: backend/app/crud.py
 
+import asyncio
+import concurrent.futures
+import itertools
 import logging
+import os
+import time
 from pathlib import Path
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 # Import func for count and sorting
-from sqlalchemy import delete, func, asc, desc, or_
+from sqlalchemy import String, and_, bindparam, case, delete, exists, func, asc, desc, or_, text, tuple_, type_coerce, update
 from sqlalchemy.dialects.sqlite import insert
-from typing import List, Optional
-import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
-from . import models, schemas, metadata_extractor
-from .thumbnail_generator import thumbnail_generator
+from . import config, models, schemas, file_scanner, metadata_codec, metadata_extractor, metadata_graphs, scan_progress
 
 logger = logging.getLogger(__name__)
 
@@ -53,12 +56,82 @@ async def delete_folder(db: AsyncSession, folder_id: int) -> bool:
     """Delete the Folder with the given folder_id. Returns True if deleted, False if not found."""
     folder = await get_folder(db, folder_id)
     if folder:
+        # Images are deleted through the ORM cascade, their LoRA rows and
+        # search index rows in bulk
+        image_ids = select(models.Image.id).where(models.Image.folder_id == folder_id)
+        await db.execute(
+            delete(models.ImageLora).where(models.ImageLora.image_id.in_(image_ids))
+        )
+        await _delete_search_rows(db, image_ids)
         await db.delete(folder)
+        await db.flush()
+        await delete_unreferenced_metadata_graphs(db)
         await db.commit()
         return True
     return False
 
 
+# --- Scan Job CRUD ---
+
+async def create_scan_job(
+        db: AsyncSession,
+        folder_id: int,
+        force_full: bool = False) -> models.ScanJob:
+    """Create a queued ScanJob for a folder and return it."""
+    db_job = models.ScanJob(
+        folder_id=folder_id,
+        status="queued",
+        force_full=force_full,
+        created_at=datetime.now(timezone.utc)
+    )
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
+
+
+async def get_scan_job(db: AsyncSession, job_id: int) -> models.ScanJob | None:
+    """Return the ScanJob for a given job_id, or None if not found."""
+    result = await db.execute(select(models.ScanJob).filter(models.ScanJob.id == job_id))
+    return result.scalars().first()
+
+
+async def get_scan_jobs(
+        db: AsyncSession,
+        folder_id: Optional[int] = None,
+        limit: int = 50) -> list[models.ScanJob]:
+    """Return the most recent ScanJobs, optionally only those of one folder."""
+    query = select(models.ScanJob)
+    if folder_id is not None:
+        query = query.filter(models.ScanJob.folder_id == folder_id)
+    result = await db.execute(
+        query.order_by(desc(models.ScanJob.created_at), desc(models.ScanJob.id)).limit(limit))
+    return result.scalars().all()
+
+
+async def update_scan_job(db: AsyncSession, job_id: int, **fields) -> models.ScanJob | None:
+    """Set the given columns on a ScanJob and return the updated job."""
+    job = await get_scan_job(db, job_id)
+    if job is None:
+        return None
+    for field, value in fields.items():
+        setattr(job, field, value)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def fail_unfinished_scan_jobs(db: AsyncSession, error: str) -> int:
+    """Mark queued/running jobs left over from a previous process as failed."""
+    result = await db.execute(
+        update(models.ScanJob)
+        .where(models.ScanJob.status.in_(["queued", "running"]))
+        .values(status="failed", error=error, finished_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+    return result.rowcount or 0
+
+
 # --- Image CRUD --- (Modify get_images_by_folder)
 
 # UPDATE this function
@@ -66,6 +139,60 @@ SUPPORTED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'}
 BATCH_SIZE = 500  # For batch processing
 
 
+def generation_param_filters(
+    model: Optional[str] = None,
+    sampler: Optional[str] = None,
+    seed: Optional[int] = None,
+    cfg_min: Optional[float] = None,
+    cfg_max: Optional[float] = None,
+    lora: Optional[str] = None
+) -> List[Any]:
+    """Return the WHERE criteria on Image for the given generation parameters."""
+    criteria = []
+    if model is not None:
+        criteria.append(models.Image.model == model)
+    if sampler is not None:
+        criteria.append(models.Image.sampler == sampler)
+    if seed is not None:
+        criteria.append(models.Image.seed == metadata_extractor.seed_to_db(seed))
+    if cfg_min is not None:
+        criteria.append(models.Image.cfg >= cfg_min)
+    if cfg_max is not None:
+        criteria.append(models.Image.cfg <= cfg_max)
+    if lora is not None:
+        criteria.append(models.Image.id.in_(
+            select(models.ImageLora.image_id).filter(models.ImageLora.name == lora)))
+    return criteria
+
+
+# Fields that can be requested with `fields=`, and shorthands for groups of them
+IMAGE_FIELDS = tuple(schemas.ImageFields.model_fields)
+IMAGE_FIELD_ALIASES = {
+    "metadata": ("metadata_",),
+    "thumbnail": ("has_thumbnail", "thumbnail_path", "placeholder"),
+    "graph": ("graph_hash", "metadata_delta"),
+}
+
+
+def resolve_image_fields(names: Iterable[str]) -> List[str]:
+    """Expand requested field names and aliases into image columns, always including id.
+
+    Raises ValueError for unknown names.
+    """
+    fields = ["id"]
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        expanded = IMAGE_FIELD_ALIASES.get(name, (name,))
+        for field in expanded:
+            if field not in IMAGE_FIELDS:
+                raise ValueError(f"Unknown field '{name}'")
+            if field not in fields:
+                fields.append(field)
+    return fields
+
+
 async def get_images_by_folder(
     db: AsyncSession,
     folder_id: int,
@@ -73,10 +200,25 @@ async def get_images_by_folder(
     limit: int = 100,
     sort_by: str = "filename",
     sort_dir: str = "asc",
-    file_types: Optional[List[str]] = None
-) -> schemas.ImageListResponse:
+    file_types: Optional[List[str]] = None,
+    model: Optional[str] = None,
+    sampler: Optional[str] = None,
+    seed: Optional[int] = None,
+    cfg_min: Optional[float] = None,
+    cfg_max: Optional[float] = None,
+    lora: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> schemas.ImageListResponse | schemas.ImageFieldsListResponse:
+    """Return a page of a folder's images and the total number matching the filters.
+
+    With `fields` (see resolve_image_fields) only those columns are read and
+    an ImageFieldsListResponse is returned; in particular the metadata graph,
+    by far the largest column, is skipped unless it is asked for.
+    """
     folder = await get_folder(db, folder_id)
     if not folder:
+        if fields is not None:
+            return schemas.ImageFieldsListResponse(images=[], total_count=0)
         return schemas.ImageListResponse(images=[], total_count=0)
 
     allowed_sort_fields = {
@@ -105,6 +247,11 @@ async def get_images_by_folder(
         ]
         base_query = base_query.filter(or_(*file_type_conditions))
 
+    # Generation parameter filters; each one can seek an index
+    # (idx_image_folder_<param>, idx_image_lora_name_image)
+    base_query = base_query.filter(*generation_param_filters(
+        model=model, sampler=sampler, seed=seed, cfg_min=cfg_min, cfg_max=cfg_max, lora=lora))
+
     # Get total count
     count_query = select(func.count()).select_from(base_query.subquery())
     count_result = await db.execute(count_query)
@@ -118,11 +265,59 @@ async def get_images_by_folder(
         .limit(limit)
     )
 
+    if fields is not None:
+        images = await _select_image_fields(db, images_query, fields)
+        return schemas.ImageFieldsListResponse(images=images, total_count=total_count)
+
     images_result = await db.execute(images_query)
     images = images_result.scalars().all()
 
     return schemas.ImageListResponse(images=images, total_count=total_count)
 
+
+async def _select_image_fields(
+        db: AsyncSession,
+        images_query,
+        fields: List[str]) -> List[schemas.ImageFields]:
+    """Run a select of images reading only the columns behind `fields`."""
+    columns = []
+    for field in fields:
+        if field == "metadata_":
+            columns += [models.Image.metadata_json.label("_metadata_json"),
+                        models.Image.graph_id.label("_graph_id"),
+                        models.Image.metadata_delta.label("_metadata_delta")]
+        elif field == "graph_hash":
+            columns.append(models.MetadataGraph.hash.label(field))
+        else:
+            columns.append(getattr(models.Image, field).label(field))
+    images_query = images_query.with_only_columns(*columns)
+    if "graph_hash" in fields:
+        images_query = images_query.outerjoin(
+            models.MetadataGraph, models.Image.graph_id == models.MetadataGraph.id)
+    rows = (await db.execute(images_query)).all()
+    if "metadata_" not in fields:
+        return [schemas.ImageFields(**row._mapping) for row in rows]
+
+    graphs = await _get_metadata_graphs(db, {row._graph_id for row in rows})
+    images = []
+    for row in rows:
+        values = {field: getattr(row, field) for field in fields if field != "metadata_"}
+        values["metadata_"] = _row_metadata(
+            row._metadata_json, row._graph_id, row._metadata_delta, graphs)
+        images.append(schemas.ImageFields(**values))
+    return images
+
+
+async def get_image_metadata(db: AsyncSession, image_id: int) -> schemas.ImageMetadata | None:
+    """Return the metadata graph of one image, with the hash of its shared graph."""
+    image = await db.get(models.Image, image_id)
+    if image is None:
+        return None
+    return schemas.ImageMetadata(
+        id=image.id,
+        metadata_=image.metadata_,
+        graph_hash=image.graph.hash if image.graph is not None else None)
+
 # --- Keep other image functions (get_image_by_path, create_or_update_image, remove_image_by_path) ---
 
 
@@ -173,15 +368,366 @@ async def create_or_update_image(
 
 
 async def remove_image_by_path(db: AsyncSession, full_path: str):
-    await db.execute(delete(models.Image).where(models.Image.full_path == full_path))
+    await _delete_images(db, models.Image.full_path == full_path)
+    await db.commit()
+
+
+async def _delete_images(db: AsyncSession, *criteria) -> int:
+    """Delete the images matching `criteria` together with their LoRA and search rows.
+
+    SQLite does not enforce foreign keys unless asked to, so child rows are
+    deleted explicitly. Returns the number of images deleted; does not commit.
+    """
+    image_ids = select(models.Image.id).where(*criteria)
+    await db.execute(
+        delete(models.ImageLora).where(models.ImageLora.image_id.in_(image_ids))
+    )
+    await _delete_search_rows(db, image_ids)
+    result = await db.execute(delete(models.Image).where(*criteria))
+    return result.rowcount or 0
+
+
+# --- Directory Manifest ---
+
+# Directories modified less than this many seconds before a scan started are
+# listed again on the next scan, in case they changed within the same mtime tick
+MANIFEST_MTIME_SLACK = 2.0
+
+
+def _direct_children_filter(directory: str):
+    """SQL condition matching images stored directly inside `directory`.
+
+    Expressed as a range on full_path so SQLite can seek idx_image_full_path;
+    the instr() check then drops rows that live in subdirectories.
+    """
+    prefix = os.path.join(directory, '')
+    upper = prefix[:-1] + chr(ord(os.sep) + 1)
+    return and_(
+        models.Image.full_path >= prefix,
+        models.Image.full_path < upper,
+        func.instr(func.substr(models.Image.full_path, len(prefix) + 1), os.sep) == 0
+    )
+
+
+async def get_directory_manifest(
+        db: AsyncSession,
+        folder_id: int) -> Dict[str, Tuple[Optional[float], int]]:
+    """Return directory path -> (mtime, entry_count) recorded by the last scan of a folder."""
+    result = await db.execute(
+        select(
+            models.DirectoryManifest.path,
+            models.DirectoryManifest.mtime,
+            models.DirectoryManifest.entry_count)
+        .filter(models.DirectoryManifest.folder_id == folder_id)
+    )
+    return {row.path: (row.mtime, row.entry_count) for row in result.all()}
+
+
+async def save_directory_manifest(
+    db: AsyncSession,
+    folder_id: int,
+    listed_dirs: Dict[str, Tuple[Optional[float], int]],
+    stale_dirs: Iterable[str] = (),
+    replace: bool = False
+):
+    """Upsert manifest rows for the directories listed by a scan and drop stale ones.
+
+    With `replace`, every existing row of the folder is dropped first (full scans).
+    """
+    if replace:
+        await db.execute(
+            delete(models.DirectoryManifest)
+            .where(models.DirectoryManifest.folder_id == folder_id)
+        )
+    stale_dirs = list(stale_dirs)
+    for i in range(0, len(stale_dirs), BATCH_SIZE):
+        await db.execute(
+            delete(models.DirectoryManifest).where(
+                models.DirectoryManifest.folder_id == folder_id,
+                models.DirectoryManifest.path.in_(stale_dirs[i:i + BATCH_SIZE]))
+        )
+    rows = [
+        {'folder_id': folder_id, 'path': path, 'mtime': mtime, 'entry_count': count}
+        for path, (mtime, count) in listed_dirs.items()
+    ]
+    for i in range(0, len(rows), BATCH_SIZE):
+        stmt = insert(models.DirectoryManifest).values(rows[i:i + BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['folder_id', 'path'],
+            set_={
+                'mtime': stmt.excluded.mtime,
+                'entry_count': stmt.excluded.entry_count,
+            }
+        )
+        await db.execute(stmt)
     await db.commit()
 
 
-# --- Scan Logic --- (Modify scan_folder_and_update_db)
+async def _get_existing_images(
+        db: AsyncSession,
+        paths: List[str],
+        folder_id: Optional[int] = None) -> Dict[str, Tuple[Optional[datetime], Optional[int]]]:
+    """Return full_path -> (last_modified, file_size) for those `paths` that are in the DB."""
+    existing = {}
+    for i in range(0, len(paths), BATCH_SIZE):
+        query = select(
+            models.Image.full_path,
+            models.Image.last_modified,
+            models.Image.file_size
+        ).filter(models.Image.full_path.in_(paths[i:i + BATCH_SIZE]))
+        if folder_id is not None:
+            query = query.filter(models.Image.folder_id == folder_id)
+        result = await db.execute(query)
+        for row in result.all():
+            existing[row.full_path] = (_normalize_mod_time(row.last_modified), row.file_size)
+    return existing
+
+
+async def _count_directory_images(db: AsyncSession, folder_id: int, directory: str) -> int:
+    """Number of images of a folder directly inside `directory`."""
+    result = await db.execute(
+        select(func.count()).select_from(models.Image).filter(
+            models.Image.folder_id == folder_id,
+            _direct_children_filter(directory))
+    )
+    return result.scalar_one()
+
+
+async def _get_directory_image_paths(
+        db: AsyncSession,
+        folder_id: int,
+        directory: str,
+        after: str = '') -> List[str]:
+    """Return up to BATCH_SIZE paths of a folder's images directly inside `directory`,
+    in path order, starting after the path `after` (keyset pagination)."""
+    result = await db.execute(
+        select(models.Image.full_path).filter(
+            models.Image.folder_id == folder_id,
+            _direct_children_filter(directory),
+            models.Image.full_path > after)
+        .order_by(models.Image.full_path)
+        .limit(BATCH_SIZE)
+    )
+    return list(result.scalars().all())
+
+
+async def _get_image_directories(db: AsyncSession, folder_id: int) -> List[str]:
+    """Return every directory (with trailing separator) that holds images of a folder in the DB."""
+    # rtrim(path, <path without separators>) strips the filename, keeping "dir/"
+    directory = func.rtrim(
+        models.Image.full_path,
+        func.replace(models.Image.full_path, os.sep, ''))
+    result = await db.execute(
+        select(directory).distinct().filter(models.Image.folder_id == folder_id)
+    )
+    return list(result.scalars().all())
+
+
+class _PendingImage(NamedTuple):
+    """A new or changed file waiting for its probe results."""
+    entry: file_scanner.FileEntry
+    last_modified_dt: datetime
+    status: str  # 'added' or 'updated'
+    directory: str
+
+
+async def _probe_chunk(chunk: List[_PendingImage]) -> List[Optional[file_scanner.ProbeResult]]:
+    """Run probe_image_files for a chunk in the shared scan executor (threads or processes)."""
+    loop = asyncio.get_running_loop()
+    paths = [item.entry.path for item in chunk]
+    try:
+        future = loop.run_in_executor(
+            file_scanner.get_probe_executor(), file_scanner.probe_image_files, paths)
+    except concurrent.futures.BrokenExecutor:
+        # A worker process died (e.g. killed by the OS); start a fresh pool once
+        logger.warning("Scan worker pool is broken, restarting it")
+        file_scanner.shutdown_probe_executor()
+        future = loop.run_in_executor(
+            file_scanner.get_probe_executor(), file_scanner.probe_image_files, paths)
+    return await future
+
+
+class _ProbePipeline:
+    """Streams files that need probing through the scan workers into the DB.
+
+        producer --probe queue--> probe workers --write queue--> batch writer
+
+    Both queues hold at most SCAN_QUEUE_CHUNKS chunks, so a producer that finds
+    files faster than they can be probed, or workers that probe faster than the
+    DB can write, are paused instead of piling up work in memory: memory use
+    depends on the worker count, SCAN_CHUNK_SIZE and BATCH_SIZE, not on the
+    number of files. The producer and the writer share one session, so every
+    DB access of either must hold `db_lock`.
+
+    Fills the added/updated/skipped/processed counters in `stats` plus the
+    peak_memory_bytes, queue_capacity and peak_*_queue_depth statistics.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        folder_id: int,
+        stats: Dict[str, int],
+        on_progress: Optional[Callable[[], None]] = None
+    ):
+        self.db = db
+        self.db_lock = asyncio.Lock()
+        self.folder_id = folder_id
+        self.stats = stats
+        self.on_progress = on_progress
+        self.workers = file_scanner.get_probe_worker_count()
+        capacity = config.SCAN_QUEUE_CHUNKS or 2 * self.workers
+        self.probe_queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self.write_queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        # Directories with files that could not be processed
+        self.failed_dirs: Set[str] = set()
+        self._chunk: List[_PendingImage] = []
+        stats.update(
+            queue_capacity=capacity,
+            peak_probe_queue_depth=0,
+            peak_write_queue_depth=0,
+            peak_memory_bytes=None)
+        self.sample_memory()
+
+    def sample_memory(self):
+        rss = file_scanner.current_rss_bytes()
+        if rss is not None and rss > (self.stats['peak_memory_bytes'] or 0):
+            self.stats['peak_memory_bytes'] = rss
+
+    async def add(self, item: _PendingImage):
+        """Queue a file for probing; waits while the probe queue is full."""
+        self._chunk.append(item)
+        if len(self._chunk) >= config.SCAN_CHUNK_SIZE:
+            await self._put_chunk()
+
+    async def _put_chunk(self):
+        chunk, self._chunk = self._chunk, []
+        await self.probe_queue.put(chunk)
+        self.stats['peak_probe_queue_depth'] = max(
+            self.stats['peak_probe_queue_depth'], self.probe_queue.qsize())
+
+    async def run(self, produce: Callable[[], Awaitable[None]]):
+        """Run `produce` (which calls add() for every file) until everything is written.
+
+        If any stage fails, the others are cancelled and the error is raised.
+        """
+        async def producer():
+            await produce()
+            if self._chunk:
+                await self._put_chunk()
+            for _ in range(self.workers):
+                await self.probe_queue.put(None)
+
+        tasks = [asyncio.create_task(producer()), asyncio.create_task(self._write_results())]
+        tasks.extend(asyncio.create_task(self._probe_worker()) for _ in range(self.workers))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.sample_memory()
+
+    async def _probe_worker(self):
+        while (chunk := await self.probe_queue.get()) is not None:
+            try:
+                results = await _probe_chunk(chunk)
+            except Exception as e:
+                logger.error(f"Scan worker failed on a chunk of {len(chunk)} files: {e}")
+                results = [None] * len(chunk)
+            await self.write_queue.put((chunk, results))
+            self.stats['peak_write_queue_depth'] = max(
+                self.stats['peak_write_queue_depth'], self.write_queue.qsize())
+        await self.write_queue.put(None)
+
+    async def _write_results(self):
+        batch = []
+        running_workers = self.workers
+        while running_workers:
+            item = await self.write_queue.get()
+            if item is None:
+                running_workers -= 1
+                continue
+            chunk, results = item
+            for pending, probe in zip(chunk, results):
+                self.stats['processed_count'] += 1
+                if probe is None:
+                    self.stats['skipped_count'] += 1
+                    self.failed_dirs.add(pending.directory)
+                    continue
+                batch.append(schemas.ImageCreate(
+                    filename=pending.entry.name,
+                    full_path=pending.entry.path,
+                    last_modified=pending.last_modified_dt,
+                    metadata_=probe.metadata,
+                    folder_id=self.folder_id,
+                    width=probe.width,
+                    height=probe.height,
+                    file_size=pending.entry.size
+                ))
+                self.stats[f'{pending.status}_count'] += 1
+            if self.on_progress:
+                self.on_progress()
+            if len(batch) >= BATCH_SIZE:
+                await self._write_batch(batch)
+                batch = []
+        # Process any remaining items in the batch
+        if batch:
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[schemas.ImageCreate]):
+        async with self.db_lock:
+            await process_image_batch(self.db, batch)
+        self.sample_memory()
+
+
+def _take_walk_items(stream: Iterator, limit: int = BATCH_SIZE) -> list:
+    """Pull up to `limit` items off a walk_directories stream.
+
+    Runs in a worker thread, so directory I/O (slow on network shares) does not
+    block the event loop.
+    """
+    return list(itertools.islice(stream, limit))
+
+
+def _missing_paths(paths: List[str]) -> List[str]:
+    return [path for path in paths if not os.path.lexists(path)]
+
+
+def _is_unchanged(
+        existing: Tuple[Optional[datetime], Optional[int]],
+        last_modified_dt: datetime,
+        size: int) -> bool:
+    """True if a DB snapshot entry still matches the file's mtime and size."""
+    existing_mod_time, existing_size = existing
+    return (existing_mod_time is not None
+            and last_modified_dt <= existing_mod_time
+            and (existing_size is None or existing_size == size))
+
+
+def _normalize_mod_time(existing_mod_time: Optional[datetime]) -> Optional[datetime]:
+    if existing_mod_time is not None and existing_mod_time.tzinfo is None:
+        existing_mod_time = existing_mod_time.replace(tzinfo=timezone.utc)
+    return existing_mod_time
+
+
+# --- Scan Logic ---
 async def scan_folder_and_update_db(
     db: AsyncSession,
-    folder: models.Folder
+    folder: models.Folder,
+    force_full: bool = False,
+    report_progress: bool = True
 ) -> schemas.ScanStatus:
+    """Scan a folder and bring its images in the DB in line with the disk.
+
+    Rescans are incremental: directories whose mtime matches the manifest from
+    the previous scan are not listed again. `force_full` ignores the manifest and
+    re-lists every directory (needed to notice files rewritten in place).
+    Progress is published to scan_progress_broker unless `report_progress` is False.
+    """
     logger.info(f"Starting scan for folder: {folder.path}")
     base_path = Path(folder.path)
     if not base_path.is_dir():
@@ -196,174 +742,1045 @@ async def scan_folder_and_update_db(
         'removed_count': 0,
         'skipped_count': 0,
         'processed_count': 0,
-        'total_files': 0
+        'total_files': 0,
+        'directories_listed': 0,
+        'directories_unchanged': 0
     }
 
-    # Get existing images for this folder
-    result = await db.execute(
-        select(models.Image.full_path, models.Image.last_modified)
-        .filter(models.Image.folder_id == folder.id)
+    reporter = scan_progress.ScanProgressReporter(folder.id) if report_progress else None
+    try:
+        await _scan_folder(db, folder, force_full, stats, reporter)
+    except asyncio.CancelledError:
+        if reporter:
+            reporter.finish(stats, state="cancelled", message="Scan cancelled")
+        raise
+    except Exception as e:
+        if reporter:
+            reporter.finish(stats, state="failed", message=f"Scan failed: {e}")
+        raise
+    if reporter:
+        reporter.finish(stats, message="Scan completed successfully")
+
+    logger.info(
+        f"Scan complete for {folder.path}. "
+        f"Added: {stats['added_count']}, "
+        f"Updated: {stats['updated_count']}, "
+        f"Removed: {stats['removed_count']}, "
+        f"Skipped: {stats['skipped_count']}, "
+        f"Directories listed: {stats['directories_listed']}, "
+        f"unchanged: {stats['directories_unchanged']}"
     )
-    existing_db_images = {
-        row.full_path: row.last_modified for row in result.all()}
-    found_on_disk = set()
 
-    # First, count total files for progress tracking
-    stats['total_files'] = sum(1 for _ in base_path.rglob(
-        '*') if _.is_file() and _.suffix.lower() in SUPPORTED_EXTENSIONS)
+    return schemas.ScanStatus(
+        message="Scan completed successfully",
+        **stats
+    )
 
-    # Gather all image files to process
-    image_files = [item for item in base_path.rglob(
-        '*') if item.is_file() and item.suffix.lower() in SUPPORTED_EXTENSIONS]
 
-    # PRE-POPULATE found_on_disk with all existing files
-    # This guarantees we never accidentally delete a file just because it was 'skipped' during metadata extraction
-    found_on_disk = {str(item.resolve()) for item in image_files}
+async def _scan_folder(
+    db: AsyncSession,
+    folder: models.Folder,
+    force_full: bool,
+    stats: Dict[str, int],
+    reporter: Optional[scan_progress.ScanProgressReporter]
+):
+    """The body of scan_folder_and_update_db; updates `stats` in place.
 
-    def process_image(item):
-        full_path_str = str(item.resolve())
-        try:
-            last_modified_timestamp = item.stat().st_mtime
-            last_modified_dt = datetime.fromtimestamp(
-                last_modified_timestamp, tz=timezone.utc)
-            existing_mod_time = existing_db_images.get(full_path_str)
-            if existing_mod_time is not None and existing_mod_time.tzinfo is None:
-                existing_mod_time = existing_mod_time.replace(
-                    tzinfo=timezone.utc)
-            if existing_mod_time is not None and last_modified_dt <= existing_mod_time:
-                return None, 'skipped'
-            metadata = metadata_extractor.extract_comfyui_metadata(
-                full_path_str)
-            image_data = schemas.ImageCreate(
-                filename=item.name,
-                full_path=full_path_str,
-                last_modified=last_modified_dt,
-                metadata_=metadata,
-                folder_id=folder.id
-            )
-            try:
-                width, height = thumbnail_generator.get_image_dimensions(
-                    full_path_str)
-                file_size = thumbnail_generator.get_file_size(full_path_str)
-                image_data.width = width
-                image_data.height = height
-                image_data.file_size = file_size
-            except Exception as e:
-                logger.debug(
-                    f"Could not add performance fields for {full_path_str}: {e}")
-            return image_data, 'added' if existing_mod_time is None else 'updated'
-        except Exception as e:
-            logger.error(f"Error processing file {item}: {e}")
-            return None, 'skipped'
-
-    batch = []
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(
-                process_image,
-                item): item for item in image_files}
-        for idx, future in enumerate(concurrent.futures.as_completed(futures)):
-            image_data, status = future.result()
-            stats['processed_count'] += 1
-            if image_data:
-                batch.append(image_data)
-                if status == 'added':
-                    stats['added_count'] += 1
-                elif status == 'updated':
-                    stats['updated_count'] += 1
-            else:
+    Nothing here is kept per file: the walk is streamed, files are compared to
+    the DB a batch at a time and images that disappeared are deleted in batches
+    as the walk goes on. Only per-directory state (manifest entries) grows with
+    the size of the folder.
+    """
+    # total_files is final (and an ETA meaningful) only once the walk is done;
+    # the pipeline's writer reports while it is still running
+    walk_done = False
+
+    def report():
+        if reporter:
+            reporter.update(stats, walk_complete=walk_done)
+
+    scan_started = time.time()
+    manifest = {} if force_full else await get_directory_manifest(db, folder.id)
+    full_scan = not manifest
+    pipeline = _ProbePipeline(db, folder.id, stats, on_progress=report)
+
+    # Manifest entries for the directories listed during this scan
+    listed_dirs = {}
+    seen_dirs = set()
+    # Images in the DB that are not on disk any more. Files merely 'skipped'
+    # during metadata extraction are never in here. They are only deleted once
+    # the walk has found files (see the safety check below).
+    pending_removals = []
+
+    async def remove_pending():
+        async with pipeline.db_lock:
+            for i in range(0, len(pending_removals), BATCH_SIZE):
+                batch_paths = pending_removals[i:i + BATCH_SIZE]
+                await _delete_images(db, models.Image.full_path.in_(batch_paths))
+                await db.commit()
+        stats['removed_count'] += len(pending_removals)
+        pending_removals.clear()
+
+    # State of the directory currently being listed
+    db_count = 0
+    matched = 0
+    # Symlinked files are stored under their target's path, which may be in
+    # another directory, even outside the folder
+    root = os.path.realpath(folder.path)
+    linked_paths = set()
+
+    async def compare_files(files: List[file_scanner.FileEntry], directory: str):
+        """Skip unchanged files and queue new or changed ones for probing."""
+        nonlocal matched
+        stats['total_files'] += len(files)
+        async with pipeline.db_lock:
+            existing_db_images = await _get_existing_images(
+                db, [entry.path for entry in files], folder.id)
+        matched += sum(1 for path in existing_db_images if os.path.dirname(path) == directory)
+        linked_paths.update(entry.path for entry in files if os.path.dirname(entry.path) != directory)
+        for entry in files:
+            last_modified_dt = datetime.fromtimestamp(entry.mtime, tz=timezone.utc)
+            existing = existing_db_images.get(entry.path)
+            if existing is not None and _is_unchanged(existing, last_modified_dt, entry.size):
+                stats['processed_count'] += 1
                 stats['skipped_count'] += 1
-            if len(batch) >= BATCH_SIZE:
-                await process_image_batch(db, batch)
-                batch = []
-        # Process any remaining items in the batch
-        if batch:
-            await process_image_batch(db, batch)
+                continue
+            status = 'added' if existing is None else 'updated'
+            await pipeline.add(_PendingImage(entry, last_modified_dt, status, directory))
+
+    async def finish_directory(done: file_scanner.DirectoryDone):
+        """Find images that are gone from a directory that was just listed."""
+        if not done.complete:
+            pipeline.failed_dirs.add(done.path)
+        elif db_count > matched:
+            # The DB has images that were not listed. Only those paths are
+            # checked on disk again, rather than remembering every listed file.
+            after = ''
+            while True:
+                async with pipeline.db_lock:
+                    paths = await _get_directory_image_paths(db, folder.id, done.path, after)
+                if not paths:
+                    break
+                after = paths[-1]
+                pending_removals.extend(await asyncio.to_thread(_missing_paths, paths))
+                if len(pending_removals) >= BATCH_SIZE and stats['total_files'] > 0:
+                    await remove_pending()
+
+    async def produce():
+        nonlocal db_count, matched, walk_done
+        current = None
+        files = []
+        stream = file_scanner.walk_directories(folder.path, SUPPORTED_EXTENSIONS, manifest)
+        while items := await asyncio.to_thread(_take_walk_items, stream):
+            for item in items:
+                if isinstance(item, file_scanner.FileEntry):
+                    files.append(item)
+                    continue
+                if files:
+                    await compare_files(files, current.path)
+                    files = []
+                if isinstance(item, file_scanner.DirectoryDone):
+                    stats['directories_listed'] += 1
+                    listed_dirs[item.path] = (current.mtime, item.entry_count)
+                    await finish_directory(item)
+                    report()
+                    continue
+                seen_dirs.add(item.path)
+                if item.listed:
+                    current = item
+                    matched = 0
+                    async with pipeline.db_lock:
+                        db_count = await _count_directory_images(db, folder.id, item.path)
+                    continue
+                stats['directories_unchanged'] += 1
+                stats['total_files'] += item.entry_count
+                stats['processed_count'] += item.entry_count
+                stats['skipped_count'] += item.entry_count
+                report()
+            if files:
+                await compare_files(files, current.path)
+                files = []
+        walk_done = True
+
+    # Single pass over the tree: unchanged directories are only stat()ed,
+    # unchanged files are skipped right away and changed ones flow through the
+    # probe workers into the DB while the walk continues
+    await pipeline.run(produce)
+    dirty_dirs = pipeline.failed_dirs
+
+    # Directories that were not visited at all (deleted or moved away)
+    if full_scan:
+        gone_dirs = []
+        for directory in await _get_image_directories(db, folder.id):
+            if os.path.dirname(directory) in seen_dirs:
+                continue
+            if directory.startswith(os.path.join(root, '')):
+                gone_dirs.append(directory)
+                continue
+            # Targets of symlinked files outside the folder: gone with their link
+            after = ''
+            while paths := await _get_directory_image_paths(db, folder.id, directory, after):
+                after = paths[-1]
+                pending_removals.extend(path for path in paths if path not in linked_paths)
+    else:
+        gone_dirs = [directory for directory in manifest if directory not in seen_dirs]
 
-    # Remove images that no longer exist on disk
-    db_paths = set(existing_db_images.keys())
-    paths_to_remove = db_paths - found_on_disk
-    
     # SAFETY CHECK: If we found NO files on disk, but the database previously had
     # files for this folder, it might be a disconnected mapped network drive.
     # Wiping the DB in this case causes a "0 images" glitch and requires a full rescan later.
-    if len(found_on_disk) == 0 and len(db_paths) > 0:
-        logger.warning(
-            f"Safety check: 0 files found on disk for '{folder.path}', but {len(db_paths)} "
-            f"images exist in DB. Assuming a disconnected mapped network drive. "
-            f"Skipping DB cleanup to prevent accidental wiping."
-        )
-        paths_to_remove = set()
-
-    if paths_to_remove:
-        logger.info(
-            f"Removing {
-                len(paths_to_remove)} images no longer found on disk.")
-        paths_list = list(paths_to_remove)
-        for i in range(0, len(paths_list), BATCH_SIZE):
-            batch_paths = paths_list[i:i + BATCH_SIZE]
-            await db.execute(
-                delete(models.Image).where(models.Image.full_path.in_(batch_paths))
+    disconnected = False
+    if stats['total_files'] == 0:
+        images_in_db = len(pending_removals)
+        for directory in gone_dirs:
+            images_in_db += await _count_directory_images(db, folder.id, directory)
+        disconnected = images_in_db > 0
+        if disconnected:
+            logger.warning(
+                f"Safety check: 0 files found on disk for '{folder.path}', but {images_in_db} "
+                f"images exist in DB. Assuming a disconnected mapped network drive. "
+                f"Skipping DB cleanup to prevent accidental wiping."
             )
-            await db.commit()
-        stats['removed_count'] = len(paths_to_remove)
 
-    logger.info(
-        f"Scan complete for {folder.path}. "
-        f"Added: {stats['added_count']}, "
-        f"Updated: {stats['updated_count']}, "
-        f"Removed: {stats['removed_count']}, "
-        f"Skipped: {stats['skipped_count']}"
-    )
+    if not disconnected:
+        if pending_removals:
+            await remove_pending()
+        for directory in gone_dirs:
+            stats['removed_count'] += await _delete_images(
+                db,
+                models.Image.folder_id == folder.id,
+                _direct_children_filter(directory))
+        await db.commit()
+        if stats['removed_count']:
+            logger.info(
+                f"Removed {stats['removed_count']} images no longer found on disk.")
+            report()
+
+    # Remember directory mtimes so the next scan can skip unchanged directories.
+    # Recently modified or partially failed directories are stored without an
+    # mtime, which makes the next scan list them again.
+    if not disconnected:
+        for directory, (mtime, count) in listed_dirs.items():
+            if directory in dirty_dirs or scan_started - mtime < MANIFEST_MTIME_SLACK:
+                listed_dirs[directory] = (None, count)
+        await save_directory_manifest(
+            db,
+            folder.id,
+            listed_dirs,
+            stale_dirs=[d for d in manifest if d not in seen_dirs],
+            replace=full_scan
+        )
+
+
+async def sync_image_paths(
+    db: AsyncSession,
+    folder: models.Folder,
+    paths: Iterable[str]
+) -> schemas.ScanStatus:
+    """Apply filesystem changes for specific paths without scanning the whole folder.
+
+    Each path may be a file or a directory that was created, modified, moved or
+    deleted. Existing image files are (re)processed if their mtime or size changed,
+    existing directories are walked for new images, and paths that are gone are
+    removed from the DB together with any images below them. The work is
+    proportional to the changed paths, not to the size of the folder.
+    """
+    stats = {
+        'added_count': 0,
+        'updated_count': 0,
+        'removed_count': 0,
+        'skipped_count': 0,
+        'processed_count': 0,
+        'total_files': 0
+    }
+    entries = {}
+    gone_paths = []
+    for path in paths:
+        # Images are stored under their resolved path (see file_scanner)
+        path = os.path.realpath(path)
+        try:
+            if os.path.isdir(path):
+                for entry in file_scanner.iter_image_files(path, SUPPORTED_EXTENSIONS):
+                    entries[entry.path] = entry
+                continue
+            if os.path.isfile(path):
+                if os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+                    stat = os.stat(path)
+                    entries[path] = file_scanner.FileEntry(
+                        path, os.path.basename(path), stat.st_size, stat.st_mtime)
+                continue
+        except OSError as e:
+            logger.debug(f"Could not stat {path}: {e}")
+        gone_paths.append(path)
+    stats['total_files'] = len(entries)
+
+    # DB state of the files that still exist
+    existing_db_images = await _get_existing_images(db, list(entries))
+
+    pipeline = _ProbePipeline(db, folder.id, stats)
+
+    async def produce():
+        for entry in entries.values():
+            last_modified_dt = datetime.fromtimestamp(entry.mtime, tz=timezone.utc)
+            existing = existing_db_images.get(entry.path)
+            if existing is not None and _is_unchanged(existing, last_modified_dt, entry.size):
+                stats['processed_count'] += 1
+                stats['skipped_count'] += 1
+                continue
+            status = 'added' if existing is None else 'updated'
+            await pipeline.add(_PendingImage(
+                entry, last_modified_dt, status, os.path.dirname(entry.path)))
+
+    await pipeline.run(produce)
+
+    # Deleted files, or deleted/moved-away directories with images below them
+    for path in gone_paths:
+        prefix = os.path.join(path, '')
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        stats['removed_count'] += await _delete_images(
+            db,
+            models.Image.folder_id == folder.id,
+            or_(
+                models.Image.full_path == path,
+                and_(models.Image.full_path >= prefix, models.Image.full_path < upper)))
+    if gone_paths:
+        await db.commit()
 
     return schemas.ScanStatus(
-        message="Scan completed successfully",
+        message="Changes applied successfully",
         **stats
     )
 
 
+# Performance fields are only overwritten when the new value is not None, so a
+# failed dimension probe never wipes values stored by an earlier scan
+_OPTIONAL_IMAGE_FIELDS = ['width', 'height', 'file_size', 'thumbnail_path', 'has_thumbnail']
+# Derived from the metadata, so always replaced together with it
+_GENERATION_PARAM_FIELDS = [
+    'seed', 'steps', 'sampler', 'scheduler', 'cfg', 'denoise', 'model',
+    'positive_prompt', 'negative_prompt', 'params_version']
+
+
+def _image_upsert_statement():
+    """INSERT ... ON CONFLICT(full_path) DO UPDATE for the images table, for executemany."""
+    images = models.Image.__table__
+    stmt = insert(images)
+    update_dict = {
+        "last_modified": stmt.excluded.last_modified,
+        "metadata": stmt.excluded.metadata,
+        "graph_id": stmt.excluded.graph_id,
+        "metadata_delta": stmt.excluded.metadata_delta,
+        "folder_id": stmt.excluded.folder_id,
+        "filename": stmt.excluded.filename,
+    }
+    for field in _OPTIONAL_IMAGE_FIELDS:
+        update_dict[field] = func.coalesce(stmt.excluded[field], images.c[field])
+    for field in _GENERATION_PARAM_FIELDS:
+        update_dict[field] = stmt.excluded[field]
+    return stmt.on_conflict_do_update(
+        index_elements=['full_path'],
+        set_=update_dict
+    )
+
+
 async def process_image_batch(db: AsyncSession,
                               batch: List[schemas.ImageCreate]):
-    """Process a batch of images for database insertion/update, avoiding UNIQUE constraint errors."""
+    """Upsert a batch of images with a single executemany, avoiding UNIQUE constraint errors."""
     # --- Deduplicate batch by full_path ---
     unique_images = {}
     for img in batch:
         unique_images[img.full_path] = img
-    batch = list(unique_images.values())
+    if not unique_images:
+        return
 
-    for image_data in batch:
-        stmt = insert(models.Image).values(
-            **image_data.model_dump(exclude_none=True))
-
-        # Build update dict with only fields that exist in the schema
-        update_dict = {
+    # One parameter set per row: the statement is compiled once and sent to
+    # SQLite in one call, so there is no per-row round-trip and no bound
+    # variable limit to stay under
+    rows = []
+    loras_by_path = {}
+    splits = {
+        path: metadata_graphs.split_metadata(image_data.metadata_)
+        for path, image_data in unique_images.items()
+    }
+    graph_ids = await _store_metadata_graphs(
+        db, {split.hash: split.graph for split in splits.values() if split is not None})
+    for image_data in unique_images.values():
+        columns, loras = metadata_extractor.generation_columns(image_data.metadata_)
+        split = splits[image_data.full_path]
+        rows.append({
+            "filename": image_data.filename,
+            "full_path": image_data.full_path,
             "last_modified": image_data.last_modified,
-            "metadata": image_data.metadata_,
+            # Shared graphs are only written once; rows carry the small delta
+            "metadata": image_data.metadata_ if split is None else None,
+            "graph_id": None if split is None else graph_ids[split.hash],
+            "metadata_delta": None if split is None else split.delta,
             "folder_id": image_data.folder_id,
-            "filename": image_data.filename,
-        }
-
-        # Add new fields only if they exist in the image_data
-        for field in [
-            'width',
-            'height',
-            'file_size',
-            'thumbnail_path',
-                'has_thumbnail']:
-            value = getattr(image_data, field, None)
-            if value is not None:
-                update_dict[field] = value
-
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['full_path'],
-            set_=update_dict
-        )
-        await db.execute(stmt)
+            "width": image_data.width,
+            "height": image_data.height,
+            "file_size": image_data.file_size,
+            "thumbnail_path": image_data.thumbnail_path,
+            "has_thumbnail": image_data.has_thumbnail,
+            **columns
+        })
+        loras_by_path[image_data.full_path] = loras
     try:
+        await db.execute(_image_upsert_statement(), rows)
+        image_ids = await _get_image_ids(db, loras_by_path)
+        await _replace_image_loras(db, image_ids, loras_by_path)
+        await _update_search_rows(db, image_ids.values())
         await db.commit()
     except Exception as e:
         logger.error(f"[process_image_batch] Error committing batch: {e}")
         await db.rollback()
         raise
 
+
+async def _get_image_ids(db: AsyncSession, paths: Iterable[str]) -> Dict[str, int]:
+    """Return full_path -> id for those `paths` that are in the DB."""
+    paths = list(paths)
+    ids = {}
+    for i in range(0, len(paths), BATCH_SIZE):
+        result = await db.execute(
+            select(models.Image.id, models.Image.full_path)
+            .filter(models.Image.full_path.in_(paths[i:i + BATCH_SIZE]))
+        )
+        ids.update((row.full_path, row.id) for row in result.all())
+    return ids
+
+
+async def _replace_image_loras(
+        db: AsyncSession,
+        image_ids: Dict[Any, int],
+        loras_by_key: Dict[Any, List[Tuple[str, Optional[float]]]]):
+    """Replace the LoRA rows of images; both dicts are keyed the same (path or id)."""
+    ids = list(image_ids.values())
+    for i in range(0, len(ids), BATCH_SIZE):
+        await db.execute(
+            delete(models.ImageLora).where(models.ImageLora.image_id.in_(ids[i:i + BATCH_SIZE]))
+        )
+    rows = [
+        {"image_id": image_id, "name": name, "weight": weight}
+        for key, image_id in image_ids.items()
+        for name, weight in loras_by_key.get(key, ())
+    ]
+    if rows:
+        await db.execute(insert(models.ImageLora.__table__), rows)
+
+
+# --- Shared metadata graphs ---
+
+async def _store_metadata_graphs(db: AsyncSession, graphs: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """Return hash -> MetadataGraph id for `graphs`, inserting the ones not stored yet.
+
+    Graphs already in the table (the usual case during a scan) cost one
+    indexed lookup per batch and are not written again.
+    """
+    table = models.MetadataGraph.__table__
+    hashes = list(graphs)
+    ids = {}
+    for i in range(0, len(hashes), BATCH_SIZE):
+        result = await db.execute(
+            select(table.c.id, table.c.hash).where(table.c.hash.in_(hashes[i:i + BATCH_SIZE])))
+        ids.update((row.hash, row.id) for row in result.all())
+    missing = [graph_hash for graph_hash in hashes if graph_hash not in ids]
+    if missing:
+        await db.execute(
+            insert(table).on_conflict_do_nothing(index_elements=['hash']),
+            [{"hash": graph_hash, "graph": graphs[graph_hash]} for graph_hash in missing])
+        for i in range(0, len(missing), BATCH_SIZE):
+            result = await db.execute(
+                select(table.c.id, table.c.hash).where(table.c.hash.in_(missing[i:i + BATCH_SIZE])))
+            ids.update((row.hash, row.id) for row in result.all())
+    return ids
+
+
+async def _get_metadata_graphs(db: AsyncSession, graph_ids: Iterable[Optional[int]]) -> Dict[int, Dict[str, Any]]:
+    """Return id -> graph for the given MetadataGraph ids (None entries are ignored)."""
+    ids = [graph_id for graph_id in graph_ids if graph_id is not None]
+    graphs = {}
+    for i in range(0, len(ids), BATCH_SIZE):
+        result = await db.execute(
+            select(models.MetadataGraph.id, models.MetadataGraph.graph)
+            .where(models.MetadataGraph.id.in_(ids[i:i + BATCH_SIZE])))
+        graphs.update((row.id, row.graph) for row in result.all())
+    return graphs
+
+
+def _row_metadata(
+        metadata_json: Any,
+        graph_id: Optional[int],
+        metadata_delta: Optional[Dict[str, Any]],
+        graphs: Dict[int, Dict[str, Any]]):
+    """Metadata of an image read as columns, with its graph looked up in `graphs`."""
+    if graph_id is not None and graph_id in graphs:
+        return metadata_graphs.restore_metadata(graphs[graph_id], metadata_delta)
+    return metadata_codec.loads(metadata_json)
+
+
+async def get_metadata_graph(db: AsyncSession, graph_hash: str) -> models.MetadataGraph | None:
+    result = await db.execute(
+        select(models.MetadataGraph).filter(models.MetadataGraph.hash == graph_hash))
+    return result.scalars().first()
+
+
+async def delete_unreferenced_metadata_graphs(db: AsyncSession) -> int:
+    """Delete graphs no image refers to any more; does not commit."""
+    result = await db.execute(
+        delete(models.MetadataGraph).where(~exists().where(
+            models.Image.graph_id == models.MetadataGraph.id)))
+    return result.rowcount or 0
+
+
+def _json_object_filter(column):
+    """Values of a CompressedJSON column holding a JSON object.
+
+    Rows without a value hold NULL or a JSON null; compressed values (BLOBs)
+    are always objects, and json_type cannot be applied to them.
+    """
+    return or_(
+        func.typeof(column) == "blob",
+        case((func.typeof(column) == "text", func.json_type(column))) == "object")
+
+
+def _inline_metadata_filter():
+    # Only JSON objects can be split
+    return (models.Image.graph_id.is_(None), _json_object_filter(models.Image.metadata_json))
+
+
+async def split_inline_metadata(
+        db: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Move the inline metadata of one batch of rows into shared graphs and deltas.
+
+    For rows stored before metadata was split, in id order after `after_id`.
+    Returns (rows processed, last id processed) like backfill_generation_params;
+    0 rows processed means there is nothing left.
+    """
+    result = await db.execute(
+        select(models.Image.id, models.Image.metadata_json)
+        .filter(*_inline_metadata_filter(), models.Image.id > after_id)
+        .order_by(models.Image.id)
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if not rows:
+        return 0, after_id
+
+    splits = {
+        row.id: split for row in rows
+        if (split := metadata_graphs.split_metadata(metadata_codec.loads(row.metadata_json))) is not None
+    }
+    graph_ids = await _store_metadata_graphs(
+        db, {split.hash: split.graph for split in splits.values()})
+    if splits:
+        images = models.Image.__table__
+        await db.execute(
+            update(images).where(images.c.id == bindparam("image_id")),
+            [{"image_id": image_id, "metadata": None, "graph_id": graph_ids[split.hash],
+              "metadata_delta": split.delta}
+             for image_id, split in splits.items()]
+        )
+    await db.commit()
+    return len(rows), rows[-1].id
+
+
+async def count_inline_metadata(db: AsyncSession) -> int:
+    """Number of rows split_inline_metadata still has to look at."""
+    result = await db.execute(
+        select(func.count()).select_from(models.Image).filter(*_inline_metadata_filter())
+    )
+    return result.scalar_one()
+
+
+# --- Metadata compression (see metadata_codec) ---
+
+async def load_metadata_dictionaries(db: AsyncSession) -> int:
+    """Register the stored compression dictionaries with the codec; returns their count."""
+    result = await db.execute(select(models.MetadataDictionary.id, models.MetadataDictionary.data))
+    dictionaries = {row.id: row.data for row in result.all()}
+    metadata_codec.metadata_codec.use_dictionaries(dictionaries)
+    return len(dictionaries)
+
+
+async def train_metadata_dictionary(
+        db: AsyncSession,
+        sample_size: int = 2000) -> Optional[int]:
+    """Train a dictionary on the newest stored metadata and make it the current one.
+
+    Samples the per-image values (deltas and inline metadata) of the newest
+    `sample_size` images and some shared graphs. Returns the new dictionary's
+    id, or None if there are too few samples yet (values are then compressed
+    without a dictionary).
+    """
+    result = await db.execute(
+        select(models.Image.metadata_json, models.Image.metadata_delta)
+        .order_by(models.Image.id.desc())
+        .limit(sample_size)
+    )
+    samples = []
+    for row in result.all():
+        samples += [value for value in (metadata_codec.loads(row.metadata_json), row.metadata_delta)
+                    if isinstance(value, dict)]
+    result = await db.execute(
+        select(models.MetadataGraph.graph).order_by(models.MetadataGraph.id.desc()).limit(100))
+    samples += result.scalars().all()
+    if len(samples) < metadata_codec.MIN_TRAINING_SAMPLES:
+        return None
+
+    dictionary = models.MetadataDictionary(
+        data=metadata_codec.train_dictionary(samples),
+        sample_count=len(samples),
+        created_at=datetime.now(timezone.utc))
+    db.add(dictionary)
+    await db.commit()
+    metadata_codec.metadata_codec.use_dictionaries({dictionary.id: dictionary.data})
+    return dictionary.id
+
+
+def _metadata_to_recode_filter(column):
+    """Values of a CompressedJSON column not stored the way the codec writes them now."""
+    codec = metadata_codec.metadata_codec
+    if not codec.enabled:
+        return func.typeof(column) == "blob"
+    return or_(
+        and_(func.typeof(column) == "text", _json_object_filter(column)),
+        and_(func.typeof(column) == "blob",
+             func.substr(column, 1, metadata_codec.HEADER_SIZE) != codec.header()))
+
+
+def _images_to_recode_filter():
+    return or_(_metadata_to_recode_filter(models.Image.metadata_json),
+               _metadata_to_recode_filter(models.Image.metadata_delta))
+
+
+async def recode_stored_metadata(
+        db: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Rewrite the metadata of one batch of images with the current codec settings.
+
+    For rows stored uncompressed, or with another dictionary, in id order
+    after `after_id`. Returns (rows processed, last id processed) like
+    backfill_generation_params; 0 rows processed means there is nothing left.
+    """
+    result = await db.execute(
+        select(models.Image.id, models.Image.metadata_json, models.Image.metadata_delta)
+        .filter(_images_to_recode_filter(), models.Image.id > after_id)
+        .order_by(models.Image.id)
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if not rows:
+        return 0, after_id
+
+    images = models.Image.__table__
+    await db.execute(
+        update(images).where(images.c.id == bindparam("image_id")),
+        [{"image_id": row.id, "metadata": metadata_codec.loads(row.metadata_json),
+          "metadata_delta": row.metadata_delta}
+         for row in rows]
+    )
+    await db.commit()
+    return len(rows), rows[-1].id
+
+
+async def count_metadata_to_recode(db: AsyncSession) -> int:
+    """Number of images recode_stored_metadata still has to rewrite."""
+    result = await db.execute(
+        select(func.count()).select_from(models.Image).filter(_images_to_recode_filter())
+    )
+    return result.scalar_one()
+
+
+async def recode_metadata_graphs(db: AsyncSession) -> int:
+    """Rewrite the shared graphs with the current codec settings; returns their count."""
+    graphs = models.MetadataGraph.__table__
+    result = await db.execute(
+        select(graphs.c.id, graphs.c.graph)
+        .filter(_metadata_to_recode_filter(graphs.c.graph)))
+    rows = result.all()
+    for i in range(0, len(rows), BATCH_SIZE):
+        await db.execute(
+            update(graphs).where(graphs.c.id == bindparam("graph_id")),
+            [{"graph_id": row.id, "graph": row.graph} for row in rows[i:i + BATCH_SIZE]])
+    await db.commit()
+    return len(rows)
+
+
+# --- Thumbnail pre-generation (see thumbnail_jobs) ---
+
+class PendingThumbnail(NamedTuple):
+    id: int
+    full_path: str
+    # last_modified as stored, for keyset pagination and to detect images
+    # that changed while their thumbnails were being generated
+    modified: str
+
+
+def _stored_last_modified(images=None):
+    images = models.Image.__table__ if images is None else images
+    return type_coerce(images.c.last_modified, String)
+
+
+async def get_pending_thumbnails(
+        db: AsyncSession,
+        before: Optional[Tuple[str, int]] = None,
+        limit: int = BATCH_SIZE) -> List[PendingThumbnail]:
+    """Images without pre-generated thumbnails, newest first.
+
+    Skips images whose current version failed (record_thumbnail_failures).
+    `before` is the (modified, id) of the last image of the previous page.
+    Older versions left has_thumbnail NULL; those rows are set to false
+    first so they are found through idx_image_thumbnail_pending.
+    """
+    if before is None:
+        await db.execute(
+            update(models.Image).where(models.Image.has_thumbnail.is_(None))
+            .values(has_thumbnail=False))
+        await db.commit()
+    modified = _stored_last_modified()
+    query = (
+        select(models.Image.id, models.Image.full_path, modified.label("modified"))
+        .filter(models.Image.has_thumbnail.is_(False), _thumbnail_not_failed(modified))
+        .order_by(models.Image.last_modified.desc(), models.Image.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.filter(tuple_(modified, models.Image.id) < tuple_(*before))
+    result = await db.execute(query)
+    return [PendingThumbnail(*row) for row in result.all()]
+
+
+async def record_thumbnails(db: AsyncSession, thumbnails: List[Tuple[PendingThumbnail, str, str]]):
+    """Set thumbnail_path, has_thumbnail and placeholder for (image, thumbnail path,
+    placeholder) tuples in one executemany.
+
+    Images modified since get_pending_thumbnails returned them are skipped;
+    their new version still needs thumbnails.
+    """
+    if not thumbnails:
+        return
+    images = models.Image.__table__
+    await db.execute(
+        update(images)
+        .where(images.c.id == bindparam("image_id"),
+               _stored_last_modified(images) == bindparam("modified", type_=String))
+        .values(thumbnail_path=bindparam("thumbnail_path"), has_thumbnail=True,
+                placeholder=bindparam("placeholder")),
+        [{"image_id": image.id, "modified": image.modified, "thumbnail_path": path,
+          "placeholder": placeholder}
+         for image, path, placeholder in thumbnails]
+    )
+    await db.commit()
+
+
+async def record_thumbnail_failures(db: AsyncSession, images: List[PendingThumbnail]):
+    """Mark images whose thumbnails could not be generated, until their file changes.
+
+    Stores the failed version's last_modified in thumbnail_failed, so a
+    rescan that picks up a new version makes the image pending again.
+    """
+    if not images:
+        return
+    images_table = models.Image.__table__
+    await db.execute(
+        update(images_table)
+        .where(images_table.c.id == bindparam("image_id"))
+        .values(thumbnail_failed=bindparam("modified")),
+        [{"image_id": image.id, "modified": image.modified} for image in images]
+    )
+    await db.commit()
+
+
+async def record_placeholders(db: AsyncSession, placeholders: Dict[str, str]):
+    """Set the placeholder of images (full_path -> placeholder) in one executemany.
+
+    For thumbnails generated on request; a miss means a new version (or an
+    evicted thumbnail), so an existing placeholder is replaced.
+    """
+    if not placeholders:
+        return
+    images_table = models.Image.__table__
+    await db.execute(
+        update(images_table)
+        .where(images_table.c.full_path == bindparam("path"))
+        .values(placeholder=bindparam("placeholder")),
+        [{"path": path, "placeholder": placeholder} for path, placeholder in placeholders.items()]
+    )
+    await db.commit()
+
+
+def _thumbnail_not_failed(modified=None):
+    modified = _stored_last_modified() if modified is None else modified
+    return or_(models.Image.thumbnail_failed.is_(None), models.Image.thumbnail_failed != modified)
+
+
+async def get_image_paths(db: AsyncSession, image_ids: List[int]) -> Dict[int, str]:
+    """id -> full_path of those `image_ids` that are in the DB."""
+    paths = {}
+    for i in range(0, len(image_ids), BATCH_SIZE):
+        result = await db.execute(
+            select(models.Image.id, models.Image.full_path)
+            .filter(models.Image.id.in_(image_ids[i:i + BATCH_SIZE])))
+        paths.update(result.tuples().all())
+    return paths
+
+
+async def get_thumbnail_sources(
+        db: AsyncSession,
+        after_id: int = 0,
+        limit: int = BATCH_SIZE) -> List[Tuple[int, str, datetime]]:
+    """(id, full_path, last_modified) of images by id, for the thumbnail orphan sweep."""
+    result = await db.execute(
+        select(models.Image.id, models.Image.full_path, models.Image.last_modified)
+        .filter(models.Image.id > after_id)
+        .order_by(models.Image.id)
+        .limit(limit))
+    return [tuple(row) for row in result.all()]
+
+
+async def forget_thumbnails(db: AsyncSession, directory: str) -> int:
+    """Mark images whose recorded thumbnail is in `directory` as having none."""
+    result = await db.execute(
+        update(models.Image)
+        .where(models.Image.thumbnail_path.startswith(directory.rstrip(os.sep) + os.sep, autoescape=True))
+        .values(thumbnail_path=None, has_thumbnail=False))
+    await db.commit()
+    return result.rowcount
+
+
+async def count_pending_thumbnails(db: AsyncSession) -> int:
+    """Images pre-generation has still to make thumbnails for (failed versions excluded)."""
+    result = await db.execute(
+        select(func.count()).select_from(models.Image)
+        .filter(or_(models.Image.has_thumbnail.is_(False),
+                    models.Image.has_thumbnail.is_(None)),
+                _thumbnail_not_failed()))
+    return result.scalar_one()
+
+
+# --- Prompt search (FTS5) ---
+
+def _insert_search_rows(image_ids: List[int]):
+    """INSERT ... SELECT building the search index rows of images from their columns."""
+    search = models.image_search
+    loras = (
+        select(func.group_concat(models.ImageLora.name, " "))
+        .where(models.ImageLora.image_id == models.Image.id)
+        .scalar_subquery()
+    )
+    return insert(search).from_select(
+        [search.c.rowid, *(search.c[name] for name in models.IMAGE_SEARCH_COLUMNS)],
+        select(
+            models.Image.id,
+            models.Image.positive_prompt,
+            models.Image.negative_prompt,
+            models.Image.model,
+            loras,
+            models.Image.folder_id,
+        ).where(models.Image.id.in_(image_ids)))
+
+
+async def _update_search_rows(db: AsyncSession, image_ids: Iterable[int]):
+    """(Re)write the search index rows of the given images.
+
+    Call after the image rows and their LoRA rows are written; does not commit.
+    """
+    if not models.FTS5_AVAILABLE:
+        return
+    search = models.image_search
+    ids = list(image_ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[i:i + BATCH_SIZE]
+        await db.execute(delete(search).where(search.c.rowid.in_(chunk)))
+        await db.execute(_insert_search_rows(chunk))
+
+
+async def _delete_search_rows(db: AsyncSession, image_ids):
+    """Delete the search index rows of the images selected by the `image_ids` select."""
+    if models.FTS5_AVAILABLE:
+        search = models.image_search
+        await db.execute(delete(search).where(search.c.rowid.in_(image_ids)))
+
+
+def search_match_expression(query: str, folder_id: Optional[int] = None) -> Optional[str]:
+    """Turn user input into an FTS5 MATCH expression; None if it has no terms.
+
+    Every whitespace-separated word must match (AND). Words are quoted, so FTS5
+    operators and punctuation in prompts like "(masterpiece:1.2)" are taken
+    literally; a trailing * keeps prefix matching ("light*"). With `folder_id`
+    only images of that folder match.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    if not terms:
+        return None
+    expression = " ".join(terms)
+    if folder_id is not None:
+        expression = f'({expression}) AND folder : "{int(folder_id)}"'
+    return expression
+
+
+async def search_images(
+    db: AsyncSession,
+    query: str,
+    folder_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[List[str]] = None
+) -> schemas.ImageListResponse | schemas.ImageFieldsListResponse:
+    """Full-text search over prompts, model and LoRA names, best matches first.
+
+    Ranking (bm25, see models.IMAGE_SEARCH_TABLE) and pagination run inside the
+    FTS5 index; only the requested page of images is then loaded, with just
+    `fields` if given (as in get_images_by_folder). Above
+    config.SEARCH_RANK_MAX_MATCHES matches, results are newest first instead.
+    """
+    response = schemas.ImageListResponse if fields is None else schemas.ImageFieldsListResponse
+    expression = search_match_expression(query, folder_id)
+    if expression is None:
+        return response(images=[], total_count=0)
+
+    search = models.image_search
+    match = search.c[models.IMAGE_SEARCH_TABLE].match(expression)
+    count_result = await db.execute(select(func.count()).select_from(search).where(match))
+    total_count = count_result.scalar_one()
+
+    order = search.c.rank if total_count <= config.SEARCH_RANK_MAX_MATCHES else desc(search.c.rowid)
+    page_result = await db.execute(
+        select(search.c.rowid).where(match).order_by(order).offset(skip).limit(limit))
+    ids = [row[0] for row in page_result.all()]
+    if not ids:
+        return response(images=[], total_count=total_count)
+    if fields is None:
+        images_result = await db.execute(
+            select(models.Image).filter(models.Image.id.in_(ids)))
+        images_by_id = {image.id: image for image in images_result.scalars().all()}
+    else:
+        images_by_id = {
+            image.id: image for image in await _select_image_fields(
+                db, select(models.Image).filter(models.Image.id.in_(ids)), fields)}
+    images = [images_by_id[image_id] for image_id in ids if image_id in images_by_id]
+    return response(images=images, total_count=total_count)
+
+
+async def index_unsearchable_images(
+        db: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Add images missing from the search index, one batch in id order after `after_id`.
+
+    For images stored before the index existed. Returns (images checked, last id
+    checked) like backfill_generation_params; 0 checked means done.
+    """
+    result = await db.execute(
+        select(models.Image.id)
+        .filter(models.Image.id > after_id)
+        .order_by(models.Image.id)
+        .limit(batch_size)
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return 0, after_id
+    search = models.image_search
+    indexed = await db.execute(select(search.c.rowid).where(search.c.rowid.in_(ids)))
+    missing = set(ids).difference(indexed.scalars().all())
+    if missing:
+        await db.execute(_insert_search_rows(sorted(missing)))
+        await db.commit()
+    return len(ids), ids[-1]
+
+
+async def count_unsearchable_images(db: AsyncSession) -> int:
+    """How many more images there are than rows in the search index (0 if it is complete)."""
+    if not models.FTS5_AVAILABLE:
+        return 0
+    image_count = (await db.execute(select(func.count()).select_from(models.Image))).scalar_one()
+    indexed_count = (await db.execute(
+        select(func.count()).select_from(models.image_search))).scalar_one()
+    return max(image_count - indexed_count, 0)
+
+
+async def backfill_generation_params(
+        db: AsyncSession,
+        after_id: int = 0,
+        batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Derive the generation-parameter columns for one batch of rows that lack them.
+
+    Handles rows stored before the columns existed or with an older
+    GENERATION_PARAMS_VERSION, in id order starting after `after_id`. Returns
+    (rows processed, last id processed); pass the id back in for the next
+    batch. 0 rows processed means there is nothing left.
+    """
+    version = metadata_extractor.GENERATION_PARAMS_VERSION
+    result = await db.execute(
+        select(models.Image.id, models.Image.metadata_json, models.Image.graph_id,
+               models.Image.metadata_delta)
+        .filter(
+            or_(models.Image.params_version.is_(None),
+                models.Image.params_version < version),
+            models.Image.id > after_id)
+        .order_by(models.Image.id)
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if not rows:
+        return 0, after_id
+
+    graphs = await _get_metadata_graphs(db, {row.graph_id for row in rows})
+    updates = []
+    loras_by_id = {}
+    for row in rows:
+        columns, loras = metadata_extractor.generation_columns(_row_metadata(
+            row.metadata_json, row.graph_id, row.metadata_delta, graphs))
+        updates.append({"image_id": row.id, **columns})
+        loras_by_id[row.id] = loras
+    images = models.Image.__table__
+    # SET clause comes from the parameter keys
+    await db.execute(
+        update(images).where(images.c.id == bindparam("image_id")),
+        updates
+    )
+    await _replace_image_loras(db, {image_id: image_id for image_id in loras_by_id}, loras_by_id)
+    await _update_search_rows(db, loras_by_id)
+    await db.commit()
+    return len(rows), rows[-1].id
+
+
+async def count_generation_param_backfill(db: AsyncSession) -> int:
+    """Number of rows the generation-parameter backfill still has to process."""
+    result = await db.execute(
+        select(func.count()).select_from(models.Image).filter(
+            or_(models.Image.params_version.is_(None),
+                models.Image.params_version < metadata_extractor.GENERATION_PARAMS_VERSION))
+    )
+    return result.scalar_one()
+
+
+async def update_planner_statistics(db: AsyncSession, full: bool = False):
+    """Keep SQLite's query planner statistics (sqlite_stat1) current.
+
+    Without statistics SQLite assumes every index is equally selective, and
+    e.g. the LoRA filter walks all of a folder's images instead of seeking
+    idx_image_lora_name_image. Runs ANALYZE if the images table has never been
+    analyzed (or `full` is set), otherwise PRAGMA optimize, which only
+    re-analyzes tables that changed enough to matter.
+    """
+    if not full:
+        result = await db.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"))
+        if result.first() is not None:
+            result = await db.execute(text(
+                "SELECT 1 FROM sqlite_stat1 WHERE tbl = 'images' LIMIT 1"))
+            full = result.first() is None
+        else:
+            full = True
+    await db.execute(text("ANALYZE" if full else "PRAGMA optimize"))
+    await db.commit()
+
 # --- Keep other scan logic ---
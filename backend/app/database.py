@@ -3,6 +3,8 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+logger = logging.getLogger(__name__)
+
 logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
 logging.getLogger('sqlalchemy.pool').setLevel(logging.WARNING)
 logging.getLogger('sqlalchemy.dialects').setLevel(logging.WARNING)
@@ -35,6 +37,45 @@ async def get_db():
 # Function to create database tables (will be called on app startup)
 
 
+# One-time data changes run right after a column is added to an existing table
+_COLUMN_BACKFILLS = {
+    # Images thumbnailed before placeholders existed: pending again, so
+    # pre-generation makes their placeholder (from the existing thumbnails)
+    ("images", "placeholder"): "UPDATE images SET has_thumbnail = 0 WHERE has_thumbnail",
+}
+# Indexes earlier versions created that are no longer used
+_DROPPED_INDEXES = ("idx_image_placeholder_missing",)
+
+
+def _add_missing_columns_and_indexes(connection):
+    """Bring tables created by an older version up to date.
+
+    create_all only creates missing tables, so columns that were added to
+    existing models later are added here with ALTER TABLE (they are all
+    nullable), each followed by its _COLUMN_BACKFILLS statement, then any
+    missing indexes.
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')
+        }
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            logger.info(f"Adding column {table.name}.{column.name}")
+            connection.exec_driver_sql(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+            backfill = _COLUMN_BACKFILLS.get((table.name, column.name))
+            if backfill is not None:
+                connection.exec_driver_sql(backfill)
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    for name in _DROPPED_INDEXES:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns_and_indexes)
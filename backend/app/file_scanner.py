@@ -0,0 +1,235 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from . import config, image_probe, metadata_extractor
+
+try:  # Optional: process memory on every platform (/proc is used otherwise)
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_probe_executor: Optional[concurrent.futures.Executor] = None
+
+
+class FileEntry(NamedTuple):
+    """A candidate image file found while walking a folder."""
+    path: str
+    name: str
+    size: int
+    mtime: float
+
+
+def _iter_directory(
+    scandir_iterator: Iterator[os.DirEntry],
+    extensions: Set[str],
+    subdirs: List[str]
+) -> Iterator[FileEntry]:
+    """Yield the supported image files of one directory as scandir returns them.
+
+    Subdirectories to descend into are appended to `subdirs`. Directory
+    symlinks are not followed (same as Path.rglob); symlinked files are
+    yielded under their resolved path, as images have always been stored
+    (Path.resolve), so rows of existing images keep matching. The stat result comes from
+    the DirEntry, so each file costs at most one stat call (none on Windows,
+    where scandir already returns it). Entries are never collected into a list,
+    so a directory with a million files is streamed like a small one.
+    """
+    for entry in scandir_iterator:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            path = os.path.realpath(entry.path) if entry.is_symlink() else entry.path
+        except OSError as e:
+            logger.debug(f"Could not stat {entry.path}: {e}")
+            continue
+        yield FileEntry(path, entry.name, stat.st_size, stat.st_mtime)
+
+
+def iter_image_files(root: str, extensions: Iterable[str]) -> Iterator[FileEntry]:
+    """Walk `root` once with os.scandir and yield every supported image file.
+
+    Files are yielded while their directory is being read, so callers can start
+    processing before the walk finishes. Paths are below the resolved `root`.
+    """
+    extensions = {ext.lower() for ext in extensions}
+    stack = [os.path.realpath(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                yield from _iter_directory(it, extensions, stack)
+        except OSError as e:
+            logger.warning(f"Could not read directory {directory}: {e}")
+
+
+class DirectoryListing(NamedTuple):
+    """A directory reached by walk_directories.
+
+    When the directory did not change since the last scan, `listed` is False,
+    `entry_count` comes from the manifest and no files follow. Otherwise
+    `entry_count` is None and the directory's FileEntry items follow, ended by
+    a DirectoryDone.
+    """
+    path: str
+    mtime: float
+    entry_count: Optional[int]
+    listed: bool
+
+
+class DirectoryDone(NamedTuple):
+    """Ends the files of a listed directory in the walk_directories stream.
+
+    `complete` is False if reading the directory failed part way, in which
+    case files may be missing from the listing.
+    """
+    path: str
+    entry_count: int
+    complete: bool
+
+
+def walk_directories(
+    root: str,
+    extensions: Iterable[str],
+    manifest: Optional[Dict[str, Tuple[Optional[float], int]]] = None
+) -> Iterator[Union[DirectoryListing, FileEntry, DirectoryDone]]:
+    """Walk `root` directory by directory, skipping directories that did not change.
+
+    Yields a flat stream: a DirectoryListing for every directory reached and,
+    for directories that are listed, their FileEntry items followed by a
+    DirectoryDone. Nothing is buffered per directory, so memory does not grow
+    with directory size.
+
+    `manifest` maps directory path -> (mtime, entry_count) from the previous
+    scan. A directory whose mtime still matches is not listed: its subdirectories
+    are taken from the manifest and only stat()ed, so an unchanged tree costs one
+    stat per directory instead of one per file. A directory's mtime only changes
+    when entries are added, removed or renamed in it, so files rewritten in place
+    inside an unchanged directory are not noticed; use a full scan (no manifest)
+    for that. Paths are below the resolved `root`, like the stored image paths.
+    """
+    extensions = {ext.lower() for ext in extensions}
+    manifest = manifest or {}
+    known_subdirs: Dict[str, List[str]] = {}
+    for directory in manifest:
+        parent = os.path.dirname(directory)
+        if parent != directory:
+            known_subdirs.setdefault(parent, []).append(directory)
+
+    stack = [os.path.realpath(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            mtime = os.stat(current).st_mtime
+        except OSError as e:
+            logger.debug(f"Could not stat directory {current}: {e}")
+            continue
+
+        known_mtime, known_count = manifest.get(current, (None, 0))
+        if known_mtime is not None and known_mtime == mtime:
+            stack.extend(known_subdirs.get(current, ()))
+            yield DirectoryListing(current, mtime, known_count, False)
+            continue
+
+        try:
+            it = os.scandir(current)
+        except OSError as e:
+            logger.warning(f"Could not read directory {current}: {e}")
+            continue
+        entry_count = 0
+        complete = True
+        with it:
+            yield DirectoryListing(current, mtime, None, True)
+            try:
+                for entry in _iter_directory(it, extensions, stack):
+                    entry_count += 1
+                    yield entry
+            except OSError as e:
+                logger.warning(f"Could not finish reading directory {current}: {e}")
+                complete = False
+        yield DirectoryDone(current, entry_count, complete)
+
+
+class ProbeResult(NamedTuple):
+    """What a scan worker sends back for one file. Kept small to keep IPC cheap."""
+    metadata: Optional[Dict[str, Any]]
+    width: Optional[int]
+    height: Optional[int]
+
+
+def probe_image_files(paths: List[str]) -> List[Optional[ProbeResult]]:
+    """Extract ComfyUI metadata and dimensions for a chunk of files.
+
+    Runs inside a scan worker (thread or process). Each file is opened once
+    (image_probe.probe_image) and of PNGs only the chunks before the pixel data
+    are read. Results are returned in the order of `paths`; None marks a file
+    that could not be processed. Files that cannot be read as images are still
+    returned, without metadata or dimensions.
+    """
+    results = []
+    for path in paths:
+        try:
+            probe = image_probe.probe_image(path, metadata_extractor.COMFYUI_TEXT_KEYS)
+            if probe is None:
+                results.append(ProbeResult(None, None, None))
+                continue
+            metadata = metadata_extractor.parse_comfyui_metadata(
+                probe.text_chunks, probe.format)
+            results.append(ProbeResult(metadata, probe.width, probe.height))
+        except Exception as e:
+            logger.error(f"Error processing file {path}: {e}")
+            results.append(None)
+    return results
+
+
+def get_probe_executor() -> concurrent.futures.Executor:
+    """Return the shared executor that runs probe_image_files, creating it on first use."""
+    global _probe_executor
+    if _probe_executor is None:
+        if config.SCAN_EXECUTOR == "process":
+            # spawn: forking a process that runs an event loop and watcher threads is unsafe
+            _probe_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=config.SCAN_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _probe_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=config.SCAN_WORKERS,
+                thread_name_prefix="scan-probe")
+    return _probe_executor
+
+
+def get_probe_worker_count() -> int:
+    """Number of workers of the shared probe executor."""
+    executor = get_probe_executor()
+    return getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident memory of this process, or None if it cannot be determined.
+
+    Worker processes of a "process" executor are not included.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def shutdown_probe_executor():
+    global _probe_executor
+    if _probe_executor is not None:
+        _probe_executor.shutdown(wait=False, cancel_futures=True)
+        _probe_executor = None
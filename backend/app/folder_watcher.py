@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set
+
+from . import config, crud, database
+from .scan_jobs import scan_job_manager
+from .thumbnail_jobs import thumbnail_pregeneration
+
+try:  # Optional: native filesystem events (inotify, FSEvents, ReadDirectoryChangesW)
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+
+class _FolderEventHandler(FileSystemEventHandler):
+    """Forwards relevant watchdog events for one folder to the asyncio loop."""
+
+    def __init__(self, watcher: "FolderWatcher", folder_id: int):
+        self.watcher = watcher
+        self.folder_id = folder_id
+
+    def on_any_event(self, event):
+        # Directory "modified" events only say that an entry inside changed;
+        # the entry itself gets its own event
+        if event.is_directory and event.event_type in ("modified", "opened", "closed_no_write"):
+            return
+        paths = [event.src_path]
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            paths.append(dest_path)
+        for path in paths:
+            path = os.fsdecode(path)
+            if (event.is_directory
+                    or os.path.splitext(path)[1].lower() in crud.SUPPORTED_EXTENSIONS):
+                self.watcher.notify_threadsafe(self.folder_id, path)
+
+
+class FolderWatcher:
+    """Keeps the DB in sync with registered folders while the app is running.
+
+    With watchdog installed, native filesystem events are coalesced per folder
+    and the changed paths are applied through crud.sync_image_paths after a short
+    quiet period (debounce), so each change costs work proportional to the files
+    involved. Without watchdog (or with GALLERYFLOW_WATCHER_BACKEND=polling),
+    each folder is polled with an incremental scan, which only stat()s directories
+    and lists the ones whose mtime changed. Both hold the folder's
+    scan_job_manager.folder_lock, so they never run alongside a scan job.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer = None
+        self._watches: Dict[int, object] = {}
+        self._poll_tasks: Dict[int, asyncio.Task] = {}
+        self._pending: Dict[int, Set[str]] = {}
+        self._flush_handles: Dict[int, asyncio.TimerHandle] = {}
+        self._first_event_at: Dict[int, float] = {}
+        self._flush_tasks: Dict[int, asyncio.Task] = {}
+        self._folder_paths: Dict[int, str] = {}
+
+    @property
+    def uses_native_events(self) -> bool:
+        if config.WATCHER_BACKEND == "polling":
+            return False
+        if Observer is None:
+            if config.WATCHER_BACKEND == "native":
+                logger.warning("watchdog is not installed; falling back to polling")
+            return False
+        return True
+
+    async def start(self):
+        """Start watching every registered folder."""
+        if not config.WATCHER_ENABLED:
+            logger.info("Folder watcher disabled")
+            return
+        self._loop = asyncio.get_running_loop()
+        if self.uses_native_events:
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        async with database.AsyncSessionLocal() as db:
+            folders = await crud.get_folders(db, limit=None)
+        for folder in folders:
+            self.watch(folder.id, folder.path)
+        logger.info(
+            f"Folder watcher started for {len(folders)} folders "
+            f"({'native events' if self._observer else 'polling'})")
+
+    async def stop(self):
+        for folder_id in list(self._folder_paths):
+            self.unwatch(folder_id)
+        tasks = list(self._flush_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._observer is not None:
+            self._observer.stop()
+            await asyncio.to_thread(self._observer.join, 5)
+            self._observer = None
+
+    def watch(self, folder_id: int, path: str):
+        """Start watching one folder. No-op if the watcher is not running."""
+        if self._loop is None or folder_id in self._folder_paths:
+            return
+        self._folder_paths[folder_id] = path
+        if self._observer is not None:
+            try:
+                self._watches[folder_id] = self._observer.schedule(
+                    _FolderEventHandler(self, folder_id), path, recursive=True)
+                return
+            except OSError as e:
+                # e.g. inotify watch limit reached or unsupported network share
+                logger.warning(f"Cannot watch {path} natively ({e}); polling instead")
+        self._poll_tasks[folder_id] = self._loop.create_task(self._poll(folder_id))
+
+    def unwatch(self, folder_id: int):
+        self._folder_paths.pop(folder_id, None)
+        watch = self._watches.pop(folder_id, None)
+        if watch is not None and self._observer is not None:
+            self._observer.unschedule(watch)
+        task = self._poll_tasks.pop(folder_id, None)
+        if task is not None:
+            task.cancel()
+        handle = self._flush_handles.pop(folder_id, None)
+        if handle is not None:
+            handle.cancel()
+        self._pending.pop(folder_id, None)
+        self._first_event_at.pop(folder_id, None)
+
+    def notify_threadsafe(self, folder_id: int, path: str):
+        """Record a changed path; called from the watchdog observer thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.notify, folder_id, path)
+
+    def notify(self, folder_id: int, path: str):
+        """Record a changed path and (re)arm the debounce timer for its folder."""
+        if folder_id not in self._folder_paths:
+            return
+        now = self._loop.time()
+        self._pending.setdefault(folder_id, set()).add(path)
+        first_event_at = self._first_event_at.setdefault(folder_id, now)
+        handle = self._flush_handles.pop(folder_id, None)
+        if handle is not None:
+            handle.cancel()
+        deadline = min(
+            now + config.WATCHER_DEBOUNCE_SECONDS,
+            first_event_at + config.WATCHER_MAX_DELAY_SECONDS)
+        self._flush_handles[folder_id] = self._loop.call_at(
+            deadline, self._schedule_flush, folder_id)
+
+    def _schedule_flush(self, folder_id: int):
+        self._flush_handles.pop(folder_id, None)
+        running = self._flush_tasks.get(folder_id)
+        if running is not None and not running.done():
+            # Let the running flush finish; it picks up the new paths afterwards
+            return
+        self._flush_tasks[folder_id] = self._loop.create_task(self._flush(folder_id))
+
+    async def _flush(self, folder_id: int):
+        while self._pending.get(folder_id):
+            # Not alongside a scan of the folder; events are not seen again,
+            # so they are applied once it is done
+            async with scan_job_manager.folder_lock(folder_id):
+                paths = self._pending.pop(folder_id, None)
+                self._first_event_at.pop(folder_id, None)
+                if not paths:
+                    continue
+                folder = None
+                try:
+                    async with database.AsyncSessionLocal() as db:
+                        folder = await crud.get_folder(db, folder_id)
+                        if folder is None:
+                            self.unwatch(folder_id)
+                            return
+                        result = await crud.sync_image_paths(db, folder, paths)
+                    if result.added_count or result.updated_count:
+                        thumbnail_pregeneration.start()
+                    logger.info(
+                        f"Applied {len(paths)} filesystem changes in {folder.path}: "
+                        f"added {result.added_count}, updated {result.updated_count}, "
+                        f"removed {result.removed_count}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(
+                        f"Failed to apply filesystem changes for folder {folder_id}: {e}",
+                        exc_info=True)
+
+    async def _poll(self, folder_id: int):
+        while folder_id in self._folder_paths:
+            await asyncio.sleep(config.WATCHER_POLL_INTERVAL_SECONDS)
+            if scan_job_manager.is_folder_active(folder_id):
+                # A scan job is already bringing this folder up to date
+                continue
+            try:
+                # A job submitted meanwhile waits for this scan to finish
+                async with scan_job_manager.folder_lock(folder_id):
+                    async with database.AsyncSessionLocal() as db:
+                        folder = await crud.get_folder(db, folder_id)
+                        if folder is None:
+                            self.unwatch(folder_id)
+                            return
+                        if os.path.isdir(folder.path):
+                            result = await crud.scan_folder_and_update_db(
+                                db, folder, report_progress=False)
+                            if result.added_count or result.updated_count:
+                                thumbnail_pregeneration.start()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Polling folder {folder_id} failed: {e}", exc_info=True)
+
+
+# Global folder watcher instance
+folder_watcher = FolderWatcher()
@@ -0,0 +1,91 @@
+import logging
+import os
+from contextlib import contextmanager
+from typing import Collection, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from PIL import Image as PILImage
+
+from . import png_chunks
+
+logger = logging.getLogger(__name__)
+
+
+class ImageProbe(NamedTuple):
+    """Everything the scanner needs from an image file, read with a single open."""
+    size: int
+    mtime: float
+    width: int
+    height: int
+    format: Optional[str]
+    # Raw text chunks (PNG tEXt/zTXt/iTXt), e.g. ComfyUI's 'prompt' and 'workflow'
+    text_chunks: Dict[str, str]
+
+
+def _probe_open_image(img: PILImage.Image, stat: os.stat_result) -> ImageProbe:
+    text_chunks = {
+        key: str(value) for key, value in img.info.items() if isinstance(value, str)
+    }
+    return ImageProbe(
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        width=img.width,
+        height=img.height,
+        format=img.format,
+        text_chunks=text_chunks)
+
+
+@contextmanager
+def open_image(image_path: str) -> Iterator[Tuple[ImageProbe, PILImage.Image]]:
+    """Open an image once and yield its probe together with the still open image.
+
+    Size and mtime come from fstat() on the open handle instead of a second
+    lookup by path, and PIL reads the header (and PNG text chunks before the
+    pixel data) from the same handle, so callers that go on to decode the
+    pixels, like thumbnail generation, do not open the file again. Pixel data
+    is only read if the caller loads the image. The file is closed on exit.
+    """
+    with open(image_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        with PILImage.open(f) as img:
+            yield _probe_open_image(img, stat), img
+
+
+def probe_image(
+    image_path: str,
+    text_keys: Optional[Collection[str]] = None
+) -> Optional[ImageProbe]:
+    """Read size, mtime, dimensions, format and text chunks of an image in one open.
+
+    PNGs are read with png_chunks.read_png_header, which only walks the chunks
+    before the pixel data; other formats (and PNGs it cannot parse) go through
+    PIL. With `text_keys`, only those text chunks are decoded and returned.
+    Returns None if the file cannot be read or is not an image.
+    """
+    try:
+        with open(image_path, 'rb', buffering=png_chunks.READ_BUFFER_SIZE) as f:
+            stat = os.fstat(f.fileno())
+            try:
+                header = png_chunks.read_png_header(f, text_keys)
+            except ValueError:
+                header = None
+            if header is not None:
+                return ImageProbe(
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    width=header.width,
+                    height=header.height,
+                    format="PNG",
+                    text_chunks=header.text_chunks)
+            f.seek(0)
+            with PILImage.open(f) as img:
+                probe = _probe_open_image(img, stat)
+            if text_keys is not None:
+                probe = probe._replace(text_chunks={
+                    key: value for key, value in probe.text_chunks.items()
+                    if key in text_keys})
+            return probe
+    except FileNotFoundError:
+        logger.debug(f"Image disappeared before it could be probed: {image_path}")
+    except Exception as e:
+        logger.error(f"Failed to probe image {image_path}: {e}")
+    return None
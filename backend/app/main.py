@@ -1,13 +1,23 @@
-from . import crud, schemas, database
+from . import crud, models, schemas, database, file_scanner
+from .folder_watcher import folder_watcher
+from .param_backfill import generation_param_backfill
+from .scan_jobs import scan_job_manager
+from .scan_progress import scan_progress_broker
+from .thumbnail_cache import thumbnail_cache
+from .thumbnail_generator import width_bucket
+from .thumbnail_jobs import thumbnail_pregeneration
+from .thumbnail_workers import PRIORITY_PREFETCH, PRIORITY_VISIBLE, thumbnail_workers
 import uuid
 import asyncio
-from typing import List, Optional, Dict
+import struct
+from typing import List, Optional, Dict, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import (
-    FastAPI, Depends, HTTPException, BackgroundTasks, Query
+    FastAPI, Depends, HTTPException, Query, Request, Response
 )
+from contextlib import aclosing
 from pathlib import Path
 import subprocess
 import platform
@@ -46,8 +56,27 @@ app.add_middleware(
 async def on_startup():
     logger.info("Initializing application...")
     await database.create_db_and_tables()
+    async with database.AsyncSessionLocal() as db:
+        # Compressed metadata cannot be read or written without them
+        await crud.load_metadata_dictionaries(db)
+    await scan_job_manager.start()
+    await folder_watcher.start()
+    generation_param_backfill.start()
+    thumbnail_cache.start()
+    thumbnail_pregeneration.start(sweep=True)
     logger.info("Application startup complete")
 
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await thumbnail_pregeneration.stop()
+    await thumbnail_workers.stop()
+    await thumbnail_cache.stop()
+    await generation_param_backfill.stop()
+    await folder_watcher.stop()
+    await scan_job_manager.stop()
+    file_scanner.shutdown_probe_executor()
+
 # --- API Endpoints ---
 
 # --- Keep Folder Endpoints (/api/folders, /api/folders/{id}/scan, etc.) ---
@@ -56,7 +85,6 @@ async def on_startup():
 @app.post("/api/folders", response_model=schemas.Folder, status_code=201)
 async def add_folder(
     folder_in: schemas.FolderCreate,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(database.get_db)
 ):
     logger.info(f"Received request to add folder: {folder_in.path}")
@@ -127,8 +155,8 @@ async def add_folder(
             f"Folder added to database: {created_folder.path} "
             f"(ID: {created_folder.id})"
         )
-        background_tasks.add_task(
-            crud.scan_folder_and_update_db, db, created_folder)
+        await scan_job_manager.submit(created_folder.id)
+        folder_watcher.watch(created_folder.id, created_folder.path)
         return created_folder
     except Exception as e:
         logger.error(
@@ -152,12 +180,24 @@ async def list_folders(db: AsyncSession = Depends(database.get_db)):
     return folders
 
 
-@app.post("/api/folders/{folder_id}/scan", response_model=schemas.ScanStatus)
+@app.post("/api/folders/{folder_id}/scan", response_model=schemas.ScanJob, status_code=202)
 async def refresh_folder(
     folder_id: int,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    full: bool = Query(
+        False,
+        description="Force a full scan instead of skipping unchanged directories"),
+    wait: bool = Query(
+        False,
+        description="Wait for the scan to finish before responding"),
     db: AsyncSession = Depends(database.get_db)
 ):
+    """Queue a scan job for a folder and return it.
+
+    If the folder already has a queued or running scan, that job is returned
+    instead of starting a second one. Progress can be followed through
+    /api/folders/{folder_id}/scan/events or /api/scan-jobs/{job_id}.
+    """
     logger.info(
         f"Received request to refresh folder ID: {folder_id}"
     )
@@ -166,29 +206,106 @@ async def refresh_folder(
         raise HTTPException(status_code=404,
                             detail=f"Folder with ID {folder_id} not found")
 
-    try:
-        scan_result = await crud.scan_folder_and_update_db(
-            db,
-            folder
-        )
+    job, created = await scan_job_manager.submit(folder_id, force_full=full)
+    if not created:
         logger.info(
-            f"Manual scan completed for folder ID "
-            f"{folder_id}"
-        )
-        return scan_result
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        logger.error(
-            f"Error during manual scan for folder ID {folder_id}: {e}",
-            exc_info=True
+            f"Folder ID {folder_id} already has scan job {job.id} "
+            f"({job.status})"
         )
+    if not wait:
+        return job
+
+    await scan_job_manager.wait(job.id)
+    job = await crud.get_scan_job(db, job.id)
+    if job.status == "failed":
         raise HTTPException(
             status_code=500,
             detail=(
-                f"Scan failed: {str(e)}"
+                f"Scan failed: {job.error}"
             )
         )
+    response.status_code = 200
+    return job
+
+
+@app.get("/api/scan-jobs", response_model=List[schemas.ScanJob])
+async def list_scan_jobs(
+    folder_id: Optional[int] = Query(None, description="Only jobs of this folder"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(database.get_db)
+):
+    return await crud.get_scan_jobs(db, folder_id=folder_id, limit=limit)
+
+
+@app.get("/api/scan-jobs/{job_id}", response_model=schemas.ScanJob)
+async def get_scan_job(
+    job_id: int,
+    db: AsyncSession = Depends(database.get_db)
+):
+    job = await crud.get_scan_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404,
+                            detail=f"Scan job with ID {job_id} not found")
+    return job
+
+
+@app.post("/api/scan-jobs/{job_id}/cancel", response_model=schemas.ScanJob)
+async def cancel_scan_job(
+    job_id: int,
+    db: AsyncSession = Depends(database.get_db)
+):
+    job = await crud.get_scan_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404,
+                            detail=f"Scan job with ID {job_id} not found")
+    if not await scan_job_manager.cancel(job_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Scan job {job_id} is not running (status: {job.status})")
+    await db.refresh(job)
+    return job
+
+
+# Seconds between SSE keep-alive comments when no progress is published
+SCAN_EVENTS_KEEPALIVE_SECONDS = 15.0
+
+
+@app.get("/api/folders/{folder_id}/scan/events")
+async def scan_events(
+    folder_id: int,
+    request: Request,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """Server-Sent Events stream of scan progress for a folder.
+
+    Sends the last known state on connect, then a `progress` event whenever a
+    scan of the folder reports progress (throttled by the scanner).
+    """
+    folder = await crud.get_folder(db, folder_id)
+    if not folder:
+        raise HTTPException(status_code=404,
+                            detail=f"Folder with ID {folder_id} not found")
+
+    async def event_stream():
+        updates = scan_progress_broker.subscribe(
+            folder_id, timeout=SCAN_EVENTS_KEEPALIVE_SECONDS)
+        async with aclosing(updates):
+            async for progress in updates:
+                if await request.is_disconnected():
+                    break
+                if progress is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: progress\ndata: {progress.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 
 @app.delete("/api/folders/{folder_id}", status_code=204)
@@ -197,10 +314,13 @@ async def remove_folder(
     db: AsyncSession = Depends(
         database.get_db)):
     logger.info(f"Received request to delete folder ID: {folder_id}")
+    await scan_job_manager.cancel_folder(folder_id)
     success = await crud.delete_folder(db, folder_id)
     if not success:
         raise HTTPException(status_code=404,
                             detail=f"Folder with ID {folder_id} not found")
+    folder_watcher.unwatch(folder_id)
+    scan_progress_broker.forget(folder_id)
     logger.info(
         f"Folder ID "
         f"{folder_id} "
@@ -211,8 +331,29 @@ async def remove_folder(
 # --- UPDATE Image List Endpoint ---
 
 
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Resolve a `fields=` query value, 400 for unknown names."""
+    if fields is None:
+        return None
+    try:
+        return crud.resolve_image_fields(fields.split(","))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e}. Available fields: "
+                   f"{', '.join(crud.IMAGE_FIELDS + tuple(crud.IMAGE_FIELD_ALIASES))}")
+
+
+_FIELDS_DESCRIPTION = (
+    "Comma-separated fields to return, e.g. id,filename,width,height,thumbnail. "
+    "Only these columns are read; the metadata graph is left out unless "
+    "'metadata' is listed (see /api/images/{image_id}/metadata)")
+
+
 # Use new response model
-@app.get("/api/images", response_model=schemas.ImageListResponse)
+@app.get("/api/images",
+         response_model=Union[schemas.ImageListResponse, schemas.ImageFieldsListResponse],
+         response_model_exclude_unset=True)
 async def list_images(
     folder_id: int,
     skip: int = Query(0, ge=0),  # Add skip query param, >= 0
@@ -224,14 +365,23 @@ async def list_images(
     sort_dir: str = Query("asc", description="Sort direction (asc, desc)"),
     file_types: Optional[List[str]] = Query(
         None, description="Filter by file extensions (e.g., .png, .jpg)"),
+    model: Optional[str] = Query(None, description="Filter by checkpoint name"),
+    sampler: Optional[str] = Query(None, description="Filter by sampler name"),
+    seed: Optional[int] = Query(None, ge=-(1 << 63), lt=1 << 64, description="Filter by seed"),
+    cfg_min: Optional[float] = Query(None, description="Minimum CFG scale"),
+    cfg_max: Optional[float] = Query(None, description="Maximum CFG scale"),
+    lora: Optional[str] = Query(None, description="Only images using this LoRA"),
+    fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION),
     db: AsyncSession = Depends(database.get_db)
 ):
     """Lists cached images for a specific folder with pagination, sorting, and filtering."""
     logger.info(
         f"Request images: folder={folder_id}, skip={skip}, limit={limit}, "
         f"sort={sort_by} {sort_dir}, "
-        f"types={file_types}"
+        f"types={file_types}, model={model}, sampler={sampler}, seed={seed}, "
+        f"cfg={cfg_min}..{cfg_max}, lora={lora}, fields={fields}"
     )
+    field_list = _parse_fields(fields)
 
     if sort_by not in ["filename", "date", "folder"]:
         sort_by = "filename"
@@ -250,11 +400,82 @@ async def list_images(
         limit=limit,
         sort_by=sort_by,
         sort_dir=sort_dir,
-        file_types=file_types
+        file_types=file_types,
+        model=model,
+        sampler=sampler,
+        seed=seed,
+        cfg_min=cfg_min,
+        cfg_max=cfg_max,
+        lora=lora,
+        fields=field_list
     )
     return image_response
 
 
+@app.get("/api/images/{image_id}/metadata", response_model=schemas.ImageMetadata)
+async def get_image_metadata(
+    image_id: int,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """The ComfyUI metadata graph of one image, for lists fetched without it."""
+    metadata = await crud.get_image_metadata(db, image_id)
+    if metadata is None:
+        raise HTTPException(status_code=404,
+                            detail=f"Image with ID {image_id} not found")
+    return metadata
+
+
+@app.get("/api/metadata-graphs/{graph_hash}", response_model=schemas.MetadataGraph)
+async def get_metadata_graph(
+    graph_hash: str,
+    response: Response,
+    db: AsyncSession = Depends(database.get_db)
+):
+    """A shared metadata graph by content hash (see fields=graph on /api/images).
+
+    The content of a hash never changes, so clients may cache it forever.
+    """
+    graph = await crud.get_metadata_graph(db, graph_hash)
+    if graph is None:
+        raise HTTPException(status_code=404,
+                            detail=f"Metadata graph {graph_hash} not found")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return graph
+
+
+@app.get("/api/search",
+         response_model=Union[schemas.ImageListResponse, schemas.ImageFieldsListResponse],
+         response_model_exclude_unset=True)
+async def search_images(
+    q: str = Query(..., description="Words to find in prompts, model and LoRA names; "
+                                    "end a word with * for prefix matching"),
+    folder_id: Optional[int] = Query(None, description="Only search this folder"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(database.get_db)
+):
+    """Full-text prompt search, best matches first.
+
+    Very broad searches (more than GALLERYFLOW_SEARCH_RANK_MAX_MATCHES
+    matches) return the newest images first instead.
+    """
+    logger.info(f"Search images: q={q!r}, folder={folder_id}, skip={skip}, limit={limit}, "
+                f"fields={fields}")
+    field_list = _parse_fields(fields)
+    if not models.FTS5_AVAILABLE:
+        raise HTTPException(
+            status_code=503,
+            detail="Prompt search is not available: this SQLite build has no FTS5 support.")
+    if crud.search_match_expression(q) is None:
+        raise HTTPException(status_code=400, detail="Search query is empty.")
+    if folder_id is not None and not await crud.get_folder(db, folder_id):
+        raise HTTPException(status_code=404,
+                            detail=f"Folder with ID {folder_id} not found")
+    return await crud.search_images(
+        db, q, folder_id=folder_id, skip=skip, limit=limit, fields=field_list)
+
+
 # --- Keep Image Serving Endpoint (/api/image) ---
 @app.get("/api/image")
 async def get_image_file(
@@ -338,15 +559,33 @@ async def get_image_file(
     return response
 
 
+_THUMBNAIL_SIZE_DESCRIPTION = (
+    "Thumbnail size: small (150px), medium (300px) or preview (the size the "
+    "image modals show, see GALLERYFLOW_THUMBNAIL_PREVIEW_SIZE)")
+_THUMBNAIL_WIDTH_DESCRIPTION = (
+    "Width in pixels, instead of size; snapped up to the next width bucket "
+    "(GALLERYFLOW_THUMBNAIL_WIDTHS)")
+_THUMBNAIL_PREFETCH_DESCRIPTION = (
+    "Thumbnails not on screen yet: generated after the visible ones, "
+    "before background pre-generation")
+
+
+def _thumbnail_size(size: str, width: Optional[int]) -> str:
+    return width_bucket(width) if width is not None else size
+
+
+def _thumbnail_priority(prefetch: bool) -> int:
+    return PRIORITY_PREFETCH if prefetch else PRIORITY_VISIBLE
+
+
 @app.get("/api/thumbnail")
 async def get_thumbnail(file_path: str = Query(...,
                                                description="Absolute path to the original image file"),
-                        size: str = Query("medium",
-                                          description="Thumbnail size: small (150px) or medium (300px)"),
+                        size: str = Query("medium", description=_THUMBNAIL_SIZE_DESCRIPTION),
+                        width: Optional[int] = Query(None, ge=1, description=_THUMBNAIL_WIDTH_DESCRIPTION),
+                        prefetch: bool = Query(False, description=_THUMBNAIL_PREFETCH_DESCRIPTION),
                         db: AsyncSession = Depends(database.get_db)):
     """Serve optimized thumbnails for faster loading."""
-    from .thumbnail_generator import thumbnail_generator
-
     # Security: Verify the image is in a mapped folder (same as main image
     # endpoint)
     requested_path = Path(file_path)
@@ -390,11 +629,35 @@ async def get_thumbnail(file_path: str = Query(...,
             status_code=403,
             detail="Access denied: File path is not within a registered folder.")
 
-    # Generate or get existing thumbnail
-    thumbnail_path = thumbnail_generator.generate_thumbnail(
-        str(resolved_requested_path), size)
-
-    if not thumbnail_path or not Path(thumbnail_path).exists():
+    # Get existing thumbnail or generate it in the thumbnail workers, off the
+    # event loop; concurrent requests for it wait on the same generation
+    image_path = str(resolved_requested_path)
+    size_name = _thumbnail_size(size, width)
+    thumb_path, thumb_bytes = await asyncio.to_thread(thumbnail_cache.lookup, image_path, size_name)
+    thumbnail_path = str(thumb_path) if thumb_bytes is not None else None
+    if thumb_path is not None and thumb_bytes is None:
+        thumbnail_path, placeholder = await thumbnail_workers.get(
+            image_path, size_name, _thumbnail_priority(prefetch))
+        if thumbnail_path is None:
+            thumbnail_cache.failed += 1
+        if placeholder is not None:
+            await crud.record_placeholders(db, {image_path: placeholder})
+    # The packed store's thumbnails are read from its memory-mapped packs,
+    # the file store's are sent as files
+    thumbnail_data = None
+    if thumbnail_path is not None:
+        if thumbnail_cache.generator.store.packed:
+            thumbnail_data = (await asyncio.to_thread(_read_thumbnails, [Path(thumbnail_path)]))[0]
+            thumb_bytes = len(thumbnail_data) if thumbnail_data is not None else None
+        elif thumb_bytes is None:
+            try:
+                thumb_bytes = Path(thumbnail_path).stat().st_size
+            except FileNotFoundError:
+                pass
+        if thumb_bytes is None:
+            thumbnail_path = None  # Evicted meanwhile
+
+    if thumbnail_path is None:
         # Fallback to original image if thumbnail generation fails
         thumbnail_path = str(resolved_requested_path)
         media_type = f'image/{resolved_requested_path.suffix.lstrip(".")}'
@@ -402,24 +665,129 @@ async def get_thumbnail(file_path: str = Query(...,
             media_type = 'image/jpeg'
     else:
         media_type = 'image/webp'  # Thumbnails are saved as WebP
+        thumbnail_cache.bytes_served += thumb_bytes
 
     logger.info(
         f"Serving thumbnail: {thumbnail_path}"
     )
-    response = FileResponse(thumbnail_path, media_type=media_type)
+    if thumbnail_data is not None:
+        response = Response(thumbnail_data, media_type=media_type)
+    else:
+        response = FileResponse(thumbnail_path, media_type=media_type)
 
     # Add aggressive caching for thumbnails since they rarely change
     # 30 days
     response.headers["Cache-Control"] = "public, max-age=2592000, immutable"
-    file_stat = Path(thumbnail_path).stat()
-    etag = (
-        f'"{hash(str(file_stat.st_mtime) + str(file_stat.st_size))}"'
-    )
+    if media_type == 'image/webp':
+        # Thumbnails are named after the source version; their mtime (or
+        # index entry) records the last use (see thumbnail_cache)
+        etag = f'"{Path(thumbnail_path).stem}"'
+    else:
+        file_stat = Path(thumbnail_path).stat()
+        etag = (
+            f'"{hash(str(file_stat.st_mtime) + str(file_stat.st_size))}"'
+        )
     response.headers["ETag"] = etag
 
     return response
 
 
+# Thumbnail pack entry header: image id and WebP length, little-endian uint32
+THUMBNAIL_PACK_ENTRY = struct.Struct("<II")
+MAX_THUMBNAIL_PACK_IDS = 1000
+# Cached thumbnails read per thread hop while streaming a pack
+THUMBNAIL_PACK_READ_BATCH = 32
+
+
+def _read_thumbnails(paths: List[Path]) -> List[Optional[bytes]]:
+    """The thumbnails' WebP data, None where one was evicted or swept meanwhile."""
+    store = thumbnail_cache.generator.store
+    return [store.read(path.stem) for path in paths]
+
+
+async def _thumbnail_pack(image_ids: List[int], image_paths: Dict[int, str], size: str, priority: int):
+    def lookup():
+        return [thumbnail_cache.lookup(image_paths[image_id], size) if image_id in image_paths
+                else (None, None)
+                for image_id in image_ids]
+
+    def entry(image_id: int, data: Optional[bytes]) -> bytes:
+        if not data:
+            return THUMBNAIL_PACK_ENTRY.pack(image_id, 0)
+        thumbnail_cache.bytes_served += len(data)
+        return THUMBNAIL_PACK_ENTRY.pack(image_id, len(data)) + data
+
+    lookups = await asyncio.to_thread(lookup)
+    cached = [(image_id, thumb_path) for image_id, (thumb_path, thumb_bytes) in zip(image_ids, lookups)
+              if thumb_bytes is not None]
+    missing = [image_id for image_id, (thumb_path, thumb_bytes) in zip(image_ids, lookups)
+               if thumb_path is not None and thumb_bytes is None]
+    failed = [image_id for image_id, (thumb_path, _) in zip(image_ids, lookups) if thumb_path is None]
+    if failed:
+        yield b"".join(entry(image_id, None) for image_id in failed)
+    for start in range(0, len(cached), THUMBNAIL_PACK_READ_BATCH):
+        batch = cached[start:start + THUMBNAIL_PACK_READ_BATCH]
+        data = await asyncio.to_thread(_read_thumbnails, [thumb_path for _, thumb_path in batch])
+        yield b"".join(entry(image_id, thumb_data) for (image_id, _), thumb_data in zip(batch, data))
+    if missing:
+        # Placeholders come from the same decode and are saved together once
+        # the pack is sent (also when the client goes away early)
+        placeholders = {}
+        try:
+            async with aclosing(thumbnail_workers.generate(
+                    [image_paths[image_id] for image_id in missing], [size], priority,
+                    placeholders=True)) as results:
+                async for index, (thumb_path,), placeholder in results:
+                    if placeholder is not None:
+                        placeholders[image_paths[missing[index]]] = placeholder
+                    data = None
+                    if thumb_path is not None:
+                        data = (await asyncio.to_thread(_read_thumbnails, [Path(thumb_path)]))[0]
+                    yield entry(missing[index], data)
+        finally:
+            if placeholders:
+                async with database.AsyncSessionLocal() as db:
+                    await crud.record_placeholders(db, placeholders)
+
+
+@app.get("/api/thumbnails")
+async def get_thumbnails(ids: str = Query(..., description=f"Comma-separated image ids, at most {MAX_THUMBNAIL_PACK_IDS}"),
+                         size: str = Query("medium", description=_THUMBNAIL_SIZE_DESCRIPTION),
+                         width: Optional[int] = Query(None, ge=1, description=_THUMBNAIL_WIDTH_DESCRIPTION),
+                         prefetch: bool = Query(False, description=_THUMBNAIL_PREFETCH_DESCRIPTION),
+                         db: AsyncSession = Depends(database.get_db)):
+    """Thumbnails of many images (a grid page) in one response.
+
+    The body is a pack of entries, each the image id and a length as
+    little-endian uint32 followed by that many bytes of WebP. A length of 0
+    means there is no thumbnail (unknown id, missing file or failure); use
+    /api/image for those. Cached thumbnails come first, in the order of
+    `ids`, then the others as the thumbnail workers generate them. Images
+    are looked up by id, so only images of mapped folders are served.
+    """
+    try:
+        image_ids = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers.")
+    if len(image_ids) > MAX_THUMBNAIL_PACK_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_THUMBNAIL_PACK_IDS} ids per request.")
+    image_paths = await crud.get_image_paths(db, image_ids)
+    return StreamingResponse(
+        _thumbnail_pack(image_ids, image_paths, _thumbnail_size(size, width), _thumbnail_priority(prefetch)),
+        media_type="application/vnd.galleryflow.thumbnail-pack",
+        # Thumbnail versions change with the images; clients cache the entries
+        headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/thumbnails/stats", response_model=schemas.ThumbnailCacheStats)
+async def get_thumbnail_cache_stats(db: AsyncSession = Depends(database.get_db)):
+    """Thumbnail cache size, budget and hit/miss/generate counters since startup,
+    and how many images have no thumbnails yet."""
+    return {**thumbnail_cache.stats(), "pending": await crud.count_pending_thumbnails(db)}
+
+
 @app.post("/api/reveal-in-explorer", status_code=200)
 async def reveal_file(file_path: str = Query(...,
                                              description="Absolute path to the image file to reveal"),
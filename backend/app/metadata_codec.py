@@ -0,0 +1,158 @@
+import json
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, Union
+
+from sqlalchemy.types import Text, TypeDecorator
+
+from . import config
+
+# Compressed values are stored as BLOBs: FORMAT_ZLIB, the id of the
+# dictionary they were compressed with (4 bytes big-endian, 0 for none) and a
+# raw deflate stream of their compact JSON. Everything else in a metadata
+# column is plain JSON text, as written by older versions or with the "json" codec.
+FORMAT_ZLIB = 1
+HEADER_SIZE = 5
+
+# zlib only looks back 32 KiB, so a larger dictionary would not help
+DICTIONARY_SIZE = 32 * 1024
+# Fewer samples than this make a dictionary that is mostly one image
+MIN_TRAINING_SAMPLES = 50
+
+# Splits compact JSON after each separator, so keys, short values and the
+# node structure around them become dictionary candidates
+_FRAGMENT = re.compile(r'[^,{}\[\]]*[,{}\[\]]|[^,{}\[\]]+$')
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def train_dictionary(samples: Iterable[Any], size: int = DICTIONARY_SIZE) -> bytes:
+    """Build a zlib preset dictionary from sample values.
+
+    zlib has no trainer of its own; a preset dictionary is just text the
+    compressor can refer back to. This keeps the JSON fragments found in more
+    than one sample, scored by how many bytes they would save, and puts the
+    best ones last, where back references to them are shortest.
+    """
+    counts = Counter()
+    for sample in samples:
+        # Fragments repeated inside one value are compressed well without help
+        counts.update(set(_FRAGMENT.findall(_dumps(sample).decode("utf-8"))))
+    fragments = sorted(
+        (fragment for fragment, count in counts.items() if count > 1 and len(fragment) > 3),
+        key=lambda fragment: counts[fragment] * len(fragment), reverse=True)
+    chosen = []
+    used = 0
+    for fragment in fragments:
+        encoded = fragment.encode("utf-8")
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+class EncodedJSON:
+    """A stored metadata value that is only decoded when it is used."""
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: Union[str, bytes]):
+        self.raw = raw
+
+    def decode(self) -> Any:
+        return metadata_codec.decode(self.raw)
+
+
+class MetadataCodec:
+    """Encodes JSON values for the metadata columns, see CompressedJSON.
+
+    With codec "zlib" values are compressed with the newest dictionary
+    registered through use_dictionaries (dictionaries are stored in
+    models.MetadataDictionary and loaded at startup); "json" writes plain
+    JSON. Both formats are always readable.
+    """
+
+    def __init__(self, codec: str = config.METADATA_CODEC,
+                 level: int = config.METADATA_COMPRESSION_LEVEL):
+        self.enabled = codec == "zlib"
+        self.level = level
+        self.dictionary_id = 0
+        self._dictionaries: Dict[int, bytes] = {}
+
+    def use_dictionaries(self, dictionaries: Dict[int, bytes]):
+        """Register dictionaries by id; the highest id is used for new values."""
+        self._dictionaries.update(dictionaries)
+        if self._dictionaries:
+            self.dictionary_id = max(self._dictionaries)
+
+    def header(self) -> bytes:
+        """Prefix of values encoded with the current settings."""
+        return bytes([FORMAT_ZLIB]) + self.dictionary_id.to_bytes(4, "big")
+
+    def encode(self, value: Any) -> Union[str, bytes, None]:
+        if value is None:
+            return None
+        if not self.enabled or not isinstance(value, dict):
+            # Only objects are compressed, so every BLOB holds a JSON object
+            return json.dumps(value)
+        dictionary = self._dictionaries.get(self.dictionary_id)
+        if dictionary:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return self.header() + compressor.compress(_dumps(value)) + compressor.flush()
+
+    def decode(self, raw: Union[str, bytes, None]) -> Any:
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            return json.loads(raw)
+        if raw[0] != FORMAT_ZLIB:
+            raise ValueError(f"Unknown metadata format {raw[0]}")
+        dictionary_id = int.from_bytes(raw[1:HEADER_SIZE], "big")
+        if dictionary_id:
+            dictionary = self._dictionaries.get(dictionary_id)
+            if dictionary is None:
+                raise ValueError(f"Metadata dictionary {dictionary_id} is not loaded")
+            decompressor = zlib.decompressobj(-15, zdict=dictionary)
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return json.loads(decompressor.decompress(raw[HEADER_SIZE:]) + decompressor.flush())
+
+
+def loads(value: Any) -> Any:
+    """The value of a CompressedJSON(lazy=True) column, decoded if needed."""
+    return value.decode() if isinstance(value, EncodedJSON) else value
+
+
+class CompressedJSON(TypeDecorator):
+    """A JSON column stored through metadata_codec.
+
+    With lazy=True rows come back as EncodedJSON and are only decompressed
+    and parsed when loads() is called on them, e.g. by Image.metadata_.
+    """
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, lazy: bool = False):
+        super().__init__()
+        self.lazy = lazy
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, EncodedJSON):
+            return value.raw
+        return metadata_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if self.lazy:
+            return EncodedJSON(value)
+        return metadata_codec.decode(value)
+
+
+# Global codec instance
+metadata_codec = MetadataCodec()
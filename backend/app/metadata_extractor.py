@@ -1,140 +1,317 @@
+import importlib
 import json
-from PIL import Image as PILImage  # Use alias to avoid conflict with model name
 import logging
-from typing import Optional, Dict, Any
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from . import config
+from .image_probe import probe_image
 
 logger = logging.getLogger(__name__)
 
+# PNG text chunks ComfyUI stores its graph in, in order of preference
+COMFYUI_TEXT_KEYS = ('prompt', 'workflow')
 
-def extract_comfyui_metadata(image_path: str) -> Optional[Dict[str, Any]]:
-    """Extracts ComfyUI metadata (often stored in 'prompt' or 'workflow' PNG chunks).
-    Also attempts to parse and flatten generation parameters from ComfyUI's node graph JSON structure.
+# Version of the mapping in generation_columns(). Rows stored with an older
+# version (or none) are re-derived by the generation-parameter backfill.
+GENERATION_PARAMS_VERSION = 1
+
+
+# Signature of node handlers: handler(node, inputs, result, prompts). They
+# copy what they understand from one node into the flat `result` dict of
+# extract_generation_params; prompt encoders append (title, text) to
+# `prompts`, which are assigned to positive/negative once all nodes are seen.
+NodeHandler = Callable[[Dict[str, Any], Any, Dict[str, Any], List[Tuple[str, str]]], None]
+
+
+class _NodeMatcher(NamedTuple):
+    class_types: FrozenSet[str]
+    prefixes: Tuple[str, ...]
+    contains: Tuple[str, ...]
+    handler: NodeHandler
+
+    def matches(self, class_type: str) -> bool:
+        return (class_type in self.class_types
+                or any(class_type.startswith(prefix) for prefix in self.prefixes)
+                or any(part in class_type for part in self.contains))
+
+
+_node_matchers: List[_NodeMatcher] = []
+# class_type -> handlers of all matchers for it, in registration order;
+# filled on first sight of each class type, cleared when handlers are added
+_node_dispatch: Dict[str, Tuple[NodeHandler, ...]] = {}
+
+
+def register_node_handler(
+        handler: Optional[NodeHandler] = None,
+        *,
+        class_types: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        contains: Iterable[str] = ()):
+    """Register a handler for ComfyUI nodes whose class_type matches.
+
+    A node matches if its class_type is one of `class_types`, starts with one
+    of `prefixes` or contains one of `contains`. Every matching handler runs,
+    in registration order, so a custom node pack can add its own samplers,
+    loaders or prompt nodes (see config.METADATA_NODE_HANDLER_MODULES) next
+    to the built-in ones. Usable as a decorator with keyword arguments.
+
+    Stored images are only re-derived with GENERATION_PARAMS_VERSION bumps,
+    so new handlers apply to images scanned from then on.
     """
-    def extract_generation_params(metadata_dict):
-        """
-        Traverse ComfyUI node graph to extract seed, prompts, denoise, steps, sampler, scheduler, model, LoRA, hires fix, etc.
-        Returns a flat dict with these fields if found, using fallbacks and heuristics.
-        """
-        result = {
-            'seed': None,
-            'steps': None,
-            'sampler': None,
-            'scheduler': None,
-            'cfg': None,
-            'denoise': None,
-            'model': None,
-            'hires_fix': None,
-            'hires_upscaler': None,
-            'lora_models': [],
-            'positive_prompt': None,
-            'negative_prompt': None,
-        }
-        if not isinstance(metadata_dict, dict):
-            return result
-        # ComfyUI prompt graph is usually a dict of node_id -> node
-        # Sometimes it's wrapped in a dict with 'nodes' key (for workflow). Try both.
-        nodes = metadata_dict
-        if 'nodes' in metadata_dict and isinstance(metadata_dict['nodes'], list):
-            # Workflow format: nodes is a list of dicts
-            nodes = {str(node['id']): node for node in metadata_dict['nodes'] if isinstance(node, dict) and 'id' in node}
-        # Track if we've found positive/negative prompt
-        prompts_found = []
-        for node_id, node in nodes.items():
-            class_type = node.get('class_type') or node.get('type')
-            inputs = node.get('inputs', {})
-            meta = node.get('_meta', {}) or {}
-            # Seed (KSampler, KSamplerAdvanced, etc.)
-            if class_type and ('KSampler' in class_type or class_type == 'BNK_Unsampler'):
-                seed = inputs.get('seed') or inputs.get('noise_seed')
-                if seed is not None:
-                    result['seed'] = seed
-                cfg = inputs.get('cfg')
-                if cfg is not None:
-                    result['cfg'] = cfg
-                denoise = inputs.get('denoise')
-                if denoise is not None:
-                    result['denoise'] = denoise
-                steps = inputs.get('steps')
-                if steps is not None:
-                    result['steps'] = steps
-                sampler = inputs.get('sampler_name')
-                if sampler is not None:
-                    result['sampler'] = sampler
-                scheduler = inputs.get('scheduler')
-                if scheduler is not None:
-                    result['scheduler'] = scheduler
-            # Model (CheckpointLoaderSimple)
-            if class_type == 'CheckpointLoaderSimple':
-                model_name = inputs.get('ckpt_name')
-                if model_name:
-                    result['model'] = model_name
-            # LoRA Models
-            if class_type == 'LoraLoader':
-                lora_name = inputs.get('lora_name')
-                lora_weight = inputs.get('strength_model')
-                if lora_name:
-                    result['lora_models'].append({
-                        'name': lora_name,
-                        'weight': lora_weight
-                    })
-            # Hires Fix (look for upscalers or related nodes)
-            if class_type and ('Upscale' in class_type or 'Scale' in class_type):
-                scale = inputs.get('scale_by') or inputs.get('scale')
-                upscaler = inputs.get('upscale_method') or inputs.get('upscaler')
-                if scale is not None:
-                    result['hires_fix'] = scale
-                if upscaler is not None:
-                    result['hires_upscaler'] = upscaler
-            # Prompts (positive/negative/general)
-            if class_type and (class_type.startswith('CLIPTextEncode') or class_type == 'ttN text'):
-                text = inputs.get('text')
-                title = meta.get('title', '').lower()
-                if text:
-                    prompts_found.append((title, text))
-        # Assign prompts to positive/negative fields
-        if prompts_found:
-            # Try to assign based on title
-            for title, text in prompts_found:
-                if 'negative' in title and not result['negative_prompt']:
-                    result['negative_prompt'] = text
-                elif ('positive' in title or 'prompt' in title or 'encode' in title) and not result['positive_prompt']:
-                    result['positive_prompt'] = text
-            # Fallback: assign first to positive, second to negative if not set
-            if not result['positive_prompt'] and prompts_found:
-                result['positive_prompt'] = prompts_found[0][1]
-            if not result['negative_prompt'] and len(prompts_found) > 1:
-                result['negative_prompt'] = prompts_found[1][1]
-        # Clean up: remove empty lora_models if none found
-        if not result['lora_models']:
-            result.pop('lora_models')
+    def register(handler: NodeHandler) -> NodeHandler:
+        _node_matchers.append(_NodeMatcher(
+            frozenset(class_types), tuple(prefixes), tuple(contains), handler))
+        _node_dispatch.clear()
+        return handler
+
+    return register if handler is None else register(handler)
+
+
+def _node_handlers(class_type) -> Tuple[NodeHandler, ...]:
+    try:
+        return _node_dispatch[class_type]
+    except KeyError:
+        handlers = tuple(
+            matcher.handler for matcher in _node_matchers if matcher.matches(class_type))
+        _node_dispatch[class_type] = handlers
+        return handlers
+
+
+def _copy_inputs(inputs, result: Dict[str, Any], fields: Mapping[str, str]):
+    """result[field] = inputs[name] for the inputs that are set."""
+    for field, name in fields.items():
+        value = inputs.get(name)
+        if value is not None:
+            result[field] = value
+
+
+# --- Built-in node handlers ---
+
+# Sampler inputs copied as they are: result field -> input name
+_SAMPLER_INPUTS = {
+    'cfg': 'cfg',
+    'denoise': 'denoise',
+    'steps': 'steps',
+    'sampler': 'sampler_name',
+    'scheduler': 'scheduler',
+}
+
+
+@register_node_handler(contains=('KSampler',), class_types=('BNK_Unsampler',))
+def _sampler_node(node, inputs, result, prompts):
+    seed = inputs.get('seed') or inputs.get('noise_seed')
+    if seed is not None:
+        result['seed'] = seed
+    _copy_inputs(inputs, result, _SAMPLER_INPUTS)
+
+
+@register_node_handler(class_types=('CheckpointLoaderSimple',))
+def _checkpoint_node(node, inputs, result, prompts):
+    model_name = inputs.get('ckpt_name')
+    if model_name:
+        result['model'] = model_name
+
+
+@register_node_handler(class_types=('LoraLoader',))
+def _lora_node(node, inputs, result, prompts):
+    lora_name = inputs.get('lora_name')
+    lora_weight = inputs.get('strength_model')
+    if lora_name:
+        result['lora_models'].append({
+            'name': lora_name,
+            'weight': lora_weight
+        })
+
+
+# Hires fix: upscalers and related nodes
+@register_node_handler(contains=('Upscale', 'Scale'))
+def _upscale_node(node, inputs, result, prompts):
+    scale = inputs.get('scale_by') or inputs.get('scale')
+    upscaler = inputs.get('upscale_method') or inputs.get('upscaler')
+    if scale is not None:
+        result['hires_fix'] = scale
+    if upscaler is not None:
+        result['hires_upscaler'] = upscaler
+
+
+@register_node_handler(prefixes=('CLIPTextEncode',), class_types=('ttN text',))
+def _prompt_node(node, inputs, result, prompts):
+    text = inputs.get('text')
+    meta = node.get('_meta', {}) or {}
+    title = meta.get('title', '').lower()
+    if text:
+        prompts.append((title, text))
+
+
+def extract_generation_params(metadata_dict):
+    """
+    Traverse ComfyUI node graph to extract seed, prompts, denoise, steps, sampler, scheduler, model, LoRA, hires fix, etc.
+    Returns a flat dict with these fields if found, using fallbacks and heuristics.
+    Each node is passed to the handlers registered for its class_type (see
+    register_node_handler).
+    """
+    result = {
+        'seed': None,
+        'steps': None,
+        'sampler': None,
+        'scheduler': None,
+        'cfg': None,
+        'denoise': None,
+        'model': None,
+        'hires_fix': None,
+        'hires_upscaler': None,
+        'lora_models': [],
+        'positive_prompt': None,
+        'negative_prompt': None,
+    }
+    if not isinstance(metadata_dict, dict):
         return result
+    # ComfyUI prompt graph is usually a dict of node_id -> node
+    # Sometimes it's wrapped in a dict with 'nodes' key (for workflow). Try both.
+    if 'nodes' in metadata_dict and isinstance(metadata_dict['nodes'], list):
+        # Workflow format: nodes is a list of dicts; of nodes sharing an id
+        # the last one counts (at the first one's position)
+        nodes = {str(node['id']): node for node in metadata_dict['nodes']
+                 if isinstance(node, dict) and 'id' in node}.values()
+    else:
+        nodes = metadata_dict.values()
+    # Track if we've found positive/negative prompt
+    prompts_found = []
+    for node in nodes:
+        class_type = node.get('class_type') or node.get('type')
+        if not class_type:
+            continue
+        handlers = _node_handlers(class_type)
+        if handlers:
+            inputs = node.get('inputs', {})
+            for handler in handlers:
+                handler(node, inputs, result, prompts_found)
+    # Assign prompts to positive/negative fields
+    if prompts_found:
+        # Try to assign based on title
+        for title, text in prompts_found:
+            if 'negative' in title and not result['negative_prompt']:
+                result['negative_prompt'] = text
+            elif ('positive' in title or 'prompt' in title or 'encode' in title) and not result['positive_prompt']:
+                result['positive_prompt'] = text
+        # Fallback: assign first to positive, second to negative if not set
+        if not result['positive_prompt'] and prompts_found:
+            result['positive_prompt'] = prompts_found[0][1]
+        if not result['negative_prompt'] and len(prompts_found) > 1:
+            result['negative_prompt'] = prompts_found[1][1]
+    # Clean up: remove empty lora_models if none found
+    if not result['lora_models']:
+        result.pop('lora_models')
+    return result
 
 
+def parse_comfyui_metadata(
+        text_chunks: Mapping[str, str],
+        image_format: Optional[str] = "PNG") -> Optional[Dict[str, Any]]:
+    """Parse ComfyUI metadata from an image's text chunks ('prompt' or 'workflow').
+
+    Also flattens generation parameters from the node graph into the returned
+    dict. Returns None if there is no (valid) ComfyUI metadata.
+    """
+    if image_format != "PNG":
+        return None  # Only handle PNG for now
+    raw_metadata = text_chunks.get('prompt') or text_chunks.get('workflow')
+    if not raw_metadata:
+        return None
     try:
-        img = PILImage.open(image_path)
-        if img.format == "PNG":
-            prompt_data = img.info.get('prompt')
-            workflow_data = img.info.get('workflow')
-            raw_metadata = None
-            if prompt_data:
-                raw_metadata = prompt_data
-            elif workflow_data:
-                raw_metadata = workflow_data
-            if raw_metadata:
-                try:
-                    metadata = json.loads(raw_metadata)
-                    # Extract flattened generation params
-                    gen_params = extract_generation_params(metadata)
-                    # Merge extracted fields into metadata dict for frontend
-                    if isinstance(metadata, dict):
-                        metadata.update(gen_params)
-                    return metadata  # Return the node graph as top-level dict, as frontend expects
-                except Exception:
-                    pass
-        else:
-            pass  # Only handle PNG for now
-    except FileNotFoundError:
-        pass
+        metadata = json.loads(raw_metadata)
+        # Extract flattened generation params
+        gen_params = extract_generation_params(metadata)
+        # Merge extracted fields into metadata dict for frontend
+        if isinstance(metadata, dict):
+            metadata.update(gen_params)
+        return metadata  # Return the node graph as top-level dict, as frontend expects
     except Exception:
-        pass
-    return None  # Return None if no metadata found or error occurs
\ No newline at end of file
+        return None
+
+
+def extract_comfyui_metadata(image_path: str) -> Optional[Dict[str, Any]]:
+    """Extracts ComfyUI metadata (often stored in 'prompt' or 'workflow' PNG chunks).
+    Also attempts to parse and flatten generation parameters from ComfyUI's node graph JSON structure.
+    """
+    probe = probe_image(image_path, COMFYUI_TEXT_KEYS)
+    if probe is None:
+        return None  # Return None if the file could not be read
+    return parse_comfyui_metadata(probe.text_chunks, probe.format)
+
+
+def _as_int(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None
+
+
+def _as_float(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _as_str(value) -> Optional[str]:
+    return value if isinstance(value, str) and value else None
+
+
+def seed_to_db(seed: Optional[int]) -> Optional[int]:
+    """Map a seed onto SQLite's signed 64-bit INTEGER.
+
+    ComfyUI seeds go up to 2**64 - 1; seeds above 2**63 - 1 are stored as their
+    two's complement so they still fit the indexed seed column. Filters must
+    map the seed they look for the same way.
+    """
+    if seed is None or not -(1 << 63) <= seed < (1 << 64):
+        return None
+    return seed - (1 << 64) if seed >= (1 << 63) else seed
+
+
+def generation_columns(
+        metadata: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Tuple[str, Optional[float]]]]:
+    """Values for the generation-parameter columns of models.Image, plus its LoRAs.
+
+    Uses the flattened parameters merged into the metadata by
+    parse_comfyui_metadata (or derives them from the graph for metadata that
+    lacks them). Values of the wrong type, e.g. a seed that is a link to
+    another node, are stored as NULL. Returns (columns, [(lora name, weight)]).
+    """
+    params = {}
+    if isinstance(metadata, dict):
+        params = metadata if 'positive_prompt' in metadata else extract_generation_params(metadata)
+    columns = {
+        'seed': seed_to_db(_as_int(params.get('seed'))),
+        'steps': _as_int(params.get('steps')),
+        'sampler': _as_str(params.get('sampler')),
+        'scheduler': _as_str(params.get('scheduler')),
+        'cfg': _as_float(params.get('cfg')),
+        'denoise': _as_float(params.get('denoise')),
+        'model': _as_str(params.get('model')),
+        'positive_prompt': _as_str(params.get('positive_prompt')),
+        'negative_prompt': _as_str(params.get('negative_prompt')),
+        'params_version': GENERATION_PARAMS_VERSION,
+    }
+    loras = []
+    lora_models = params.get('lora_models')
+    if isinstance(lora_models, list):
+        for lora in lora_models:
+            if isinstance(lora, dict) and _as_str(lora.get('name')):
+                loras.append((lora['name'], _as_float(lora.get('weight'))))
+    return columns, loras
+
+
+def _load_node_handler_modules():
+    # Imported here rather than at startup so probe worker processes get them too
+    for module in config.METADATA_NODE_HANDLER_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.error(f"Could not load metadata node handlers from {module}: {e}")
+
+
+_load_node_handler_modules()
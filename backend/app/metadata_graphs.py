@@ -0,0 +1,86 @@
+import hashlib
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+from . import metadata_extractor
+
+# Node inputs that change from image to image while the rest of a workflow
+# stays the same: seeds and prompt texts. They go into the per-image delta,
+# so images from the same workflow share one stored graph.
+VOLATILE_INPUTS = frozenset({"seed", "noise_seed", "text"})
+
+# Flattened generation parameters parse_comfyui_metadata merges into the graph
+_PARAM_KEYS = frozenset(metadata_extractor.extract_generation_params({})) | {"lora_models"}
+
+
+class SplitMetadata(NamedTuple):
+    """ComfyUI metadata split into a shareable graph and what is specific to one image."""
+    graph: Dict[str, Any]
+    hash: str
+    # {"inputs": [[node_id, input_name, value], ...], "params": {...}}, each key
+    # only if needed; None if the image adds nothing to the graph
+    delta: Optional[Dict[str, Any]]
+
+
+def graph_hash(graph: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON of a graph (sorted keys, no whitespace)."""
+    canonical = json.dumps(graph, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def split_metadata(metadata: Any) -> Optional[SplitMetadata]:
+    """Split stored image metadata into graph, content hash and per-image delta.
+
+    The volatile inputs of every node (see VOLATILE_INPUTS) are replaced with
+    null in the graph and recorded in the delta; links (lists) are part of the
+    graph. The flattened generation parameters are dropped, since
+    restore_metadata derives them again, unless they differ from what it
+    would derive. Returns None for metadata that is not a dict.
+    """
+    if not isinstance(metadata, dict):
+        return None
+    graph = {key: value for key, value in metadata.items() if key not in _PARAM_KEYS}
+    params = {key: value for key, value in metadata.items() if key in _PARAM_KEYS}
+    inputs = []
+    template = dict(graph)
+    for node_id, node in graph.items():
+        if not isinstance(node, dict) or not isinstance(node.get("inputs"), dict):
+            continue
+        node_inputs = node["inputs"]
+        volatile = [
+            name for name, value in node_inputs.items()
+            if name in VOLATILE_INPUTS and not isinstance(value, list)
+        ]
+        if volatile:
+            template[node_id] = {
+                **node, "inputs": {**node_inputs, **dict.fromkeys(volatile)}}
+            inputs.extend([node_id, name, node_inputs[name]] for name in volatile)
+
+    delta = {}
+    if inputs:
+        delta["inputs"] = inputs
+    if params != metadata_extractor.extract_generation_params(graph):
+        delta["params"] = params
+    return SplitMetadata(template, graph_hash(template), delta or None)
+
+
+def restore_metadata(graph: Dict[str, Any], delta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Rebuild the metadata split_metadata was given from its graph and delta.
+
+    Nodes without delta entries are shared with `graph`, so the result must
+    not be modified in place.
+    """
+    metadata = dict(graph)
+    delta = delta or {}
+    copied = set()
+    for node_id, name, value in delta.get("inputs", ()):
+        if node_id not in copied:
+            node = metadata[node_id]
+            metadata[node_id] = {**node, "inputs": dict(node["inputs"])}
+            copied.add(node_id)
+        metadata[node_id]["inputs"][name] = value
+    if "params" in delta:
+        metadata.update(delta["params"])
+    else:
+        metadata.update(metadata_extractor.extract_generation_params(metadata))
+    return metadata
@@ -0,0 +1,70 @@
+"""Add indexed generation-parameter columns and the image_loras table
+
+Revision ID: add_generation_param_columns
+Revises: add_image_performance_fields
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_generation_param_columns'
+down_revision = 'add_image_performance_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Promote generation parameters out of the metadata JSON."""
+    op.add_column('images', sa.Column('seed', sa.Integer, nullable=True))
+    op.add_column('images', sa.Column('steps', sa.Integer, nullable=True))
+    op.add_column('images', sa.Column('sampler', sa.String, nullable=True))
+    op.add_column('images', sa.Column('scheduler', sa.String, nullable=True))
+    op.add_column('images', sa.Column('cfg', sa.Float, nullable=True))
+    op.add_column('images', sa.Column('denoise', sa.Float, nullable=True))
+    op.add_column('images', sa.Column('model', sa.String, nullable=True))
+    op.add_column('images', sa.Column('positive_prompt', sa.Text, nullable=True))
+    op.add_column('images', sa.Column('negative_prompt', sa.Text, nullable=True))
+    op.add_column('images', sa.Column('params_version', sa.Integer, nullable=True))
+
+    op.create_index('idx_image_folder_model', 'images', ['folder_id', 'model'])
+    op.create_index('idx_image_folder_sampler', 'images', ['folder_id', 'sampler'])
+    op.create_index('idx_image_folder_seed', 'images', ['folder_id', 'seed'])
+    op.create_index('idx_image_folder_cfg', 'images', ['folder_id', 'cfg'])
+    op.create_index('idx_image_params_version', 'images', ['params_version', 'id'])
+
+    op.create_table(
+        'image_loras',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('image_id', sa.Integer, sa.ForeignKey('images.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('name', sa.String, nullable=False),
+        sa.Column('weight', sa.Float, nullable=True),
+    )
+    op.create_index('ix_image_loras_id', 'image_loras', ['id'])
+    op.create_index('idx_image_lora_name_image', 'image_loras', ['name', 'image_id'])
+    op.create_index('idx_image_lora_image', 'image_loras', ['image_id'])
+
+
+def downgrade():
+    """Drop the generation-parameter columns and the image_loras table."""
+    op.drop_table('image_loras')
+
+    op.drop_index('idx_image_params_version', 'images')
+    op.drop_index('idx_image_folder_cfg', 'images')
+    op.drop_index('idx_image_folder_seed', 'images')
+    op.drop_index('idx_image_folder_sampler', 'images')
+    op.drop_index('idx_image_folder_model', 'images')
+
+    op.drop_column('images', 'params_version')
+    op.drop_column('images', 'negative_prompt')
+    op.drop_column('images', 'positive_prompt')
+    op.drop_column('images', 'model')
+    op.drop_column('images', 'denoise')
+    op.drop_column('images', 'cfg')
+    op.drop_column('images', 'scheduler')
+    op.drop_column('images', 'sampler')
+    op.drop_column('images', 'steps')
+    op.drop_column('images', 'seed')
@@ -0,0 +1,28 @@
+"""Add the images.placeholder column for grid placeholders
+
+Revision ID: add_image_placeholders
+Revises: add_metadata_dictionaries
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_image_placeholders'
+down_revision = 'add_metadata_dictionaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the column; thumbnail pre-generation fills it in."""
+    op.add_column('images', sa.Column('placeholder', sa.String, nullable=True))
+    # Once: thumbnailed images are pending again, for their placeholder
+    op.execute("UPDATE images SET has_thumbnail = 0 WHERE has_thumbnail")
+
+
+def downgrade():
+    """Drop the placeholder column."""
+    op.drop_column('images', 'placeholder')
@@ -0,0 +1,57 @@
+"""Add the metadata_dictionaries table for compressed metadata
+
+Revision ID: add_metadata_dictionaries
+Revises: add_metadata_graphs
+Create Date: 2026-10-17
+
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_metadata_dictionaries'
+down_revision = 'add_metadata_graphs'
+branch_labels = None
+depends_on = None
+
+# Columns that may hold compressed values (see app.metadata_codec)
+COMPRESSED_COLUMNS = (
+    ('images', 'metadata'),
+    ('images', 'metadata_delta'),
+    ('metadata_graphs', 'graph'),
+)
+
+
+def upgrade():
+    """Add the dictionary table; existing rows are compressed by the application."""
+    op.create_table(
+        'metadata_dictionaries',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+        sa.Column('sample_count', sa.Integer, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+    )
+
+
+def downgrade():
+    """Write compressed metadata back as JSON text and drop the dictionaries."""
+    from app.metadata_codec import MetadataCodec
+
+    connection = op.get_bind()
+    codec = MetadataCodec("json")
+    codec.use_dictionaries({
+        row.id: row.data
+        for row in connection.execute(sa.text("SELECT id, data FROM metadata_dictionaries"))
+    })
+    for table, column in COMPRESSED_COLUMNS:
+        rows = connection.execute(sa.text(
+            f'SELECT id, "{column}" AS value FROM {table} WHERE typeof("{column}") = \'blob\'')).all()
+        for row in rows:
+            connection.execute(
+                sa.text(f'UPDATE {table} SET "{column}" = :value WHERE id = :id'),
+                {"value": json.dumps(codec.decode(row.value)), "id": row.id})
+
+    op.drop_table('metadata_dictionaries')
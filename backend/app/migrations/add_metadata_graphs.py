@@ -0,0 +1,61 @@
+"""Store metadata as shared graphs plus per-image deltas
+
+Revision ID: add_metadata_graphs
+Revises: add_generation_param_columns
+Create Date: 2026-10-17
+
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_metadata_graphs'
+down_revision = 'add_generation_param_columns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the metadata_graphs table and the image columns referring to it.
+
+    Existing rows keep their inline metadata; the application moves it into
+    shared graphs in the background after startup.
+    """
+    op.create_table(
+        'metadata_graphs',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('hash', sa.String, nullable=False),
+        sa.Column('graph', sa.JSON, nullable=False),
+    )
+    op.create_index('idx_metadata_graph_hash', 'metadata_graphs', ['hash'], unique=True)
+
+    op.add_column('images', sa.Column('graph_id', sa.Integer, nullable=True))
+    op.add_column('images', sa.Column('metadata_delta', sa.JSON, nullable=True))
+    op.create_index('idx_image_graph', 'images', ['graph_id'])
+
+
+def downgrade():
+    """Write every image's full metadata back inline and drop the graph table."""
+    from app.metadata_graphs import restore_metadata
+
+    connection = op.get_bind()
+    graphs = {
+        row.id: json.loads(row.graph)
+        for row in connection.execute(sa.text("SELECT id, graph FROM metadata_graphs"))
+    }
+    rows = connection.execute(sa.text(
+        "SELECT id, graph_id, metadata_delta FROM images WHERE graph_id IS NOT NULL")).all()
+    for row in rows:
+        delta = json.loads(row.metadata_delta) if row.metadata_delta else None
+        metadata = restore_metadata(graphs[row.graph_id], delta)
+        connection.execute(
+            sa.text("UPDATE images SET metadata = :metadata WHERE id = :id"),
+            {"metadata": json.dumps(metadata), "id": row.id})
+
+    op.drop_index('idx_image_graph', 'images')
+    op.drop_column('images', 'metadata_delta')
+    op.drop_column('images', 'graph_id')
+    op.drop_table('metadata_graphs')
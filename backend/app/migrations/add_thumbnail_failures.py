@@ -0,0 +1,26 @@
+"""Add the images.thumbnail_failed column for thumbnail pre-generation
+
+Revision ID: add_thumbnail_failures
+Revises: add_image_placeholders
+Create Date: 2026-10-17
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = 'add_thumbnail_failures'
+down_revision = 'add_image_placeholders'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add the column; NULL: no failed pre-generation."""
+    op.add_column('images', sa.Column('thumbnail_failed', sa.String, nullable=True))
+
+
+def downgrade():
+    """Drop the thumbnail_failed column."""
+    op.drop_column('images', 'thumbnail_failed')
@@ -1,5 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Index, Boolean
+import sqlite3
+from contextlib import closing
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, Boolean, Float, LargeBinary, DDL, event, column, table
 from sqlalchemy.orm import relationship
+from . import metadata_graphs
+from .metadata_codec import CompressedJSON, loads
 from .database import Base
 
 
@@ -10,6 +15,9 @@ class Folder(Base):
     path = Column(String, unique=True, index=True, nullable=False)
     # Relationship to images
     images = relationship("Image", back_populates="folder", cascade="all, delete-orphan")
+    # Directory mtimes recorded by the last scan, used for incremental rescans
+    manifest_entries = relationship("DirectoryManifest", back_populates="folder", cascade="all, delete-orphan")
+    scan_jobs = relationship("ScanJob", back_populates="folder", cascade="all, delete-orphan")
 
 
 class Image(Base):
@@ -19,8 +27,14 @@ class Image(Base):
     filename = Column(String, index=True, nullable=False)
     full_path = Column(String, unique=True, index=True, nullable=False)
     last_modified = Column(DateTime, nullable=False)
-    metadata_ = Column('metadata', JSON)
+    # Metadata is stored as a shared graph (MetadataGraph) plus a per-image
+    # delta; this column only holds metadata that could not be split (or rows
+    # not converted yet). Read it through the metadata_ property, which
+    # decodes it on first use.
+    metadata_json = Column('metadata', CompressedJSON(lazy=True))
     folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False)
+    graph_id = Column(Integer, ForeignKey("metadata_graphs.id"))
+    metadata_delta = Column(CompressedJSON)  # See metadata_graphs.SplitMetadata.delta
 
     # Performance optimization fields
     width = Column(Integer)  # Image dimensions for aspect ratio
@@ -28,9 +42,47 @@ class Image(Base):
     file_size = Column(Integer)  # File size in bytes
     thumbnail_path = Column(String)  # Path to generated thumbnail
     has_thumbnail = Column(Boolean, default=False)  # Quick check if thumbnail exists
+    # last_modified (as stored) of the version whose thumbnails could not be
+    # generated; pre-generation skips the image until its file changes
+    thumbnail_failed = Column(String)
+    # Base64 WebP of a few pixels the grid shows blurred until the thumbnail
+    # is loaded; made with its thumbnails, by pre-generation or on request
+    # (thumbnail_generator.make_placeholder)
+    placeholder = Column(String)
+
+    # Generation parameters promoted out of metadata_ so they can be filtered
+    # with index seeks (see metadata_extractor.generation_columns)
+    seed = Column(Integer)  # Seeds >= 2**63 are stored as two's complement
+    steps = Column(Integer)
+    sampler = Column(String)
+    scheduler = Column(String)
+    cfg = Column(Float)
+    denoise = Column(Float)
+    model = Column(String)
+    positive_prompt = Column(Text)
+    negative_prompt = Column(Text)
+    # GENERATION_PARAMS_VERSION the columns were derived with; NULL: not yet (backfill pending)
+    params_version = Column(Integer)
 
     # Relationship back to folder
     folder = relationship("Folder", back_populates="images")
+    loras = relationship("ImageLora", back_populates="image", cascade="all, delete-orphan",
+                         passive_deletes=True)
+    # Loaded with one extra query per result (only the distinct graphs of it)
+    graph = relationship("MetadataGraph", lazy="selectin")
+
+    @property
+    def metadata_(self):
+        """The image's ComfyUI metadata, rebuilt from its graph and delta."""
+        if self.graph is not None:
+            return metadata_graphs.restore_metadata(self.graph.graph, self.metadata_delta)
+        return loads(self.metadata_json)
+
+    @metadata_.setter
+    def metadata_(self, metadata):
+        self.metadata_json = metadata
+        self.graph = None
+        self.metadata_delta = None
 
     # Add indices for performance
     __table_args__ = (
@@ -38,4 +90,126 @@ class Image(Base):
         Index('idx_image_folder_filename', folder_id, filename),
         Index('idx_image_folder_modified', folder_id, last_modified),
         Index('idx_image_has_thumbnail', has_thumbnail),
-    )
\ No newline at end of file
+        # Thumbnail pre-generation: pending images, newest first
+        Index('idx_image_thumbnail_pending', has_thumbnail, last_modified, id),
+        Index('idx_image_folder_model', folder_id, model),
+        Index('idx_image_folder_sampler', folder_id, sampler),
+        Index('idx_image_folder_seed', folder_id, seed),
+        Index('idx_image_folder_cfg', folder_id, cfg),
+        Index('idx_image_params_version', params_version, id),
+        Index('idx_image_graph', graph_id),
+    )
+
+
+class MetadataGraph(Base):
+    """A ComfyUI graph shared by all images generated from it (see metadata_graphs)."""
+    __tablename__ = "metadata_graphs"
+
+    id = Column(Integer, primary_key=True)
+    hash = Column(String, nullable=False)  # metadata_graphs.graph_hash of `graph`
+    graph = Column(CompressedJSON, nullable=False)
+
+    __table_args__ = (
+        Index('idx_metadata_graph_hash', hash, unique=True),
+    )
+
+
+class MetadataDictionary(Base):
+    """A zlib preset dictionary compressed metadata refers to by id (see metadata_codec)."""
+    __tablename__ = "metadata_dictionaries"
+
+    id = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer)  # Values it was trained on
+    created_at = Column(DateTime, nullable=False)
+
+
+class ImageLora(Base):
+    __tablename__ = "image_loras"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("images.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    weight = Column(Float)
+
+    image = relationship("Image", back_populates="loras")
+
+    __table_args__ = (
+        Index('idx_image_lora_name_image', name, image_id),
+        Index('idx_image_lora_image', image_id),
+    )
+
+
+class DirectoryManifest(Base):
+    __tablename__ = "directory_manifest"
+
+    id = Column(Integer, primary_key=True, index=True)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False)
+    path = Column(String, nullable=False)
+    # Directory mtime at the last scan; NULL forces the directory to be listed again
+    mtime = Column(Float)
+    entry_count = Column(Integer, nullable=False, default=0)  # Supported image files directly inside
+
+    folder = relationship("Folder", back_populates="manifest_entries")
+
+    __table_args__ = (
+        Index('idx_manifest_folder_path', folder_id, path, unique=True),
+    )
+
+
+class ScanJob(Base):
+    __tablename__ = "scan_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    folder_id = Column(Integer, ForeignKey("folders.id"), nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed, cancelled
+    force_full = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    error = Column(String)
+    result = Column(JSON)  # ScanStatus of a completed scan
+
+    folder = relationship("Folder", back_populates="scan_jobs")
+
+    __table_args__ = (
+        Index('idx_scan_job_folder_created', folder_id, created_at),
+        Index('idx_scan_job_status', status),
+    )
+
+
+def _sqlite_has_fts5() -> bool:
+    try:
+        with closing(sqlite3.connect(":memory:")) as conn:
+            conn.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# aiosqlite uses the sqlite3 module, so this is the library the app runs on
+FTS5_AVAILABLE = _sqlite_has_fts5()
+
+# Full-text index for /api/search. FTS5 virtual tables can't be declared as ORM
+# models; the rowid is images.id and crud writes the rows next to the image
+# upserts and deletes. `folder` holds the folder id as a token so folder
+# scoping is part of the MATCH instead of a join. The rank option weights
+# hits in the positive prompt above model/LoRA names and the negative prompt.
+IMAGE_SEARCH_TABLE = "image_search"
+IMAGE_SEARCH_COLUMNS = ("positive_prompt", "negative_prompt", "model", "loras", "folder")
+
+# Core handle for queries; not part of Base.metadata. The hidden column named
+# like the table is the MATCH target, rank is the configured bm25 score.
+image_search = table(
+    IMAGE_SEARCH_TABLE,
+    column("rowid"), column(IMAGE_SEARCH_TABLE), column("rank"),
+    *(column(name) for name in IMAGE_SEARCH_COLUMNS))
+
+if FTS5_AVAILABLE:
+    event.listen(Base.metadata, "after_create", DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {IMAGE_SEARCH_TABLE} USING fts5("
+        f"{', '.join(IMAGE_SEARCH_COLUMNS)}, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"))
+    event.listen(Base.metadata, "after_create", DDL(
+        f"INSERT INTO {IMAGE_SEARCH_TABLE}({IMAGE_SEARCH_TABLE}, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 4.0, 0.0)')"))
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+from . import config, crud, database
+from .metadata_codec import metadata_codec
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationParamBackfill:
+    """Fills the generation-parameter columns of images stored before they existed.
+
+    Runs in the background after startup, one batch per transaction in its own
+    session, so scans and requests keep running in between. Rows written by
+    scans already carry the columns; rows stored with an older
+    GENERATION_PARAMS_VERSION are derived again. Afterwards it makes sure
+    SQLite has planner statistics for the parameter indexes, then adds images
+    stored before the search index existed to it. Before all that, metadata
+    stored inline by older versions is moved into shared graphs, and stored
+    metadata is rewritten with the configured codec (training a compression
+    dictionary first if there is none yet).
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await self._split_inline_metadata()
+        await self._recode_metadata()
+        await self._backfill_generation_params()
+        await self._index_unsearchable_images()
+
+    async def _split_inline_metadata(self):
+        async with database.AsyncSessionLocal() as db:
+            remaining = await crud.count_inline_metadata(db)
+        if remaining:
+            logger.info(f"Moving the metadata of {remaining} images into shared graphs")
+            await self._run_batches(
+                "Metadata graph conversion", crud.split_inline_metadata, remaining)
+        async with database.AsyncSessionLocal() as db:
+            deleted = await crud.delete_unreferenced_metadata_graphs(db)
+            await db.commit()
+        if deleted:
+            logger.info(f"Deleted {deleted} metadata graphs no image uses any more")
+
+    async def _recode_metadata(self):
+        async with database.AsyncSessionLocal() as db:
+            if metadata_codec.enabled and not metadata_codec.dictionary_id:
+                dictionary_id = await crud.train_metadata_dictionary(db)
+                if dictionary_id is not None:
+                    logger.info(f"Trained metadata compression dictionary {dictionary_id}")
+            graphs = await crud.recode_metadata_graphs(db)
+            remaining = await crud.count_metadata_to_recode(db)
+        if graphs:
+            logger.info(f"Converted {graphs} metadata graphs to the {config.METADATA_CODEC} codec")
+        if remaining:
+            logger.info(f"Converting the metadata of {remaining} images to the {config.METADATA_CODEC} codec")
+            await self._run_batches(
+                "Metadata codec conversion", crud.recode_stored_metadata, remaining)
+
+    async def _backfill_generation_params(self):
+        async with database.AsyncSessionLocal() as db:
+            remaining = await crud.count_generation_param_backfill(db)
+            if not remaining:
+                await crud.update_planner_statistics(db)
+                return
+        logger.info(f"Deriving generation parameters for {remaining} existing images")
+        processed = await self._run_batches(
+            "Generation parameter backfill", crud.backfill_generation_params, remaining)
+        if processed is not None:
+            # The new columns and image_loras rows need fresh planner statistics
+            async with database.AsyncSessionLocal() as db:
+                await crud.update_planner_statistics(db, full=True)
+
+    async def _index_unsearchable_images(self):
+        async with database.AsyncSessionLocal() as db:
+            missing = await crud.count_unsearchable_images(db)
+        if missing:
+            logger.info(f"Adding {missing} existing images to the search index")
+            # Checks every image, the missing ones are not contiguous
+            await self._run_batches("Search index backfill", crud.index_unsearchable_images)
+
+    async def _run_batches(
+        self,
+        name: str,
+        process_batch: Callable[..., Awaitable[Tuple[int, int]]],
+        total: Optional[int] = None
+    ) -> Optional[int]:
+        """Call a keyset batch function until it runs out of rows.
+
+        Returns the number of rows processed, None if it failed.
+        """
+        started = time.monotonic()
+        processed = 0
+        last_id = 0
+        try:
+            while True:
+                async with database.AsyncSessionLocal() as db:
+                    count, last_id = await process_batch(db, last_id, config.BACKFILL_BATCH_SIZE)
+                if not count:
+                    break
+                processed += count
+                if processed % (config.BACKFILL_BATCH_SIZE * 50) < count:
+                    progress = processed if total is None else f"{processed}/{total}"
+                    logger.info(f"{name}: {progress} images")
+                # Let queued requests and scans use the database between batches
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            logger.info(f"{name} stopped after {processed} images")
+            raise
+        except Exception as e:
+            logger.error(f"{name} failed after {processed} images: {e}", exc_info=True)
+            return None
+        logger.info(f"{name} done: {processed} images in {time.monotonic() - started:.1f}s")
+        return processed
+
+
+# Global backfill instance
+generation_param_backfill = GenerationParamBackfill()
@@ -0,0 +1,124 @@
+import struct
+import zlib
+from typing import BinaryIO, Collection, Dict, NamedTuple, Optional, Tuple
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Buffer for reading PNG headers. ComfyUI writes its text chunks right after
+# IHDR, so for most files one or two reads of this size cover everything
+# up to the first IDAT.
+READ_BUFFER_SIZE = 64 * 1024
+# Same limit as Pillow (PngImagePlugin.MAX_TEXT_MEMORY) against decompression bombs
+MAX_TEXT_MEMORY = 64 * 1024 * 1024
+
+_CHUNK_HEADER = struct.Struct(">I4s")
+_IHDR_SIZE = struct.Struct(">II")
+_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+
+
+class PngHeader(NamedTuple):
+    """Dimensions and text chunks read from the chunks before the pixel data."""
+    width: int
+    height: int
+    text_chunks: Dict[str, str]
+
+
+def _decompress(data: bytes, budget: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    text = decompressor.decompress(data, budget)
+    if decompressor.unconsumed_tail:
+        raise ValueError("Decompressed text chunk too large")
+    return text
+
+
+def _decode_text_chunk(
+    chunk_type: bytes,
+    data: bytes,
+    crc: int,
+    keys: Optional[Collection[str]],
+    budget: int
+) -> Optional[Tuple[str, str]]:
+    """Return (keyword, text) of a tEXt/zTXt/iTXt chunk.
+
+    Returns None if the chunk is not wanted or its CRC does not match (only
+    checked for wanted chunks).
+    """
+    keyword, sep, rest = data.partition(b"\0")
+    if not sep:
+        return None
+    keyword = keyword.decode("latin-1")
+    if keys is not None and keyword not in keys:
+        return None
+    if zlib.crc32(data, zlib.crc32(chunk_type)) != crc:
+        return None
+    if chunk_type == b"tEXt":
+        return keyword, rest.decode("latin-1")
+    if chunk_type == b"zTXt":
+        # compression method byte (0 = zlib), then the compressed text
+        return keyword, _decompress(rest[1:], budget).decode("latin-1")
+    # iTXt: compression flag, method, language tag\0, translated keyword\0, UTF-8 text
+    if len(rest) < 2:
+        return None
+    compressed = rest[0]
+    language_end = rest.find(b"\0", 2)
+    translated_end = rest.find(b"\0", language_end + 1) if language_end >= 0 else -1
+    if translated_end < 0:
+        return None
+    text = rest[translated_end + 1:]
+    if compressed:
+        text = _decompress(text, budget)
+    return keyword, text.decode("utf-8")
+
+
+def read_png_header(
+    f: BinaryIO,
+    keys: Optional[Collection[str]] = None
+) -> Optional[PngHeader]:
+    """Read dimensions and text chunks from an open PNG file without decoding it.
+
+    Walks the chunk list from the start of the file, reads and decodes only
+    tEXt/zTXt/iTXt chunks (only those named in `keys`, if given), seeks over
+    every other chunk and stops at the first IDAT, so the pixel data is never
+    read. Text chunks after the pixel data are not returned, as with
+    PIL.Image.open().info. Chunks with a bad CRC are ignored.
+
+    Returns None if the file is not a PNG. Raises ValueError for a truncated
+    or malformed PNG.
+    """
+    if f.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        return None
+    width = height = None
+    text_chunks: Dict[str, str] = {}
+    budget = MAX_TEXT_MEMORY
+    while True:
+        header = f.read(_CHUNK_HEADER.size)
+        if len(header) < _CHUNK_HEADER.size:
+            raise ValueError("Truncated PNG: no IDAT chunk")
+        length, chunk_type = _CHUNK_HEADER.unpack(header)
+        if chunk_type == b"IDAT" or chunk_type == b"IEND":
+            break
+        if chunk_type == b"IHDR":
+            data = f.read(length + 4)
+            if length < _IHDR_SIZE.size or len(data) < length + 4:
+                raise ValueError("Truncated PNG: bad IHDR chunk")
+            width, height = _IHDR_SIZE.unpack_from(data)
+        elif chunk_type in _TEXT_CHUNKS:
+            data = f.read(length + 4)
+            if len(data) < length + 4:
+                raise ValueError(f"Truncated PNG: incomplete {chunk_type.decode()} chunk")
+            crc = int.from_bytes(data[length:], "big")
+            try:
+                decoded = _decode_text_chunk(chunk_type, data[:length], crc, keys, budget)
+            except (zlib.error, UnicodeDecodeError):
+                continue
+            if decoded is not None:
+                keyword, text = decoded
+                budget -= len(text)
+                if budget < 0:
+                    raise ValueError("Too much memory used in text chunks")
+                text_chunks[keyword] = text
+        else:
+            f.seek(length + 4, 1)  # data + CRC
+    if width is None:
+        raise ValueError("Malformed PNG: IHDR chunk missing")
+    return PngHeader(width, height, text_chunks)
+
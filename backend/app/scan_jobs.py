@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from . import config, crud, database, models
+from .metadata_codec import metadata_codec
+from .param_backfill import generation_param_backfill
+from .thumbnail_jobs import thumbnail_pregeneration
+
+logger = logging.getLogger(__name__)
+
+
+class ScanJobManager:
+    """Runs folder scans as background jobs recorded in the scan_jobs table.
+
+    - Single flight: while a folder has a queued or running job, submitting
+      another scan for it returns the existing job.
+    - At most SCAN_MAX_CONCURRENT_JOBS scans run at once; the rest wait queued.
+    - Every job opens its own DB session, independent of the request that
+      created it.
+    - A scan holds its folder's lock (folder_lock) while it runs; the folder
+      watcher takes the same lock, so its scans and syncs never overlap one.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None):
+        self._max_concurrent = max_concurrent
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._active_by_folder: Dict[int, int] = {}
+        # Held from the single-flight check until the new job is registered
+        self._submit_locks: Dict[int, asyncio.Lock] = {}
+        # Held while anything writes a folder's images from the disk
+        self._folder_locks: Dict[int, asyncio.Lock] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(
+                self._max_concurrent or config.SCAN_MAX_CONCURRENT_JOBS)
+        return self._semaphore
+
+    async def start(self):
+        """Fail jobs that a previous run of the app left queued or running."""
+        async with database.AsyncSessionLocal() as db:
+            count = await crud.fail_unfinished_scan_jobs(
+                db, "Interrupted by an application restart")
+        if count:
+            logger.warning(f"Marked {count} interrupted scan jobs as failed")
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def is_folder_active(self, folder_id: int) -> bool:
+        return folder_id in self._active_by_folder
+
+    def active_job_id(self, folder_id: int) -> Optional[int]:
+        return self._active_by_folder.get(folder_id)
+
+    def folder_lock(self, folder_id: int) -> asyncio.Lock:
+        """The lock held while a folder is scanned or synced."""
+        return self._folder_locks.setdefault(folder_id, asyncio.Lock())
+
+    async def submit(self, folder_id: int, force_full: bool = False) -> Tuple[models.ScanJob, bool]:
+        """Queue a scan of a folder. Returns (job, created); created is False if
+        the folder already had a queued or running job, which is returned instead."""
+        lock = self._submit_locks.setdefault(folder_id, asyncio.Lock())
+        # The check and the job's creation await the database; concurrent
+        # submits for the folder wait here and then find the new job
+        async with lock, database.AsyncSessionLocal() as db:
+            active_id = self._active_by_folder.get(folder_id)
+            if active_id is not None:
+                job = await crud.get_scan_job(db, active_id)
+                if job is not None:
+                    return job, False
+            job = await crud.create_scan_job(db, folder_id, force_full)
+            self._active_by_folder[folder_id] = job.id
+            self._tasks[job.id] = asyncio.create_task(self._run(job.id, folder_id, force_full))
+        return job, True
+
+    async def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job. Returns False if it was not active."""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return True
+
+    async def cancel_folder(self, folder_id: int):
+        job_id = self._active_by_folder.get(folder_id)
+        if job_id is not None:
+            await self.cancel(job_id)
+
+    async def wait(self, job_id: int):
+        """Wait until a job has finished. Cancelling the waiter leaves the job running."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def _update(self, job_id: int, **fields):
+        async with database.AsyncSessionLocal() as db:
+            await crud.update_scan_job(db, job_id, **fields)
+
+    async def _run(self, job_id: int, folder_id: int, force_full: bool):
+        try:
+            # The folder lock is taken first, so a job waiting for the
+            # watcher does not hold one of the concurrent scan slots
+            async with self.folder_lock(folder_id), self.semaphore:
+                await self._update(
+                    job_id, status="running", started_at=datetime.now(timezone.utc))
+                async with database.AsyncSessionLocal() as db:
+                    folder = await crud.get_folder(db, folder_id)
+                    if folder is None:
+                        raise FileNotFoundError(f"Folder with ID {folder_id} not found")
+                    result = await crud.scan_folder_and_update_db(
+                        db, folder, force_full=force_full)
+                    if result.added_count or result.removed_count:
+                        await crud.update_planner_statistics(db)
+                    if result.updated_count or result.removed_count:
+                        await crud.delete_unreferenced_metadata_graphs(db)
+                        await db.commit()
+                    if result.added_count and metadata_codec.enabled and not metadata_codec.dictionary_id:
+                        # A new library: train the compression dictionary on
+                        # its first images and recompress them with it
+                        generation_param_backfill.start()
+                    if result.added_count or result.updated_count:
+                        thumbnail_pregeneration.start()
+            await self._update(
+                job_id,
+                status="completed",
+                finished_at=datetime.now(timezone.utc),
+                result=result.model_dump())
+            logger.info(f"Scan job {job_id} for folder {folder_id} completed")
+        except asyncio.CancelledError:
+            logger.info(f"Scan job {job_id} for folder {folder_id} cancelled")
+            await self._update(
+                job_id, status="cancelled", finished_at=datetime.now(timezone.utc))
+        except Exception as e:
+            logger.error(f"Scan job {job_id} for folder {folder_id} failed: {e}", exc_info=True)
+            await self._update(
+                job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+        finally:
+            self._tasks.pop(job_id, None)
+            if self._active_by_folder.get(folder_id) == job_id:
+                del self._active_by_folder[folder_id]
+
+
+# Global scan job manager instance
+scan_job_manager = ScanJobManager()
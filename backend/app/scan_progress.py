@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Mapping, Optional, Set
+
+from . import config, schemas
+
+logger = logging.getLogger(__name__)
+
+
+class ScanProgressBroker:
+    """In-process pub/sub for scan progress, keyed by folder id.
+
+    Every subscriber gets a one-slot queue that always holds the most recent
+    update: a slow client skips intermediate updates instead of making them pile
+    up in memory. New subscribers first receive the last known state.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._latest: Dict[int, schemas.ScanProgress] = {}
+
+    def publish(self, progress: schemas.ScanProgress):
+        self._latest[progress.folder_id] = progress
+        for queue in self._subscribers.get(progress.folder_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(progress)
+
+    def latest(self, folder_id: int) -> Optional[schemas.ScanProgress]:
+        return self._latest.get(folder_id)
+
+    def forget(self, folder_id: int):
+        self._latest.pop(folder_id, None)
+
+    async def subscribe(
+        self,
+        folder_id: int,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Optional[schemas.ScanProgress]]:
+        """Yield progress updates for a folder as they are published.
+
+        With `timeout`, None is yielded whenever no update arrived for that many
+        seconds (used for SSE keep-alives).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        latest = self._latest.get(folder_id)
+        if latest is not None:
+            queue.put_nowait(latest)
+        self._subscribers.setdefault(folder_id, set()).add(queue)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            subscribers = self._subscribers.get(folder_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[folder_id]
+
+
+class ScanProgressReporter:
+    """Turns a scan's running counters into throttled ScanProgress updates."""
+
+    def __init__(
+        self,
+        folder_id: int,
+        broker: Optional[ScanProgressBroker] = None,
+        min_interval: Optional[float] = None
+    ):
+        self.folder_id = folder_id
+        self.broker = broker or scan_progress_broker
+        self.min_interval = (config.SCAN_PROGRESS_INTERVAL_SECONDS
+                             if min_interval is None else min_interval)
+        self.started_at = time.monotonic()
+        self._last_published = 0.0
+
+    def update(
+        self,
+        stats: Mapping[str, int],
+        walk_complete: bool = False,
+        state: str = "running",
+        message: Optional[str] = None,
+        force: bool = False
+    ):
+        """Publish the current counters, at most once per `min_interval` unless forced."""
+        now = time.monotonic()
+        if not force and now - self._last_published < self.min_interval:
+            return
+        self._last_published = now
+
+        processed = stats.get('processed_count', 0)
+        total = stats.get('total_files', 0)
+        elapsed = now - self.started_at
+        files_per_second = processed / elapsed if elapsed > 0 else 0.0
+        eta_seconds = None
+        if state == "running" and walk_complete and files_per_second > 0:
+            eta_seconds = max(total - processed, 0) / files_per_second
+
+        self.broker.publish(schemas.ScanProgress(
+            folder_id=self.folder_id,
+            state=state,
+            current=processed,
+            total=total,
+            walk_complete=walk_complete,
+            added_count=stats.get('added_count', 0),
+            updated_count=stats.get('updated_count', 0),
+            removed_count=stats.get('removed_count', 0),
+            skipped_count=stats.get('skipped_count', 0),
+            processed_count=processed,
+            elapsed_seconds=round(elapsed, 3),
+            files_per_second=round(files_per_second, 1),
+            eta_seconds=None if eta_seconds is None else round(eta_seconds, 1),
+            message=message
+        ))
+
+    def finish(self, stats: Mapping[str, int], state: str = "completed",
+               message: Optional[str] = None):
+        self.update(stats, walk_complete=True, state=state, message=message, force=True)
+
+
+# Global broker instance
+scan_progress_broker = ScanProgressBroker()
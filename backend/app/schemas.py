@@ -35,6 +35,7 @@ class ImageBase(BaseModel):
     file_size: Optional[int] = None
     thumbnail_path: Optional[str] = None
     has_thumbnail: bool = False
+    placeholder: Optional[str] = None
 
 
 class ImageCreate(ImageBase):
@@ -58,6 +59,31 @@ class ScanStatus(BaseModel):
     skipped_count: int = 0
     processed_count: int = 0
     total_files: int = 0
+    directories_listed: int = 0
+    directories_unchanged: int = 0
+    # Scan pipeline statistics: highest resident memory of the server process
+    # seen during the scan, and how full its bounded queues got
+    peak_memory_bytes: Optional[int] = None
+    queue_capacity: int = 0
+    peak_probe_queue_depth: int = 0
+    peak_write_queue_depth: int = 0
+
+
+# --- Scan Job Schema ---
+
+class ScanJob(BaseModel):
+    id: int
+    folder_id: int
+    status: str
+    force_full: bool = False
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    result: Optional[ScanStatus] = None
+
+    class Config:
+        from_attributes = True
 
 
 # --- NEW: Schema for Paginated Image List Response ---
@@ -67,17 +93,90 @@ class ImageListResponse(BaseModel):
     total_count: int
 
 
+class ImageFields(BaseModel):
+    """An image with only the fields requested through `fields=`.
+
+    Fields that were not requested are left out of the response (the
+    endpoints serialize with exclude_unset), not returned as null.
+    """
+    id: int
+    filename: Optional[str] = None
+    full_path: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    metadata_: Optional[Dict[str, Any]] = None
+    folder_id: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size: Optional[int] = None
+    thumbnail_path: Optional[str] = None
+    has_thumbnail: Optional[bool] = None
+    # Base64 WebP to show (blurred) until the thumbnail is loaded
+    placeholder: Optional[str] = None
+    # Hash of the shared metadata graph (/api/metadata-graphs/{hash}) and the
+    # per-image values that complete it
+    graph_hash: Optional[str] = None
+    metadata_delta: Optional[Dict[str, Any]] = None
+
+
+class ImageFieldsListResponse(BaseModel):
+    images: List[ImageFields]
+    total_count: int
+
+
+class ImageMetadata(BaseModel):
+    id: int
+    metadata_: Optional[Dict[str, Any]] = None
+    graph_hash: Optional[str] = None
+
+
+class MetadataGraph(BaseModel):
+    hash: str
+    graph: Dict[str, Any]
+
+    class Config:
+        from_attributes = True
+
+
 # --- NEW: Schema for Scan Progress ---
 
 class ScanProgress(BaseModel):
     folder_id: int
+    state: str = "running"  # running, completed, failed, cancelled
     current: int
     total: int
+    # False while the folder is still being walked, i.e. `total` can still grow
+    walk_complete: bool = False
     added_count: int = 0
     updated_count: int = 0
     removed_count: int = 0
     skipped_count: int = 0
     processed_count: int = 0
+    elapsed_seconds: float = 0.0
+    files_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    message: Optional[str] = None
+
+
+class ThumbnailCacheStats(BaseModel):
+    store: str
+    # None: no budget (max_bytes), or not measured yet (bytes, files)
+    max_bytes: Optional[int] = None
+    bytes: Optional[int] = None
+    # Bytes of the packed store's files, including evicted thumbnails not
+    # compacted yet (None for the file store)
+    store_bytes: Optional[int] = None
+    files: Optional[int] = None
+    hits: int
+    misses: int
+    hit_rate: Optional[float] = None
+    generated: int
+    failed: int
+    bytes_served: int
+    bytes_generated: int
+    evicted: int
+    evicted_bytes: int
+    # Images without thumbnails yet (see crud.count_pending_thumbnails)
+    pending: int
 
 
 # --- NEW: Schema for Image Filter Options ---
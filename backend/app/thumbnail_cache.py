@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from . import config
+from .thumbnail_generator import ThumbnailGenerator, thumbnail_generator
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees space down to this share of the budget, so it does not run
+# again for every few thumbnails generated; pre-generation stops there too
+LOW_WATER = 0.9
+# A hit marks a thumbnail as used (the LRU clock) at most this often
+TOUCH_INTERVAL_SECONDS = 600
+# Thumbnails are grouped by last use at this granularity when picking what to evict
+EVICTION_BUCKET_SECONDS = 60
+
+
+class ThumbnailCache:
+    """Disk budget, LRU eviction and statistics for the thumbnail store.
+
+    The store records when each thumbnail was last served (refreshed at
+    most every TOUCH_INTERVAL_SECONDS): a file's mtime, or the packed
+    store's index. The bytes on disk are measured by a scan at startup and
+    counted up as the thumbnail workers generate thumbnails. When they
+    exceed config.THUMBNAIL_CACHE_MAX_GB an eviction pass finds the last use
+    below which enough bytes are freed, then removes those thumbnails; the
+    packed store then compacts the packs they leave mostly empty. Images
+    keep has_thumbnail, so evicted thumbnails are regenerated on their next
+    request, not by pre-generation.
+    """
+
+    def __init__(self, generator: ThumbnailGenerator, max_gb: float = config.THUMBNAIL_CACHE_MAX_GB):
+        self.generator = generator
+        self.max_bytes = int(max_gb * 2**30) if max_gb > 0 else None
+        # None until the startup scan is done
+        self.bytes: Optional[int] = None
+        self.files: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failed = 0
+        self.bytes_served = 0
+        self.bytes_generated = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        # Generated while a scan is running
+        self._unmeasured_bytes = 0
+        self._unmeasured_files = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def full(self) -> bool:
+        """Whether pre-generation should stop, leaving the rest of the budget to requests."""
+        return (self.max_bytes is not None and self.bytes is not None
+                and self.bytes >= self.max_bytes * LOW_WATER)
+
+    def start(self):
+        """Measure the cache (and evict if it is over budget) in the background."""
+        if not self.running:
+            self._task = asyncio.create_task(self._measure_and_evict())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def lookup(self, image_path: str, size: str) -> Tuple[Optional[Path], Optional[int]]:
+        """(thumbnail path, its size in bytes if it exists) of the image's current version.
+
+        Counts a hit or a miss; the path is None (a failure) if the image is missing.
+        """
+        thumb_paths = self.generator.thumbnail_paths(image_path, (size,))
+        if thumb_paths is None:
+            self.failed += 1
+            return None, None
+        thumb_path = thumb_paths[0]
+        stat = self.generator.store.stat(thumb_path.stem)
+        if stat is None:
+            self.misses += 1
+            return thumb_path, None
+        self.hits += 1
+        size, last_used = stat
+        if time.time() - last_used > TOUCH_INTERVAL_SECONDS:
+            self.generator.store.touch(thumb_path.stem)
+        return thumb_path, size
+
+    def record_generated(self, generated_bytes: int, count: int):
+        """Account for thumbnails written by the thumbnail workers; evict when over budget."""
+        self.generated += count
+        self.bytes_generated += generated_bytes
+        if self.bytes is None or self.running:
+            self._unmeasured_bytes += generated_bytes
+            self._unmeasured_files += count
+            return
+        self.bytes += generated_bytes
+        self.files += count
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            self.start()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "store": self.generator.store.name,
+            "max_bytes": self.max_bytes,
+            "bytes": self.bytes,
+            "store_bytes": self.generator.store.disk_bytes(),
+            "files": self.files,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else None,
+            "generated": self.generated,
+            "failed": self.failed,
+            "bytes_served": self.bytes_served,
+            "bytes_generated": self.bytes_generated,
+            "evicted": self.evicted,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    async def _measure_and_evict(self):
+        try:
+            while True:
+                target = None
+                if self.max_bytes is not None and (self.bytes is None or self.bytes > self.max_bytes):
+                    target = int(self.max_bytes * LOW_WATER)
+                self._unmeasured_bytes = self._unmeasured_files = 0
+                total, files, freed, removed = await asyncio.to_thread(self._scan_and_evict, target)
+                # Thumbnails generated during the scan may have been counted
+                # by it already; rather over- than underestimate
+                self.bytes = total - freed + self._unmeasured_bytes
+                self.files = files - removed + self._unmeasured_files
+                self.evicted += removed
+                self.evicted_bytes += freed
+                if removed:
+                    logger.info(
+                        f"Thumbnail cache: evicted {removed} least recently used thumbnails "
+                        f"({freed / 2**20:.0f} MiB), {self.bytes / 2**20:.0f} MiB in {self.files} files left")
+                # Reclaims the space of evicted (and swept) packed thumbnails
+                packs, pack_bytes = await asyncio.to_thread(self.generator.store.compact)
+                if packs:
+                    logger.info(f"Thumbnail cache: compacted {packs} packs, {pack_bytes / 2**20:.0f} MiB freed")
+                if target is None or self.bytes <= self.max_bytes:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Thumbnail cache scan failed: {e}", exc_info=True)
+
+    def _scan_and_evict(self, target: Optional[int]):
+        """Measure the shards; if `target` is set, remove the least recently used
+        thumbnails until at most `target` bytes are left.
+
+        Returns (bytes, files, freed bytes, removed files). Two passes over the
+        shards: the first sums bytes per last-use bucket, the second removes
+        thumbnails from the oldest buckets.
+        """
+        store = self.generator.store
+        buckets = defaultdict(int)
+        total = files = 0
+        for shard in range(256):
+            for _, size, last_used in store.entries(shard):
+                total += size
+                files += 1
+                buckets[int(last_used // EVICTION_BUCKET_SECONDS)] += size
+        if target is None or total <= target:
+            return total, files, 0, 0
+        excess = total - target
+        cutoff = None
+        for bucket in sorted(buckets):
+            excess -= buckets[bucket]
+            if excess <= 0:
+                cutoff = bucket
+                break
+        # Whole buckets older than the cutoff go; the cutoff bucket only until enough is freed
+        to_free = total - target
+        freed = removed = 0
+        for shard in range(256):
+            evict = []
+            for key, size, last_used in store.entries(shard):
+                bucket = int(last_used // EVICTION_BUCKET_SECONDS)
+                if cutoff is not None and (bucket > cutoff or (bucket == cutoff and freed >= to_free)):
+                    continue
+                evict.append(key)
+                freed += size
+            removed += store.remove(evict)
+        return total, files, freed, removed
+
+
+# Global thumbnail cache instance
+thumbnail_cache = ThumbnailCache(thumbnail_generator)
@@ -1,76 +1,269 @@
+import base64
+import hashlib
+import io
 import logging
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from PIL import Image as PILImage
-from PIL import ImageOps
-from typing import Tuple, Optional
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from . import config
+from .image_probe import open_image, probe_image
+from .thumbnail_store import THUMBNAIL_STORES, PackedThumbnailStore, ThumbnailFiles, sweep_directory
 
 logger = logging.getLogger(__name__)
 
 
+class ThumbnailProfile(NamedTuple):
+    """How thumbnails trade quality for speed (config.THUMBNAIL_PROFILE)."""
+    resample: PILImage.Resampling
+    # Image.resize reducing_gap: sources more than this many times the
+    # thumbnail size are reduced by an integer factor on/after decoding
+    # before resampling; None resamples from full resolution
+    reducing_gap: Optional[float]
+    webp_quality: int
+    # WebP encoder effort, 0 (fastest) to 6 (smallest files)
+    webp_method: int
+
+
+THUMBNAIL_PROFILES = {
+    "quality": ThumbnailProfile(PILImage.Resampling.LANCZOS, 3.0, 90, 6),
+    # Image.thumbnail's default reducing_gap
+    "balanced": ThumbnailProfile(PILImage.Resampling.LANCZOS, 2.0, 85, 4),
+    "fast": ThumbnailProfile(PILImage.Resampling.BILINEAR, 1.5, 80, 0),
+}
+
+
+# Thumbnail size name -> bounding box; unknown names get medium. Width
+# buckets ("w256", see width_bucket) bound the width, with heights up to 4x
+# so tall images still get the requested width.
+THUMBNAIL_SIZES = {
+    "small": (150, 150),
+    "medium": (300, 300),
+    # Shown in the image modals instead of the original
+    "preview": (config.THUMBNAIL_PREVIEW_SIZE, config.THUMBNAIL_PREVIEW_SIZE),
+    **{f"w{width}": (width, width * 4) for width in config.THUMBNAIL_WIDTHS},
+}
+
+# Image.placeholder: the image scaled to this longest side, as a low-quality
+# WebP (~120 bytes) the grid shows blurred until the thumbnail is loaded
+PLACEHOLDER_SIZE = 24
+PLACEHOLDER_QUALITY = 40
+
+# EXIF orientation -> transpose that makes the image upright (see ImageOps.exif_transpose)
+_ORIENTATION_TRANSPOSE = {
+    2: PILImage.Transpose.FLIP_LEFT_RIGHT,
+    3: PILImage.Transpose.ROTATE_180,
+    4: PILImage.Transpose.FLIP_TOP_BOTTOM,
+    5: PILImage.Transpose.TRANSPOSE,
+    6: PILImage.Transpose.ROTATE_270,
+    7: PILImage.Transpose.TRANSVERSE,
+    8: PILImage.Transpose.ROTATE_90,
+}
+
+
+def width_bucket(width: int) -> str:
+    """Size name of the narrowest width bucket at least `width` wide (else the widest)."""
+    for bucket in config.THUMBNAIL_WIDTHS:
+        if bucket >= width:
+            return f"w{bucket}"
+    return f"w{config.THUMBNAIL_WIDTHS[-1]}"
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _size_name(size: str) -> str:
+    return size if size in THUMBNAIL_SIZES else "medium"
+
+
+def _mtime_micros(modified: datetime) -> int:
+    """Microseconds since the epoch of an Image.last_modified (naive = UTC)."""
+    if modified.tzinfo is None:
+        modified = modified.replace(tzinfo=timezone.utc)
+    return (modified - _EPOCH) // timedelta(microseconds=1)
+
+
+def thumbnail_key(resolved_path: str, size: str, modified: datetime) -> str:
+    """Name (32 hex digits) of the thumbnail of a source version in one size.
+
+    `modified` is the source's mtime as the scanner stores it in
+    Image.last_modified, so the orphan sweep can derive the names of all
+    live thumbnails from the database without touching the files.
+    """
+    data = f"{resolved_path}\0{size}\0{_mtime_micros(modified)}"
+    return hashlib.blake2b(data.encode("utf-8", "surrogateescape"), digest_size=16).hexdigest()
+
+
+def _resolve_with_cache(path: str, directories: dict) -> str:
+    """os.path.realpath, resolving each directory once (for sweeping many images)."""
+    directory, name = os.path.split(path)
+    resolved_directory = directories.get(directory)
+    if resolved_directory is None:
+        resolved_directory = directories[directory] = os.path.realpath(directory)
+    resolved = os.path.join(resolved_directory, name)
+    return os.path.realpath(resolved) if os.path.islink(resolved) else resolved
+
+
+def _fit(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """`size` scaled down to fit in `box`, keeping the aspect ratio (never enlarged)."""
+    scale = min(box[0] / size[0], box[1] / size[1], 1.0)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+# Modes Image.resize resamples with the profile's filter; others are converted first
+_RESIZE_MODES = ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'YCbCr')
+
+
 class ThumbnailGenerator:
-    def __init__(self, thumbnail_dir: str = "thumbnails", max_size: Tuple[int, int] = (300, 300)):
+    def __init__(self, thumbnail_dir: str = "thumbnails",
+                 profile: str = config.THUMBNAIL_PROFILE, store: str = config.THUMBNAIL_STORE):
         self.thumbnail_dir = Path(thumbnail_dir)
-        self.max_size = max_size
+        self.profile = THUMBNAIL_PROFILES.get(profile, THUMBNAIL_PROFILES["balanced"])
+        # Thumbnails and their bytes written by this process (for thumbnail_cache)
+        self.generated = 0
+        self.generated_bytes = 0
         self.thumbnail_dir.mkdir(exist_ok=True)
-        # Create subdirectories for different sizes
-        (self.thumbnail_dir / "small").mkdir(exist_ok=True)  # 150x150
-        (self.thumbnail_dir / "medium").mkdir(exist_ok=True)  # 300x300
+        self.store = THUMBNAIL_STORES.get(store, ThumbnailFiles)(self.thumbnail_dir)
+
+    def thumbnail_path(self, key: str) -> Path:
+        """Path of a thumbnail in the file store, named after its key.
+
+        Image.thumbnail_path and the thumbnail workers refer to thumbnails by
+        this path in either store; the packed store has no file there and
+        looks the key (the file name's stem) up in its index.
+        """
+        return self.thumbnail_dir / key[:2] / f"{key}.webp"
 
     def generate_thumbnail(self, image_path: str, size: str = "medium") -> Optional[str]:
         """Generate thumbnail for an image and return the thumbnail path."""
+        return self.generate_thumbnails(image_path, (size,))[0]
+
+    def thumbnail_paths(self, image_path: str, sizes: Sequence[str]) -> Optional[List[Path]]:
+        """Paths of the thumbnails of the image's current version in `sizes`.
+
+        The thumbnails may not exist yet. Returns None if the image is missing.
+        """
+        resolved_path = os.path.realpath(image_path)
         try:
-            source_path = Path(image_path)
-            if not source_path.exists() or not source_path.is_file():
-                logger.warning(f"Source image not found: {image_path}")
-                return None
-            # Determine thumbnail size
-            if size == "small":
-                thumb_size = (150, 150)
-                size_dir = "small"
-            else:
-                thumb_size = (300, 300)
-                size_dir = "medium"
-            # Generate thumbnail filename
-            thumb_filename = f"{source_path.stem}_{source_path.stat().st_mtime:.0f}.webp"
-            thumb_path = self.thumbnail_dir / size_dir / thumb_filename
-            # Skip if thumbnail already exists and is newer than source
-            if thumb_path.exists():
-                thumb_mtime = thumb_path.stat().st_mtime
-                source_mtime = source_path.stat().st_mtime
-                if thumb_mtime >= source_mtime:
-                    return str(thumb_path)
-            # Open and process image
-            with PILImage.open(source_path) as img:
-                # Convert to RGB if necessary (handles RGBA, P mode, etc.)
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # Create white background for transparent images
-                    background = PILImage.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                # Generate thumbnail with proper aspect ratio
-                img.thumbnail(thumb_size, PILImage.Resampling.LANCZOS)
-                # Add slight sharpening for better thumbnail quality
-                img = ImageOps.exif_transpose(img)  # Handle EXIF rotation
-                # Save as WebP for better compression
-                img.save(thumb_path, 'WEBP', quality=85, optimize=True)
-                logger.info(f"Generated thumbnail: {thumb_path}")
-                return str(thumb_path)
+            source_mtime = os.stat(resolved_path).st_mtime
+        except OSError:
+            logger.warning(f"Source image not found: {image_path}")
+            return None
+        # Same conversion as the scanner's Image.last_modified
+        modified = datetime.fromtimestamp(source_mtime, tz=timezone.utc)
+        return [self.thumbnail_path(thumbnail_key(resolved_path, _size_name(size), modified))
+                for size in sizes]
+
+    def generate_thumbnails(self, image_path: str, sizes: Sequence[str]) -> List[Optional[str]]:
+        """Generate an image's thumbnails in each of `sizes` from one decode.
+
+        Returns the thumbnail paths in the order of `sizes`, None where a
+        thumbnail could not be generated. Smaller sizes are resized from
+        larger ones where those cover them.
+        """
+        return self._generate(image_path, sizes, placeholder=False)[0]
+
+    def generate_with_placeholder(
+            self, image_path: str, sizes: Sequence[str]) -> Tuple[List[Optional[str]], Optional[str]]:
+        """generate_thumbnails, plus the image's placeholder (make_placeholder).
+
+        The placeholder is made from the smallest thumbnail resized in this
+        pass, so the source is not decoded for it; if all thumbnails exist,
+        from the image's smallest existing thumbnail. None if there is none.
+        """
+        return self._generate(image_path, sizes, placeholder=True)
+
+    def _generate(self, image_path: str, sizes: Sequence[str],
+                  placeholder: bool) -> Tuple[List[Optional[str]], Optional[str]]:
+        try:
+            thumb_paths = self.thumbnail_paths(image_path, sizes)
+            if thumb_paths is None:
+                return [None] * len(sizes), None
+            results: List[Optional[str]] = [str(thumb_path) for thumb_path in thumb_paths]
+            # The key changes with the source's mtime, so an existing
+            # thumbnail is up to date
+            missing = {
+                thumb_path: THUMBNAIL_SIZES[_size_name(size)]
+                for thumb_path, size in zip(thumb_paths, sizes)
+                if self.store.stat(thumb_path.stem) is None
+            }
+            if not missing:
+                return results, self._placeholder_from_thumbnail(image_path) if placeholder else None
+            # Open and process image (a single open of the source file)
+            profile = self.profile
+            with open_image(image_path) as (_, img):
+                transpose = _ORIENTATION_TRANSPOSE.get(img.getexif().get(0x0112))
+                if transpose in (PILImage.Transpose.TRANSPOSE, PILImage.Transpose.ROTATE_270,
+                                 PILImage.Transpose.TRANSVERSE, PILImage.Transpose.ROTATE_90):
+                    # Boxes are of the upright image; the source is sideways
+                    missing = {thumb_path: (box[1], box[0]) for thumb_path, box in missing.items()}
+                targets = {thumb_path: _fit(img.size, box) for thumb_path, box in missing.items()}
+                if profile.reducing_gap is not None and img.format == 'JPEG':
+                    # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 (DCT
+                    # scaling) and convert to RGB while decoding
+                    img.draft('RGB', (round(max(w for w, _ in targets.values()) * profile.reducing_gap),
+                                      round(max(h for _, h in targets.values()) * profile.reducing_gap)))
+                    targets = {thumb_path: _fit(img.size, box) for thumb_path, box in missing.items()}
+                if img.mode not in _RESIZE_MODES:
+                    # Palette and 16-bit images would be resized with NEAREST
+                    img = img.convert('RGBA' if img.mode in ('P', 'PA') else 'RGB')
+                # Largest first; each size is resized from the smallest one
+                # made so far that covers it, else from the source. With
+                # reducing_gap large sources are first reduced by an integer
+                # factor (box filter), then resampled.
+                made = []
+                for thumb_path, target in sorted(
+                        targets.items(), key=lambda item: item[1][0] * item[1][1], reverse=True):
+                    base = img
+                    for made_size, made_img in made:
+                        if made_size[0] >= target[0] and made_size[1] >= target[1]:
+                            base = made_img
+                    thumb = base.resize(target, profile.resample, reducing_gap=profile.reducing_gap)
+                    made.append((target, thumb))
+                    self._save(thumb, thumb_path, transpose)
+            return results, make_placeholder(made[-1][1], transpose) if placeholder else None
         except Exception as e:
             logger.error(f"Failed to generate thumbnail for {image_path}: {e}")
-            return None
+            return [None] * len(sizes), None
+
+    def _placeholder_from_thumbnail(self, image_path: str) -> Optional[str]:
+        by_area = sorted(THUMBNAIL_SIZES,
+                         key=lambda size: THUMBNAIL_SIZES[size][0] * THUMBNAIL_SIZES[size][1])
+        for thumb_path in self.thumbnail_paths(image_path, by_area) or ():
+            data = self.store.read(thumb_path.stem)
+            if data is not None:
+                with PILImage.open(io.BytesIO(data)) as thumb:
+                    return make_placeholder(thumb)
+        return None
+
+    def _save(self, thumb: PILImage.Image, thumb_path: Path, transpose: Optional[PILImage.Transpose]):
+        if transpose is not None:
+            thumb = thumb.transpose(transpose)  # Handle EXIF rotation
+        # Convert to RGB if necessary (transparent images onto white)
+        if thumb.mode in ('RGBA', 'LA'):
+            # Create white background for transparent images
+            background = PILImage.new('RGB', thumb.size, (255, 255, 255))
+            background.paste(thumb, mask=thumb.split()[-1])
+            thumb = background
+        elif thumb.mode != 'RGB':
+            thumb = thumb.convert('RGB')
+        # Save as WebP for better compression
+        data = io.BytesIO()
+        thumb.save(data, 'WEBP', quality=self.profile.webp_quality, method=self.profile.webp_method)
+        self.store.write(thumb_path.stem, data.getvalue())
+        self.generated += 1
+        self.generated_bytes += data.tell()
+        logger.info(f"Generated thumbnail: {thumb_path}")
 
     def get_image_dimensions(self, image_path: str) -> Tuple[Optional[int], Optional[int]]:
         """Get image dimensions without loading the full image."""
-        try:
-            with PILImage.open(image_path) as img:
-                return img.width, img.height
-        except Exception as e:
-            logger.error(f"Failed to get dimensions for {image_path}: {e}")
+        probe = probe_image(image_path)
+        if probe is None:
             return None, None
+        return probe.width, probe.height
 
     def get_file_size(self, image_path: str) -> Optional[int]:
         """Get file size in bytes."""
@@ -80,30 +273,144 @@ class ThumbnailGenerator:
             logger.error(f"Failed to get file size for {image_path}: {e}")
             return None
 
-    def cleanup_orphaned_thumbnails(self, valid_image_paths: set):
-        """Remove thumbnails for images that no longer exist."""
-        try:
-            for size_dir in ["small", "medium"]:
-                thumb_dir = self.thumbnail_dir / size_dir
-                if not thumb_dir.exists():
-                    continue
-                for thumb_file in thumb_dir.glob("*.webp"):
-                    # Extract original filename from thumbnail name
-                    thumb_name = thumb_file.stem
-                    if '_' in thumb_name:
-                        original_name = '_'.join(thumb_name.split('_')[:-1])
-                        # Check if any valid image matches this thumbnail
-                        is_orphaned = True
-                        for image_path in valid_image_paths:
-                            if Path(image_path).stem == original_name:
-                                is_orphaned = False
-                                break
-                        if is_orphaned:
-                            thumb_file.unlink()
-                            logger.info(f"Removed orphaned thumbnail: {thumb_file}")
-        except Exception as e:
-            logger.error(f"Error during thumbnail cleanup: {e}")
+    def sweep_orphaned_thumbnails(self, live: "LiveThumbnailKeys", started: float) -> Tuple[int, int]:
+        """Remove thumbnails that are not of a current image version.
+
+        Each shard is listed once and its thumbnails compared against a set
+        of the shard's live keys, so the sweep is linear in the number of
+        images plus thumbnails. Thumbnails written since `started` (when the
+        keys started being collected) are kept, as they may be of images
+        added meanwhile. Live thumbnails left in the other store (after
+        config.THUMBNAIL_STORE was changed) are moved to this one. Also
+        removes the thumbnails of the old layout (small/ and medium/, named
+        after the source file). Returns (removed, moved).
+        """
+        other = self._other_store()
+        removed = moved = 0
+        for shard in range(256):
+            live_keys = live.pop_shard(shard)
+            removed += self.store.sweep(shard, live_keys, started)
+            if other is not None:
+                shard_moved, shard_removed = self._move_shard(other, shard, live_keys)
+                moved += shard_moved
+                removed += shard_removed
+        if other is not None:
+            other.close()
+            # Its (now empty) directories, so the next sweep does not list it again
+            directories = [other.directory] if other.packed else [
+                self.thumbnail_dir / f"{shard:02x}" for shard in range(256)]
+            for directory in directories:
+                try:
+                    for path in directory.iterdir():
+                        if other.packed or path.suffix == ".tmp":
+                            path.unlink()
+                    directory.rmdir()
+                except OSError:
+                    pass
+            logger.info(f"Moved {moved} thumbnails from the {other.name} store to the {self.store.name} store")
+        for legacy_dir in self.legacy_thumbnail_dirs():
+            removed += sweep_directory(legacy_dir, set(), started)
+            try:
+                legacy_dir.rmdir()
+            except OSError:
+                pass
+        return removed, moved
+
+    def _other_store(self):
+        """The store config.THUMBNAIL_STORE does not name, if it holds thumbnails."""
+        if not self.store.packed:
+            if (self.thumbnail_dir / "packs" / "index.db").exists():
+                return PackedThumbnailStore(self.thumbnail_dir)
+        elif any((self.thumbnail_dir / f"{shard:02x}").is_dir() for shard in range(256)):
+            return ThumbnailFiles(self.thumbnail_dir)
+        return None
+
+    def _move_shard(self, other, shard: int, live: set) -> Tuple[int, int]:
+        """Move a shard's live thumbnails from `other` to this store; remove the rest.
+
+        Returns (moved, removed).
+        """
+        entries = list(other.entries(shard))
+        items = []
+        for key, _, last_used in entries:
+            if int(key[2:18], 16) in live:
+                data = other.read(key)
+                if data is not None:
+                    items.append((key, data, last_used))
+        moved = self.store.write_many(items)
+        other.remove(key for key, _, _ in entries)
+        return moved, len(entries) - len(items)
+
+    def legacy_thumbnail_dirs(self) -> List[Path]:
+        """Existing directories of the old per-size layout."""
+        return [path for path in (self.thumbnail_dir / "small", self.thumbnail_dir / "medium")
+                if path.is_dir()]
+
+
+class LiveThumbnailKeys:
+    """Keys of the thumbnails of current image versions, for the orphan sweep.
+
+    Kept per shard as 64-bit key prefixes in compact arrays (8 bytes per
+    thumbnail); a file whose name shares a prefix with a live key survives
+    the sweep, which only ever keeps an orphan.
+    """
+
+    def __init__(self, sizes: Sequence[str] = tuple(THUMBNAIL_SIZES)):
+        self.sizes = sizes
+        self._shards = [array('Q') for _ in range(256)]
+        self._directories = {}
+
+    def add(self, sources: Iterable[Tuple[str, datetime]]):
+        """Add the thumbnails of images given as (full path, last_modified)."""
+        shards = self._shards
+        for full_path, modified in sources:
+            resolved_path = _resolve_with_cache(full_path, self._directories)
+            for size in self.sizes:
+                key = thumbnail_key(resolved_path, size, modified)
+                shards[int(key[:2], 16)].append(int(key[2:18], 16))
+
+    def pop_shard(self, shard: int) -> set:
+        keys = set(self._shards[shard])
+        self._shards[shard] = array('Q')
+        return keys
 
 
 # Global thumbnail generator instance
-thumbnail_generator = ThumbnailGenerator()
\ No newline at end of file
+thumbnail_generator = ThumbnailGenerator()
+
+
+def make_placeholder(img: PILImage.Image, transpose: Optional[PILImage.Transpose] = None) -> str:
+    """Base64 of a PLACEHOLDER_SIZE WebP of `img` (a thumbnail), upright and on white."""
+    img = img.resize(_fit(img.size, (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE)), PILImage.Resampling.BOX)
+    if transpose is not None:
+        img = img.transpose(transpose)
+    if img.mode in ('RGBA', 'LA'):
+        background = PILImage.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    data = io.BytesIO()
+    img.save(data, 'WEBP', quality=PLACEHOLDER_QUALITY, method=6)
+    return base64.b64encode(data.getvalue()).decode('ascii')
+
+
+def generate_thumbnail_batch(
+        items: List[Tuple[str, Sequence[str], bool]]
+) -> Tuple[List[Tuple[List[Optional[str]], Optional[str]]], int, int]:
+    """Generate the thumbnails of a batch of (image path, sizes, whether to make its placeholder).
+
+    Runs in a thumbnail worker process (see thumbnail_workers). Returns for
+    each item the thumbnail paths in the order of its sizes, None where a
+    thumbnail could not be generated, and its placeholder or None; and the
+    number and bytes of thumbnails written (not those that existed).
+    """
+    generated = thumbnail_generator.generated
+    generated_bytes = thumbnail_generator.generated_bytes
+    results = [
+        thumbnail_generator.generate_with_placeholder(path, sizes) if placeholder
+        else (thumbnail_generator.generate_thumbnails(path, sizes), None)
+        for path, sizes, placeholder in items
+    ]
+    return (results, thumbnail_generator.generated - generated,
+            thumbnail_generator.generated_bytes - generated_bytes)
\ No newline at end of file
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import Optional
+
+from . import config, crud, database
+
+logger = logging.getLogger(__name__)
+
+# Images per batch read from the database, per thumbnail worker
+BATCH_SIZE_PER_WORKER = 32
+# Images read per query while collecting live thumbnail keys for the sweep
+SWEEP_BATCH_SIZE = 20_000
+
+
+class ThumbnailPregeneration:
+    """Generates thumbnails for images that have none yet, newest first.
+
+    Runs in the background after startup, after scans and after filesystem
+    changes picked up by the folder watcher, so a new folder's grid is served
+    from finished thumbnails instead of resizing on the first request for each
+    image. Resizing runs in the thumbnail worker pool (thumbnail_workers)
+    behind thumbnails requested by clients, which also makes each image's
+    placeholder from the resized thumbnails; each batch of results is
+    recorded in Image.thumbnail_path/has_thumbnail/placeholder with one
+    executemany. Images that fail are marked (Image.thumbnail_failed) and
+    not tried again until their file changes.
+
+    The startup run is followed by a sweep removing thumbnails of images
+    that were deleted or changed (thumbnail_generator.sweep_orphaned_thumbnails).
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+        self._sweep = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, sweep: bool = False):
+        """Start a run, or have the current run start over once it is done.
+
+        With `sweep`, orphaned thumbnails are removed after generating.
+        """
+        self._sweep = self._sweep or (sweep and config.THUMBNAIL_ORPHAN_SWEEP)
+        if not (config.THUMBNAIL_PREGENERATE or self._sweep):
+            return
+        if self.running:
+            # Images added meanwhile may be newer than where the run is now
+            self._rerun = True
+        else:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._rerun = False
+            try:
+                if config.THUMBNAIL_PREGENERATE:
+                    await self._generate_pending()
+                if self._sweep and not self._rerun:
+                    self._sweep = False
+                    await self._sweep_orphans()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Thumbnail pre-generation failed: {e}", exc_info=True)
+                return
+            if not self._rerun:
+                return
+
+    async def _generate_pending(self):
+        from .thumbnail_cache import thumbnail_cache
+        from .thumbnail_workers import PRIORITY_PREGENERATE, thumbnail_workers
+
+        sizes = config.THUMBNAIL_PREGENERATE_SIZES
+        batch_size = thumbnail_workers.worker_count * BATCH_SIZE_PER_WORKER
+        started = time.monotonic()
+        generated = failed = 0
+        before = None
+        while True:
+            if thumbnail_cache.full:
+                # Newest images are done; the rest of the budget is left to requests
+                logger.info("Thumbnail pre-generation stopped: thumbnail cache is full")
+                break
+            async with database.AsyncSessionLocal() as db:
+                images = await crud.get_pending_thumbnails(db, before, batch_size)
+            if not images:
+                break
+            before = (images[-1].modified, images[-1].id)
+            # Image.thumbnail_path is the first size, recorded once all are
+            # made, with the placeholder made from them
+            async with aclosing(thumbnail_workers.generate(
+                    [image.full_path for image in images], sizes, PRIORITY_PREGENERATE,
+                    placeholders=True)) as results:
+                thumbnails = []
+                failures = []
+                async for index, thumb_paths, placeholder in results:
+                    if all(thumb_paths) and placeholder:
+                        thumbnails.append((images[index], thumb_paths[0], placeholder))
+                    else:
+                        failures.append(images[index])
+            async with database.AsyncSessionLocal() as db:
+                await crud.record_thumbnails(db, thumbnails)
+                await crud.record_thumbnail_failures(db, failures)
+            generated += len(thumbnails)
+            failed += len(images) - len(thumbnails)
+            if generated and generated % (batch_size * 10) < len(thumbnails):
+                logger.info(f"Thumbnail pre-generation: {generated} images")
+        if generated or failed:
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Thumbnail pre-generation done: {generated} images in {elapsed:.1f}s "
+                f"({generated / max(elapsed, 1e-9):.0f}/s), {failed} failed")
+
+    async def _sweep_orphans(self):
+        from .thumbnail_cache import thumbnail_cache
+        from .thumbnail_generator import LiveThumbnailKeys, thumbnail_generator
+
+        started = time.time()
+        live = LiveThumbnailKeys()
+        images = 0
+        after_id = 0
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                rows = await crud.get_thumbnail_sources(db, after_id, SWEEP_BATCH_SIZE)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            images += len(rows)
+            await asyncio.to_thread(live.add, [(path, modified) for _, path, modified in rows])
+        legacy_dirs = thumbnail_generator.legacy_thumbnail_dirs()
+        removed, moved = await asyncio.to_thread(
+            thumbnail_generator.sweep_orphaned_thumbnails, live, started)
+        logger.info(
+            f"Thumbnail orphan sweep: removed {removed} thumbnails not of any of "
+            f"{images} images in {time.time() - started:.1f}s")
+        if removed or moved:
+            thumbnail_cache.start()  # Measure again
+        if legacy_dirs:
+            # Thumbnails of the old layout are gone; generate them again
+            async with database.AsyncSessionLocal() as db:
+                for legacy_dir in legacy_dirs:
+                    await crud.forget_thumbnails(db, str(legacy_dir))
+            self._rerun = True
+
+
+# Global thumbnail pre-generation instance
+thumbnail_pregeneration = ThumbnailPregeneration()
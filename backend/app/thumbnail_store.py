@@ -0,0 +1,390 @@
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Packs are rolled over at this size
+PACK_MAX_BYTES = 256 * 2**20
+# Packs not appended to for this long are sealed: their writer process has
+# exited (each process appends to a pack of its own)
+PACK_IDLE_SECONDS = 3600
+# Sealed packs with less than this share of live bytes (the rest evicted,
+# swept or replaced) are rewritten by compaction
+COMPACT_LIVE_RATIO = 0.5
+
+_PACK_NAME = re.compile(r"^(\d+)\.pack$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumbnails (
+    key BLOB PRIMARY KEY,  -- the 16 bytes of thumbnail_key
+    pack INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    last_used REAL NOT NULL  -- LRU clock (see thumbnail_cache)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_thumbnails_pack ON thumbnails (pack);
+CREATE TABLE IF NOT EXISTS packs (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,  -- bytes appended
+    sealed INTEGER NOT NULL,  -- no more appends: full, idle or being compacted
+    updated REAL NOT NULL
+);
+"""
+
+
+def sweep_directory(directory: Path, live: set, started: float) -> int:
+    """Remove the files in `directory` that are neither live nor written since `started`.
+
+    Live files are recognized by name (the 64-bit key prefix after the
+    shard digits), without a stat.
+    """
+    removed = 0
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            name = entry.name
+            if len(name) == 37 and name.endswith(".webp"):
+                try:
+                    if int(name[2:18], 16) in live:
+                        continue
+                except ValueError:
+                    pass
+            try:
+                if not entry.is_file(follow_symlinks=False) or entry.stat().st_mtime >= started:
+                    continue
+                os.unlink(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove orphaned thumbnail {entry.path}: {e}")
+    return removed
+
+
+class ThumbnailFiles:
+    """One WebP file per thumbnail, in 256 shard directories (the default store).
+
+    A thumbnail is <directory>/<key[:2]>/<key>.webp; its mtime records when
+    it was last used. Files are written to a temporary name and renamed, so
+    a thumbnail that exists is complete.
+    """
+
+    name = "files"
+    packed = False
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.webp"
+
+    def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        """(bytes, last use) of a thumbnail, None if it does not exist."""
+        try:
+            stat = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.path(key).read_bytes()
+        except OSError:
+            return None  # Evicted or swept meanwhile
+
+    def write(self, key: str, data: bytes):
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        temp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+
+    def write_many(self, items: Iterable[Tuple[str, bytes, float]]) -> int:
+        """Add (key, data, last use) thumbnails that do not exist yet; return how many."""
+        added = 0
+        for key, data, last_used in items:
+            if self.stat(key) is None:
+                self.write(key, data)
+                os.utime(self.path(key), (last_used, last_used))
+                added += 1
+        return added
+
+    def touch(self, key: str):
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def entries(self, shard: int) -> Iterator[Tuple[str, int, float]]:
+        """(key, bytes, last use) of the thumbnails in a shard."""
+        try:
+            entries = os.scandir(self.directory / f"{shard:02x}")
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if len(entry.name) == 37 and entry.name.endswith(".webp"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield entry.name[:-5], stat.st_size, stat.st_mtime
+
+    def remove(self, keys: Iterable[str]) -> int:
+        removed = 0
+        for key in keys:
+            try:
+                os.unlink(self.path(key))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove thumbnail {self.path(key)}: {e}")
+        return removed
+
+    def sweep(self, shard: int, live: set, started: float) -> int:
+        return sweep_directory(self.directory / f"{shard:02x}", live, started)
+
+    def compact(self) -> Tuple[int, int]:
+        return 0, 0
+
+    def disk_bytes(self) -> Optional[int]:
+        return None  # The cache's measured bytes
+
+    def close(self):
+        pass
+
+
+class PackedThumbnailStore:
+    """Thumbnails appended to a few large pack files, indexed in SQLite.
+
+    Stored in <directory>/packs: numbered .pack files holding the WebP data
+    back to back, and index.db mapping each key to (pack, offset, length,
+    last use). Every process appends to a pack of its own and commits the
+    index row after the data is written, so readers never see a partial
+    thumbnail; packs are rolled over at PACK_MAX_BYTES. Reads go through a
+    read-only memory map per pack (remapped as the pack grows).
+
+    Removing a thumbnail (eviction, the orphan sweep) only deletes its
+    index row. compact() rewrites sealed packs that are mostly dead:
+    their live thumbnails are appended to a new pack, then the pack file
+    is deleted.
+    """
+
+    name = "pack"
+    packed = True
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory) / "packs"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections are per thread (requests read in to_thread)
+        self._local = threading.local()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._maps_lock = threading.Lock()
+        # This process's pack: (id, file, bytes written)
+        self._writer: Optional[Tuple[int, object, int]] = None
+        self._write_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; writes that must be atomic use BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.directory / "index.db", timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _pack_path(self, pack: int) -> Path:
+        return self.directory / f"{pack:08d}.pack"
+
+    def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        return self._db().execute(
+            "SELECT length, last_used FROM thumbnails WHERE key = ?", (bytes.fromhex(key),)).fetchone()
+
+    def read(self, key: str) -> Optional[bytes]:
+        row = self._db().execute(
+            "SELECT pack, offset, length FROM thumbnails WHERE key = ?", (bytes.fromhex(key),)).fetchone()
+        return self._read_range(*row) if row is not None else None
+
+    def _read_range(self, pack: int, offset: int, length: int) -> Optional[bytes]:
+        mapped = self._maps.get(pack)
+        if mapped is None or len(mapped) < offset + length:
+            with self._maps_lock:
+                try:
+                    with open(self._pack_path(pack), "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (FileNotFoundError, ValueError):
+                    return None  # Compacted meanwhile
+                # A replaced map is closed when the last reader drops it
+                self._maps[pack] = mapped
+        data = mapped[offset:offset + length]
+        # The index row can outlive data that never reached the disk (a
+        # crash of the machine); WebP files start with "RIFF"
+        return data if len(data) == length and data[:4] == b"RIFF" else None
+
+    def write(self, key: str, data: bytes):
+        self._append([(bytes.fromhex(key), data, time.time(), None)], "REPLACE")
+
+    def write_many(self, items: Iterable[Tuple[str, bytes, float]]) -> int:
+        return self._append([(bytes.fromhex(key), data, last_used, None)
+                             for key, data, last_used in items], "IGNORE")
+
+    def _append(self, items: List[Tuple[bytes, bytes, float, Optional[Tuple[int, int]]]],
+                conflict: str) -> int:
+        """Append thumbnails to this process's pack and index them in one transaction.
+
+        Items are (key, data, last use, moved from (pack, offset) or None).
+        Moved items only replace their own old row; the others INSERT OR
+        `conflict`. Returns the rows changed.
+        """
+        if not items:
+            return 0
+        with self._write_lock:
+            while True:
+                pack, f, offset = self._writable_pack()
+                rows = []
+                for key, data, last_used, moved_from in items:
+                    f.write(data)
+                    rows.append((key, pack, offset, len(data), last_used, moved_from))
+                    offset += len(data)
+                f.flush()
+                conn = self._db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Compaction seals idle packs; appends to a sealed one go to a new pack
+                    if not conn.execute("UPDATE packs SET size = ?, updated = ? WHERE id = ? AND NOT sealed",
+                                        (offset, time.time(), pack)).rowcount:
+                        conn.execute("ROLLBACK")
+                        self._close_writer()
+                        continue
+                    changes = conn.total_changes
+                    conn.executemany(
+                        f"INSERT OR {conflict} INTO thumbnails VALUES (?, ?, ?, ?, ?)",
+                        [row[:5] for row in rows if row[5] is None])
+                    conn.executemany(
+                        "UPDATE thumbnails SET pack = ?, offset = ? WHERE key = ? AND pack = ? AND offset = ?",
+                        [(pack, row_offset, key, *moved_from)
+                         for key, _, row_offset, _, _, moved_from in rows if moved_from is not None])
+                    changed = conn.total_changes - changes
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                self._writer = (pack, f, offset)
+                if offset >= PACK_MAX_BYTES:
+                    self._db().execute("UPDATE packs SET sealed = 1 WHERE id = ?", (pack,))
+                    self._close_writer()
+                return changed
+
+    def _writable_pack(self):
+        if self._writer is None:
+            pack = self._db().execute(
+                "INSERT INTO packs (size, sealed, updated) VALUES (0, 0, ?)", (time.time(),)).lastrowid
+            self._writer = (pack, open(self._pack_path(pack), "ab"), 0)
+        return self._writer
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer[1].close()
+            self._writer = None
+
+    def touch(self, key: str):
+        self._db().execute("UPDATE thumbnails SET last_used = ? WHERE key = ?", (time.time(), bytes.fromhex(key)))
+
+    def entries(self, shard: int) -> Iterator[Tuple[str, int, float]]:
+        rows = self._db().execute(
+            "SELECT key, length, last_used FROM thumbnails WHERE key >= ? AND key < ?",
+            (bytes([shard]), bytes([shard + 1]) if shard < 255 else b"\xff" * 17)).fetchall()
+        for key, length, last_used in rows:
+            yield key.hex(), length, last_used
+
+    def remove(self, keys: Iterable[str]) -> int:
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changes = conn.total_changes
+            conn.executemany("DELETE FROM thumbnails WHERE key = ?", ((bytes.fromhex(key),) for key in keys))
+            removed = conn.total_changes - changes
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    def sweep(self, shard: int, live: set, started: float) -> int:
+        return self.remove(key for key, _, last_used in self.entries(shard)
+                           if int(key[2:18], 16) not in live and last_used < started)
+
+    def compact(self) -> Tuple[int, int]:
+        """Rewrite sealed packs with less than COMPACT_LIVE_RATIO live bytes.
+
+        Returns (packs rewritten, bytes freed). Also deletes pack files left
+        without an index entry (by a crash, or a failed delete).
+        """
+        conn = self._db()
+        conn.execute("UPDATE packs SET sealed = 1 WHERE NOT sealed AND updated < ?",
+                     (time.time() - PACK_IDLE_SECONDS,))
+        live = dict(conn.execute("SELECT pack, SUM(length) FROM thumbnails GROUP BY pack"))
+        candidates = [(pack, size) for pack, size in conn.execute("SELECT id, size FROM packs WHERE sealed")
+                      if live.get(pack, 0) < size * COMPACT_LIVE_RATIO or not live.get(pack)]
+        compacted = freed = 0
+        for pack, size in candidates:
+            rows = conn.execute(
+                "SELECT key, offset, length, last_used FROM thumbnails WHERE pack = ?", (pack,)).fetchall()
+            moved = []
+            for key, offset, length, last_used in rows:
+                data = self._read_range(pack, offset, length)
+                if data is not None:
+                    moved.append((key, data, last_used, (pack, offset)))
+            self._append(moved, "IGNORE")
+            # Rows whose data could not be read (a torn write) are dropped
+            conn.execute("DELETE FROM thumbnails WHERE pack = ?", (pack,))
+            conn.execute("DELETE FROM packs WHERE id = ?", (pack,))
+            with self._maps_lock:
+                self._maps.pop(pack, None)
+            compacted += 1
+            freed += size - sum(len(data) for _, data, _, _ in moved)
+        self._remove_stray_packs()
+        return compacted, freed
+
+    def _remove_stray_packs(self):
+        packs = {pack for pack, in self._db().execute("SELECT id FROM packs")}
+        for entry in os.scandir(self.directory):
+            match = _PACK_NAME.match(entry.name)
+            if match and int(match.group(1)) not in packs:
+                try:
+                    os.unlink(entry.path)
+                except OSError as e:
+                    # Windows cannot delete a file that is still mapped; next time
+                    logger.warning(f"Could not remove thumbnail pack {entry.path}: {e}")
+
+    def disk_bytes(self) -> Optional[int]:
+        """Bytes in the pack files, including evicted and replaced thumbnails."""
+        return self._db().execute("SELECT COALESCE(SUM(size), 0) FROM packs").fetchone()[0]
+
+    def close(self):
+        self._close_writer()
+        with self._maps_lock:
+            self._maps.clear()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+THUMBNAIL_STORES = {
+    "files": ThumbnailFiles,
+    "pack": PackedThumbnailStore,
+}
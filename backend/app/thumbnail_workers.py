@@ -0,0 +1,230 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+from collections import defaultdict
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from . import config
+from .thumbnail_cache import thumbnail_cache
+from .thumbnail_generator import generate_thumbnail_batch
+
+logger = logging.getLogger(__name__)
+
+# Queue priorities, lowest first: thumbnails on screen, thumbnails a client
+# prefetches (?prefetch=true), background pre-generation
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_PREGENERATE = 2
+# Images per worker task; a task being run is not preempted, so this bounds
+# how long a visible thumbnail can wait behind pre-generation
+CHUNK_SIZE = 8
+
+
+class _Flight:
+    """A thumbnail (image, size) queued or being generated."""
+
+    __slots__ = ("future", "priority", "started", "waiters")
+
+    def __init__(self, future: asyncio.Future, priority: int):
+        self.future = future
+        self.priority = priority
+        self.started = False
+        # Callers awaiting it; queued flights nobody waits for are dropped
+        self.waiters = 0
+
+
+class ThumbnailWorkers:
+    """Generates thumbnails in a bounded pool of worker processes.
+
+    Requests and pre-generation submit (image, sizes) batches to a priority
+    queue; one dispatcher per worker process (config.THUMBNAIL_WORKERS) takes
+    the next batch and runs it, so there are never more batches in the pool
+    than workers and a request for a visible thumbnail waits for at most the
+    batches already running. Generation is single-flight: a thumbnail that is
+    queued or being generated is not submitted again, its callers wait on
+    the same future. When it is requested with a higher priority while
+    still queued, it is queued again with that priority (the first batch to
+    run it generates it, the other skips it).
+    """
+
+    def __init__(self):
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._dispatchers: List[asyncio.Task] = []
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        # Orders batches of equal priority first in, first out
+        self._sequence = itertools.count()
+
+    @property
+    def worker_count(self) -> int:
+        return config.THUMBNAIL_WORKERS or max(1, (os.cpu_count() or 1) // 2)
+
+    @property
+    def queued(self) -> int:
+        """Thumbnails queued or being generated."""
+        return len(self._flights)
+
+    async def stop(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self._queue = None
+        for flight in self._flights.values():
+            if not flight.future.done():
+                flight.future.set_result(None)
+        self._flights.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and watcher threads is unsafe
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.worker_count,
+                mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def get(self, image_path: str, size: str,
+                  priority: int = PRIORITY_VISIBLE) -> Tuple[Optional[str], Optional[str]]:
+        """Generate one thumbnail and the image's placeholder from the same decode.
+
+        Returns the thumbnail's path and the placeholder, each None if it
+        could not be made.
+        """
+        async with aclosing(self.generate([image_path], [size], priority, placeholders=True)) as results:
+            async for _, thumb_paths, placeholder in results:
+                return thumb_paths[0], placeholder
+        return None, None
+
+    async def generate(self, paths: List[str], sizes: Sequence[str], priority: int = PRIORITY_VISIBLE,
+                       placeholders: bool = False
+                       ) -> AsyncIterator[Tuple[int, List[Optional[str]], Optional[str]]]:
+        """Generate the thumbnails of `paths` in each of `sizes`.
+
+        Yields (index into `paths`, thumbnail paths in the order of `sizes`,
+        None where generation failed, placeholder) as the images are done.
+        With `placeholders`, each image's placeholder is made in the same
+        pass (see ThumbnailGenerator.generate_with_placeholder), else it is
+        None. Closing the iterator early (use contextlib.aclosing) drops the
+        thumbnails nobody else waits for from the queue.
+        """
+        flights = self._submit(paths, sizes, priority, placeholders)
+        indexes = defaultdict(list)
+        for index, (image_flights, placeholder) in enumerate(flights):
+            for flight in image_flights + ([placeholder] if placeholder else []):
+                indexes[flight.future].append(index)
+        left = [len(image_flights) + (placeholder is not None) for image_flights, placeholder in flights]
+        pending = set(indexes)
+        try:
+            while pending:
+                # asyncio.wait, unlike awaiting the futures, does not cancel
+                # them if this caller is cancelled; others may wait on them
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    for index in indexes[future]:
+                        left[index] -= 1
+                        if not left[index]:
+                            image_flights, placeholder = flights[index]
+                            yield (index, [flight.future.result() for flight in image_flights],
+                                   placeholder.future.result() if placeholder else None)
+        finally:
+            for image_flights, placeholder in flights:
+                for flight in image_flights + ([placeholder] if placeholder else []):
+                    flight.waiters -= 1
+
+    def _submit(self, paths: List[str], sizes: Sequence[str], priority: int,
+                placeholders: bool) -> List[Tuple[List[_Flight], Optional[_Flight]]]:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.worker_count)]
+        loop = asyncio.get_running_loop()
+        flights = []
+        items = []
+        for path in paths:
+            image_flights = []
+            new_sizes = []
+            for size in sizes:
+                flight = self._flights.get((path, size))
+                if flight is None:
+                    flight = self._flights[(path, size)] = _Flight(loop.create_future(), priority)
+                    new_sizes.append(size)
+                elif not flight.started and priority < flight.priority:
+                    # Queued behind less urgent work; queue it again here
+                    flight.priority = priority
+                    new_sizes.append(size)
+                flight.waiters += 1
+                image_flights.append(flight)
+            # Placeholders are not shared: each caller asking for one gets
+            # its own, made with whichever sizes this item runs
+            placeholder = None
+            if placeholders:
+                placeholder = _Flight(loop.create_future(), priority)
+                placeholder.waiters = 1
+            flights.append((image_flights, placeholder))
+            if new_sizes or placeholder:
+                items.append((path, new_sizes, placeholder))
+        # Split so every worker gets a share of a small request
+        chunk_size = max(1, min(CHUNK_SIZE, -(-len(items) // self.worker_count)))
+        for start in range(0, len(items), chunk_size):
+            self._queue.put_nowait((priority, next(self._sequence), items[start:start + chunk_size]))
+        return flights
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, items = await self._queue.get()
+            batch = []
+            for path, sizes, placeholder in items:
+                run_sizes = []
+                for size in sizes:
+                    flight = self._flights.get((path, size))
+                    if flight is None or flight.started:
+                        continue  # Run by a batch queued with a higher priority
+                    if not flight.waiters:
+                        del self._flights[(path, size)]
+                        flight.future.set_result(None)
+                        continue
+                    flight.started = True
+                    run_sizes.append(size)
+                if placeholder is not None and not placeholder.waiters:
+                    placeholder.future.set_result(None)
+                    placeholder = None
+                if run_sizes or placeholder:
+                    batch.append((path, run_sizes, placeholder))
+            if not batch:
+                continue
+            # Failed images (and a failed or cancelled batch) resolve to None
+            results = [([None] * len(sizes), None) for _, sizes, _ in batch]
+            executor = self._get_executor()
+            try:
+                results, generated, generated_bytes = await loop.run_in_executor(
+                    executor, generate_thumbnail_batch,
+                    [(path, sizes, placeholder is not None) for path, sizes, placeholder in batch])
+                thumbnail_cache.record_generated(generated_bytes, generated)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Thumbnail worker failed: {e}", exc_info=True)
+                # A worker died (e.g. out of memory): every batch running in
+                # the pool fails with it; the first to get here starts a new pool
+                if isinstance(e, concurrent.futures.process.BrokenProcessPool) and self._executor is executor:
+                    self._executor = None
+                    executor.shutdown(wait=False, cancel_futures=True)
+            finally:
+                for (path, sizes, placeholder), (thumb_paths, placeholder_data) in zip(batch, results):
+                    for size, thumb_path in zip(sizes, thumb_paths):
+                        flight = self._flights.pop((path, size), None)
+                        if flight is not None and not flight.future.done():
+                            flight.future.set_result(thumb_path)
+                    if placeholder is not None and not placeholder.future.done():
+                        placeholder.future.set_result(placeholder_data)
+
+
+# Global thumbnail worker pool instance
+thumbnail_workers = ThumbnailWorkers()
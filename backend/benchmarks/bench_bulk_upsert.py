@@ -0,0 +1,103 @@
+"""Micro-benchmark image upserts (rows/sec): per-row statements vs executemany.
+
+Each size is run against a fresh temporary SQLite database: a first pass
+inserts every row, a second pass updates them all (the rescan case). Rows are
+written in BATCH_SIZE batches like a scan does.
+
+Run from the backend directory:
+    python -m benchmarks.bench_bulk_upsert --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas
+
+
+async def legacy_process_image_batch(db, batch):
+    """process_image_batch before bulk upserts: one statement per image."""
+    unique_images = {img.full_path: img for img in batch}
+    for image_data in unique_images.values():
+        stmt = insert(models.Image).values(
+            **image_data.model_dump(exclude_none=True))
+        update_dict = {
+            "last_modified": image_data.last_modified,
+            "metadata": image_data.metadata_,
+            "folder_id": image_data.folder_id,
+            "filename": image_data.filename,
+        }
+        for field in ['width', 'height', 'file_size', 'thumbnail_path', 'has_thumbnail']:
+            value = getattr(image_data, field, None)
+            if value is not None:
+                update_dict[field] = value
+        stmt = stmt.on_conflict_do_update(index_elements=['full_path'], set_=update_dict)
+        await db.execute(stmt)
+    await db.commit()
+
+
+def make_batch(start: int, count: int, folder_id: int, generation: int):
+    now = datetime.now(timezone.utc)
+    return [
+        schemas.ImageCreate(
+            filename=f"ComfyUI_{i:07d}_.png",
+            full_path=f"/comfy/output/{i // 1000:04d}/ComfyUI_{i:07d}_.png",
+            last_modified=now,
+            metadata_={"3": {"class_type": "KSampler", "inputs": {"seed": i + generation}},
+                       "seed": i + generation, "steps": 30, "sampler": "euler"},
+            folder_id=folder_id,
+            width=1024,
+            height=1024,
+            file_size=1_500_000 + generation,
+        )
+        for i in range(start, start + count)
+    ]
+
+
+async def run_size(size: int, implementation) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        rates = []
+        async with Session() as db:
+            folder = models.Folder(path="/comfy/output")
+            db.add(folder)
+            await db.commit()
+            for generation in range(2):  # insert pass, then update pass
+                elapsed = 0.0
+                for start in range(0, size, crud.BATCH_SIZE):
+                    batch = make_batch(start, min(crud.BATCH_SIZE, size - start), folder.id, generation)
+                    t0 = time.perf_counter()
+                    await implementation(db, batch)
+                    elapsed += time.perf_counter() - t0
+                rates.append(size / elapsed)
+        await engine.dispose()
+        return tuple(rates)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="Skip the per-row implementation above this size (it is slow)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'impl':<9} {'insert rows/s':>14} {'update rows/s':>14}")
+    for size in args.sizes:
+        if size <= args.legacy_max:
+            insert_rate, update_rate = await run_size(size, legacy_process_image_batch)
+            print(f"{size:>9} {'per-row':<9} {insert_rate:>14,.0f} {update_rate:>14,.0f}")
+        insert_rate, update_rate = await run_size(size, crud.process_image_batch)
+        print(f"{size:>9} {'bulk':<9} {insert_rate:>14,.0f} {update_rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""Benchmark /api/images response size and latency: full rows vs fields= projection.
+
+Fills a temporary database with synthetic images whose metadata is a
+ComfyUI-sized node graph, then requests pages of 100 and 1000 images
+through the FastAPI app (in process, over ASGI) with the full response and
+with fields=id,filename,width,height,thumbnail, and reports the response
+size and p50/p95 latency of each.
+
+Run from the backend directory:
+    python -m benchmarks.bench_image_list --rows 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas
+
+SLIM_FIELDS = "id,filename,width,height,thumbnail"
+
+
+def comfyui_graph(seed: int, nodes: int) -> dict:
+    graph = {
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": seed, "steps": 30, "cfg": 7.0, "sampler_name": "euler",
+            "scheduler": "normal", "denoise": 1.0, "model": ["4", 0],
+            "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {
+            "text": f"a lighthouse at dusk, dramatic clouds, seed {seed}, " * 6, "clip": ["4", 1]},
+            "_meta": {"title": "Positive"}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry, lowres", "clip": ["4", 1]},
+              "_meta": {"title": "Negative"}},
+    }
+    # Typical workflows add upscalers, detailers, ControlNets, ...
+    for n in range(nodes):
+        graph[str(100 + n)] = {
+            "class_type": "ImageUpscaleWithModel" if n % 2 else "FaceDetailer",
+            "inputs": {"image": [str(99 + n), 0], "guide_size": 384, "max_size": 1024,
+                       "seed": seed + n, "steps": 20, "cfg": 8.0, "sampler_name": "euler",
+                       "scheduler": "normal", "denoise": 0.5, "feather": 5,
+                       "bbox_threshold": 0.5, "sam_detection_hint": "center-1"},
+            "_meta": {"title": f"Node {n}"}}
+    return graph
+
+
+async def measure(client, params, repeat):
+    times = []
+    size = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        response = await client.get("/api/images", params=params)
+        times.append(time.perf_counter() - t0)
+        response.raise_for_status()
+        size = len(response.content)
+    times.sort()
+    p95 = times[min(len(times) - 1, round(0.95 * (len(times) - 1)))]
+    return size, statistics.median(times), p95
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--nodes", type=int, default=25, help="Extra nodes per metadata graph")
+    parser.add_argument("--repeat", type=int, default=40)
+    args = parser.parse_args()
+
+    from app.main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        database.AsyncSessionLocal = sessionmaker(
+            bind=database.engine, class_=AsyncSession, expire_on_commit=False)
+        async with database.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        rng = random.Random(0)
+        now = datetime.now(timezone.utc)
+        async with database.AsyncSessionLocal() as db:
+            folder = models.Folder(path="/comfy/output")
+            db.add(folder)
+            await db.commit()
+            folder_id = folder.id
+            print(f"Inserting {args.rows} rows ...")
+            for start in range(0, args.rows, crud.BATCH_SIZE):
+                await crud.process_image_batch(db, [
+                    schemas.ImageCreate(
+                        filename=f"ComfyUI_{i:06d}_.png",
+                        full_path=f"/comfy/output/ComfyUI_{i:06d}_.png",
+                        last_modified=now,
+                        metadata_=comfyui_graph(rng.randrange(1 << 32), args.nodes),
+                        folder_id=folder_id, width=1024, height=1024, file_size=1_500_000)
+                    for i in range(start, min(start + crud.BATCH_SIZE, args.rows))])
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print(f"{'limit':>5} {'mode':<6} {'bytes':>12} {'p50 ms':>8} {'p95 ms':>8}")
+            for limit in (100, 1000):
+                base = {"folder_id": folder_id, "limit": limit, "skip": args.rows // 2,
+                        "sort_by": "date", "sort_dir": "desc"}
+                results = {}
+                for mode, params in (("full", base), ("slim", {**base, "fields": SLIM_FIELDS})):
+                    results[mode] = await measure(client, params, args.repeat)
+                    size, p50, p95 = results[mode]
+                    print(f"{limit:>5} {mode:<6} {size:>12,} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f}")
+                print(f"{'':>5} {'ratio':<6} {results['full'][0] / results['slim'][0]:>11.1f}x "
+                      f"{results['full'][1] / results['slim'][1]:>7.1f}x "
+                      f"{results['full'][2] / results['slim'][2]:>7.1f}x")
+        await database.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Benchmark probing new files: three opens per file vs one.
+
+The previous scan path called extract_comfyui_metadata (PILImage.open, never
+closed), ThumbnailGenerator.get_image_dimensions (a second open) and
+get_file_size (a stat). image_probe.probe_image opens each file once and takes
+size and mtime from fstat() on that handle.
+
+A high-latency filesystem (e.g. an SMB share) is simulated by sleeping on every
+open() and path-based stat() call; fstat() on an open handle and reads are not
+delayed. Each implementation runs in a fresh process so the OS file cache
+state is the same for both.
+
+Run from the backend directory:
+    python -m benchmarks.bench_image_probe --files 2000 --latency-ms 0 2
+"""
+import argparse
+import builtins
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image as PILImage
+
+
+def legacy_probe(path: str):
+    """scan probe before image_probe: metadata, dimensions and size separately."""
+    from app import metadata_extractor
+    img = PILImage.open(path)
+    metadata = None
+    if img.format == "PNG":
+        raw = img.info.get('prompt') or img.info.get('workflow')
+        if raw:
+            metadata = json.loads(raw)
+            metadata.update(metadata_extractor.extract_generation_params(metadata))
+    with PILImage.open(path) as img:
+        width, height = img.width, img.height
+    size = os.stat(path).st_size
+    return metadata, width, height, size
+
+
+def single_open_probe(path: str):
+    from app import image_probe, metadata_extractor
+    probe = image_probe.probe_image(path)
+    metadata = metadata_extractor.parse_comfyui_metadata(probe.text_chunks, probe.format)
+    return metadata, probe.width, probe.height, probe.size
+
+
+IMPLEMENTATIONS = {"three-opens": legacy_probe, "one-open": single_open_probe}
+
+
+def add_latency(latency: float, counters: dict):
+    """Delay open() and stat() by `latency` seconds, counting the calls."""
+    real_open, real_stat = builtins.open, os.stat
+
+    def slow_open(*args, **kwargs):
+        counters['open'] += 1
+        time.sleep(latency)
+        return real_open(*args, **kwargs)
+
+    def slow_stat(*args, **kwargs):
+        counters['stat'] += 1
+        time.sleep(latency)
+        return real_stat(*args, **kwargs)
+
+    builtins.open = slow_open
+    os.stat = slow_stat
+
+
+def build_files(root: str, count: int):
+    from PIL import PngImagePlugin
+    prompt = {
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": 1, "steps": 30, "cfg": 7.0, "sampler_name": "euler",
+            "scheduler": "normal", "denoise": 1.0}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a lighthouse at dusk, " * 40}},
+    }
+    info = PngImagePlugin.PngInfo()
+    info.add_text("prompt", json.dumps(prompt))
+    info.add_text("workflow", json.dumps({"nodes": [{"id": i} for i in range(200)]}))
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (512, 512)).save(buffer, format="PNG", pnginfo=info)
+    for i in range(count):
+        with open(os.path.join(root, f"ComfyUI_{i:05d}_.png"), "wb") as f:
+            f.write(buffer.getvalue())
+
+
+def run_child(root: str, implementation: str, latency: float) -> dict:
+    counters = {'open': 0, 'stat': 0}
+    paths = sorted(os.path.join(root, name) for name in os.listdir(root))
+    probe = IMPLEMENTATIONS[implementation]
+    probe(paths[0])  # import and warm up outside the timed loop
+    if latency:
+        add_latency(latency, counters)
+    start = time.perf_counter()
+    for path in paths:
+        probe(path)
+    elapsed = time.perf_counter() - start
+    return {"files": len(paths), "elapsed": elapsed, **counters}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0, 2])
+    parser.add_argument("--child", nargs=3, metavar=("ROOT", "IMPL", "LATENCY"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        root, implementation, latency = args.child
+        print(json.dumps(run_child(root, implementation, float(latency))))
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        build_files(root, args.files)
+        print(f"{'latency':>8} {'impl':<12} {'files/s':>9} {'opens/file':>11} {'stats/file':>11}")
+        for latency_ms in args.latency_ms:
+            for implementation in IMPLEMENTATIONS:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_image_probe",
+                     "--child", root, implementation, str(latency_ms / 1000)],
+                    check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                files = result['files']
+                opens = f"{result['open'] / files:.1f}" if latency_ms else "-"
+                stats = f"{result['stat'] / files:.1f}" if latency_ms else "-"
+                print(f"{latency_ms:>6.1f}ms {implementation:<12} "
+                      f"{files / result['elapsed']:>9,.0f} {opens:>11} {stats:>11}")
+
+
+if __name__ == "__main__":
+    main()
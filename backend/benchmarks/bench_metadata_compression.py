@@ -0,0 +1,138 @@
+"""Benchmark the metadata codecs: plain JSON vs zlib with a trained dictionary.
+
+Builds temporary databases with the same synthetic library (see
+bench_metadata_graphs) for each codec, with metadata split into shared
+graphs as the scan path stores it and, with --inline, also without the
+split. The first --train-rows images are written, a dictionary is trained
+on them and they are converted like the migration tool does; the remaining
+images are then written the way scans write them. Reports the database size,
+write throughput, conversion throughput and the median time to read a page
+of 1000 images with their metadata and the metadata of single images.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metadata_compression --rows 100000 --inline
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from unittest import mock
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, metadata_graphs, models
+from app.metadata_codec import metadata_codec
+from benchmarks.bench_metadata_graphs import make_batch
+
+
+async def run(path, args, codec, split):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    metadata_codec.enabled = codec == "zlib"
+    metadata_codec.dictionary_id = 0
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    no_split = nullcontext() if split else mock.patch.object(
+        metadata_graphs, "split_metadata", return_value=None)
+    async with Session() as db:
+        folder = models.Folder(path="/comfy/output")
+        db.add(folder)
+        await db.commit()
+        batches = [
+            make_batch(start, min(crud.BATCH_SIZE, args.rows - start), folder.id,
+                       args.workflows, args.nodes, rng, now)
+            for start in range(0, args.rows, crud.BATCH_SIZE)]
+        train_batches = max(1, args.train_rows // crud.BATCH_SIZE)
+
+        # Existing library: stored, then converted by the migration tool
+        metadata_codec.enabled = False
+        with no_split:
+            for batch in batches[:train_batches]:
+                await crud.process_image_batch(db, batch)
+        metadata_codec.enabled = codec == "zlib"
+        started = time.perf_counter()
+        if metadata_codec.enabled:
+            await crud.train_metadata_dictionary(db)
+        await crud.recode_metadata_graphs(db)
+        converted = 0
+        last_id = 0
+        while True:
+            count, last_id = await crud.recode_stored_metadata(db, last_id)
+            if not count:
+                break
+            converted += count
+        convert_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        written = 0
+        with no_split:
+            for batch in batches[train_batches:]:
+                await crud.process_image_batch(db, batch)
+                written += len(batch)
+        write_time = time.perf_counter() - started
+
+        page_times = []
+        single_times = []
+        for n in range(args.repeat):
+            t0 = time.perf_counter()
+            page = await crud.get_images_by_folder(
+                db, folder.id, skip=(n * 1000) % max(1, args.rows - 1000), limit=1000,
+                sort_by="date")
+            page_times.append(time.perf_counter() - t0)
+            assert all(image.metadata_ for image in page.images)
+            for image_id in random.Random(n).sample(range(1, args.rows + 1), 20):
+                db.expunge_all()
+                t0 = time.perf_counter()
+                assert (await crud.get_image_metadata(db, image_id)).metadata_
+                single_times.append(time.perf_counter() - t0)
+    await engine.dispose()
+    return {
+        "size": os.path.getsize(path),
+        "convert": converted / convert_time if converted else 0,
+        "write": written / write_time if written else 0,
+        "page": statistics.median(page_times),
+        "single": statistics.median(single_times),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--train-rows", type=int, default=5000,
+                        help="Images stored before the dictionary is trained")
+    parser.add_argument("--workflows", type=int, default=30)
+    parser.add_argument("--nodes", type=int, default=25, help="Extra nodes per workflow")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--inline", action="store_true",
+                        help="Also measure metadata stored inline (not split into graphs)")
+    args = parser.parse_args()
+
+    storages = (("shared", True), ("inline", False)) if args.inline else (("shared", True),)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.rows} images from {args.workflows} workflows")
+        print(f"{'storage':<8} {'codec':<6} {'db MiB':>8} {'convert/s':>10} {'write/s':>8} "
+              f"{'read 1000 ms':>13} {'read 1 ms':>10}")
+        for storage, split in storages:
+            results = {}
+            for codec in ("json", "zlib"):
+                result = results[codec] = await run(
+                    os.path.join(tmp, f"{storage}-{codec}.db"), args, codec, split)
+                print(f"{storage:<8} {codec:<6} {result['size'] / 2**20:>8.1f} "
+                      f"{result['convert']:>10,.0f} {result['write']:>8,.0f} "
+                      f"{result['page'] * 1000:>13.1f} {result['single'] * 1000:>10.2f}")
+            plain, compressed = results["json"], results["zlib"]
+            print(f"{storage:<8} zlib: {plain['size'] / compressed['size']:.1f}x smaller, "
+                  f"write {compressed['write'] / plain['write']:.2f}x, "
+                  f"read 1000 {compressed['page'] / plain['page']:.2f}x the time")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
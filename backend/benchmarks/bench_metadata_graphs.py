@@ -0,0 +1,114 @@
+"""Benchmark storing metadata inline vs as shared graphs with per-image deltas.
+
+Builds two temporary databases with the same synthetic library (N images
+generated from a few dozen workflows that differ per image only in the
+sampler seed and the prompt texts) through crud.process_image_batch: once with the metadata
+inline in every row, as before, and once split into shared graphs. Reports
+the database size, upsert throughput and the time to read a page of 1000
+images including their metadata.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metadata_graphs --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, metadata_graphs, models, schemas
+from benchmarks.bench_image_list import comfyui_graph
+
+
+def make_batch(start, count, folder_id, workflows, nodes, rng, now):
+    batch = []
+    for i in range(start, start + count):
+        workflow = i % workflows
+        metadata = comfyui_graph(rng.randrange(1 << 48), nodes + workflow % 5)
+        metadata["4"]["inputs"]["ckpt_name"] = f"model_{workflow:02d}.safetensors"
+        # Only the sampler seed and the prompts change between runs of a
+        # workflow; the seeds of its other nodes are usually fixed
+        for node_id, node in metadata.items():
+            if int(node_id) >= 100:
+                node["inputs"]["seed"] = workflow
+        batch.append(schemas.ImageCreate(
+            filename=f"ComfyUI_{i:07d}_.png",
+            full_path=f"/comfy/output/ComfyUI_{i:07d}_.png",
+            last_modified=now,
+            metadata_=metadata,
+            folder_id=folder_id, width=1024, height=1024, file_size=1_500_000))
+    return batch
+
+
+async def run(path, args, shared):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    async with Session() as db:
+        folder = models.Folder(path="/comfy/output")
+        db.add(folder)
+        await db.commit()
+        batches = [
+            make_batch(start, min(crud.BATCH_SIZE, args.rows - start), folder.id,
+                       args.workflows, args.nodes, rng, now)
+            for start in range(0, args.rows, crud.BATCH_SIZE)]
+        started = time.perf_counter()
+        if shared:
+            for batch in batches:
+                await crud.process_image_batch(db, batch)
+        else:
+            # Metadata that cannot be split is stored inline, as it always was
+            with mock.patch.object(metadata_graphs, "split_metadata", return_value=None):
+                for batch in batches:
+                    await crud.process_image_batch(db, batch)
+        insert_time = time.perf_counter() - started
+        graphs = (await db.execute(text("SELECT count(*) FROM metadata_graphs"))).scalar_one()
+
+        times = []
+        for n in range(args.repeat):
+            t0 = time.perf_counter()
+            page = await crud.get_images_by_folder(
+                db, folder.id, skip=(n * 1000) % max(1, args.rows - 1000), limit=1000,
+                sort_by="date")
+            times.append(time.perf_counter() - t0)
+        assert all(image.metadata_ for image in page.images)
+    await engine.dispose()
+    return os.path.getsize(path), insert_time, graphs, statistics.median(times)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workflows", type=int, default=30)
+    parser.add_argument("--nodes", type=int, default=25, help="Extra nodes per workflow")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.rows} images from {args.workflows} workflows")
+        print(f"{'storage':<8} {'db MiB':>8} {'graphs':>7} {'upsert rows/s':>14} {'read 1000 ms':>13}")
+        results = {}
+        for name, shared in (("inline", False), ("shared", True)):
+            size, insert_time, graphs, read_time = await run(
+                os.path.join(tmp, f"{name}.db"), args, shared)
+            results[name] = (size, insert_time, read_time)
+            print(f"{name:<8} {size / 2**20:>8.1f} {graphs:>7} {args.rows / insert_time:>14,.0f} "
+                  f"{read_time * 1000:>13.1f}")
+        inline, shared = results["inline"], results["shared"]
+        print(f"size: {inline[0] / shared[0]:.1f}x smaller, upsert: {inline[1] / shared[1]:.1f}x "
+              f"faster, read: {inline[2] / shared[2]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+"""Regression check and throughput of metadata_extractor.extract_generation_params.
+
+Runs the node-handler registry against a copy of the if-chain it replaced
+(legacy_extract_generation_params below) on a corpus of ComfyUI graphs and
+fails if any result differs (including which graphs raise). Then reports
+graphs/sec for both, and for the registry with extra handlers registered
+the way a custom node pack would.
+
+Without --dir the corpus is generated: graphs mixing the built-in node types
+with their variants (advanced samplers, SDXL/ttN prompt nodes, upscalers,
+LoRA chains, nodes without a class type, workflow-format node lists, some
+with repeated node ids, ...)
+and common nodes no handler matches. Point --dir at a ComfyUI output folder
+to check and time the graphs of real images as well. A fixed sample of the
+generated graphs, with the legacy results, is checked by
+tests/test_metadata_parser.py.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metadata_parser --graphs 20000
+    python -m benchmarks.bench_metadata_parser --dir /path/to/ComfyUI/output
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from app import metadata_extractor
+from app.file_scanner import iter_image_files
+from app.image_probe import probe_image
+from app.metadata_extractor import COMFYUI_TEXT_KEYS, extract_generation_params
+
+
+def legacy_extract_generation_params(metadata_dict):
+    """extract_generation_params as it was before the handler registry."""
+    result = {
+        'seed': None, 'steps': None, 'sampler': None, 'scheduler': None, 'cfg': None,
+        'denoise': None, 'model': None, 'hires_fix': None, 'hires_upscaler': None,
+        'lora_models': [], 'positive_prompt': None, 'negative_prompt': None,
+    }
+    if not isinstance(metadata_dict, dict):
+        return result
+    nodes = metadata_dict
+    if 'nodes' in metadata_dict and isinstance(metadata_dict['nodes'], list):
+        nodes = {str(node['id']): node for node in metadata_dict['nodes'] if isinstance(node, dict) and 'id' in node}
+    prompts_found = []
+    for node_id, node in nodes.items():
+        class_type = node.get('class_type') or node.get('type')
+        inputs = node.get('inputs', {})
+        meta = node.get('_meta', {}) or {}
+        if class_type and ('KSampler' in class_type or class_type == 'BNK_Unsampler'):
+            seed = inputs.get('seed') or inputs.get('noise_seed')
+            if seed is not None:
+                result['seed'] = seed
+            cfg = inputs.get('cfg')
+            if cfg is not None:
+                result['cfg'] = cfg
+            denoise = inputs.get('denoise')
+            if denoise is not None:
+                result['denoise'] = denoise
+            steps = inputs.get('steps')
+            if steps is not None:
+                result['steps'] = steps
+            sampler = inputs.get('sampler_name')
+            if sampler is not None:
+                result['sampler'] = sampler
+            scheduler = inputs.get('scheduler')
+            if scheduler is not None:
+                result['scheduler'] = scheduler
+        if class_type == 'CheckpointLoaderSimple':
+            model_name = inputs.get('ckpt_name')
+            if model_name:
+                result['model'] = model_name
+        if class_type == 'LoraLoader':
+            lora_name = inputs.get('lora_name')
+            lora_weight = inputs.get('strength_model')
+            if lora_name:
+                result['lora_models'].append({'name': lora_name, 'weight': lora_weight})
+        if class_type and ('Upscale' in class_type or 'Scale' in class_type):
+            scale = inputs.get('scale_by') or inputs.get('scale')
+            upscaler = inputs.get('upscale_method') or inputs.get('upscaler')
+            if scale is not None:
+                result['hires_fix'] = scale
+            if upscaler is not None:
+                result['hires_upscaler'] = upscaler
+        if class_type and (class_type.startswith('CLIPTextEncode') or class_type == 'ttN text'):
+            text = inputs.get('text')
+            title = meta.get('title', '').lower()
+            if text:
+                prompts_found.append((title, text))
+    if prompts_found:
+        for title, text in prompts_found:
+            if 'negative' in title and not result['negative_prompt']:
+                result['negative_prompt'] = text
+            elif ('positive' in title or 'prompt' in title or 'encode' in title) and not result['positive_prompt']:
+                result['positive_prompt'] = text
+        if not result['positive_prompt'] and prompts_found:
+            result['positive_prompt'] = prompts_found[0][1]
+        if not result['negative_prompt'] and len(prompts_found) > 1:
+            result['negative_prompt'] = prompts_found[1][1]
+    if not result['lora_models']:
+        result.pop('lora_models')
+    return result
+
+
+def random_node(rng: random.Random, seed: int) -> dict:
+    kind = rng.randrange(16)
+    title = rng.choice([None, "Positive", "Negative Prompt", "CLIP Text Encode (Prompt)", "style"])
+    meta = {"_meta": {"title": title}} if title else {}
+    if kind == 0:
+        return {"class_type": rng.choice(["KSampler", "KSamplerAdvanced", "KSampler (Efficient)",
+                                          "BNK_Unsampler"]),
+                "inputs": {"seed": rng.choice([seed, 0, None]), "noise_seed": seed + 1,
+                           "steps": rng.randrange(10, 60), "cfg": rng.choice([7, 4.5, None]),
+                           "sampler_name": rng.choice(["euler", "dpmpp_2m"]), "scheduler": "karras",
+                           "denoise": rng.choice([1.0, 0.4]), "model": ["4", 0]}}
+    if kind == 1:
+        return {"class_type": "CheckpointLoaderSimple",
+                "inputs": {"ckpt_name": rng.choice(["sdxl.safetensors", "", "flux.safetensors"])}}
+    if kind == 2:
+        return {"class_type": rng.choice(["LoraLoader", "LoraLoaderModelOnly"]),
+                "inputs": {"lora_name": rng.choice([f"lora_{seed % 7}.safetensors", None]),
+                           "strength_model": rng.choice([0.8, 1, None])}}
+    if kind == 3:
+        return {"class_type": rng.choice(["LatentUpscaleBy", "ImageScale", "UpscaleModelLoader",
+                                          "ImageUpscaleWithModel", "ImageScaleToTotalPixels"]),
+                "inputs": {"scale_by": rng.choice([1.5, 0, None]), "scale": 2,
+                           "upscale_method": rng.choice(["nearest-exact", None]),
+                           "upscaler": "4x-UltraSharp"}}
+    if kind in (4, 5):
+        return {"class_type": rng.choice(["CLIPTextEncode", "CLIPTextEncodeSDXL", "ttN text"]),
+                "inputs": {"text": rng.choice([f"a castle, seed {seed}", "", "lowres, blurry"]),
+                           "clip": ["4", 1]}, **meta}
+    if kind == 6:
+        return {"inputs": {"value": seed}}
+    return {"class_type": rng.choice(["VAEDecode", "SaveImage", "PreviewImage", "Reroute",
+                                      "EmptyLatentImage", "ControlNetApply", "FaceDetailer"]),
+            "inputs": {"images": ["8", 0], "seed": seed}, **meta}
+
+
+def build_corpus(count: int) -> list:
+    rng = random.Random(0)
+    corpus = []
+    for i in range(count):
+        nodes = {str(n): random_node(rng, i * 100 + n) for n in range(rng.randrange(3, 40))}
+        if i % 50 == 0:
+            # Workflow format: a list of nodes with widget values and list inputs
+            corpus.append({"nodes": [
+                {"id": int(node_id), "type": node.get("class_type"),
+                 "inputs": [{"name": "model", "link": 1}], "widgets_values": [i]}
+                for node_id, node in nodes.items()]})
+        elif i % 50 == 25:
+            # Workflow-format list whose node ids repeat (the last one counts)
+            corpus.append({"nodes": [{"id": int(node_id) % 5, **node} for node_id, node in nodes.items()]})
+        elif i % 97 == 0:
+            nodes["bad"] = {"class_type": 5, "inputs": {}}
+            corpus.append(nodes)
+        else:
+            corpus.append(nodes)
+    return corpus
+
+
+def read_corpus(directory: str) -> list:
+    corpus = []
+    for entry in iter_image_files(directory, {".png"}):
+        probe = probe_image(entry.path, COMFYUI_TEXT_KEYS)
+        chunks = probe.text_chunks if probe is not None else None
+        for key in COMFYUI_TEXT_KEYS:
+            if chunks and chunks.get(key):
+                try:
+                    corpus.append(json.loads(chunks[key]))
+                except ValueError:
+                    pass
+    return corpus
+
+
+def outcome(extract, graph):
+    try:
+        return extract(graph)
+    except Exception as e:
+        return f"raised {type(e).__name__}"
+
+
+def throughput(extract, corpus, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for graph in corpus:
+            try:
+                extract(graph)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - started)
+    return len(corpus) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--graphs", type=int, default=20_000, help="Generated graphs")
+    parser.add_argument("--dir", help="Also use the graphs of the PNGs in this folder")
+    parser.add_argument("--extra-handlers", type=int, default=20,
+                        help="Handlers registered for the custom node pack run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.graphs)
+    if args.dir:
+        real = read_corpus(args.dir)
+        print(f"{len(real)} graphs read from {args.dir}")
+        corpus += real
+
+    mismatches = [
+        i for i, graph in enumerate(corpus)
+        if outcome(extract_generation_params, graph) != outcome(legacy_extract_generation_params, graph)
+    ]
+    nodes = sum(len(graph.get("nodes", graph)) for graph in corpus)
+    print(f"{len(corpus)} graphs, {nodes} nodes: {len(mismatches)} results differ from the legacy parser")
+    for i in mismatches[:5]:
+        print(f"  graph {i}: {outcome(extract_generation_params, corpus[i])!r}\n"
+              f"    legacy: {outcome(legacy_extract_generation_params, corpus[i])!r}")
+
+    legacy = throughput(legacy_extract_generation_params, corpus, args.repeat)
+    registry = throughput(extract_generation_params, corpus, args.repeat)
+    for n in range(args.extra_handlers):
+        metadata_extractor.register_node_handler(
+            lambda node, inputs, result, prompts: None,
+            class_types=(f"CustomPackNode{n}",), prefixes=(f"CustomPack{n}_",))
+    extended = throughput(extract_generation_params, corpus, args.repeat)
+    print(f"{'parser':<32} {'graphs/s':>10}")
+    print(f"{'legacy if-chain':<32} {legacy:>10,.0f}")
+    print(f"{'handler registry':<32} {registry:>10,.0f}  {registry / legacy:.2f}x")
+    print(f"{f'registry + {args.extra_handlers} custom handlers':<32} {extended:>10,.0f}  "
+          f"{extended / legacy:.2f}x")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
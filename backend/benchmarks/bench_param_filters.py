@@ -0,0 +1,109 @@
+"""Benchmark /api/images generation-parameter filters on a large library.
+
+Fills a temporary SQLite database with synthetic images (and LoRA rows)
+through the same bulk insert a scan uses, then times crud.get_images_by_folder
+(count + first page) for each filter and prints SQLite's query plan for the
+filtered count, to check that filters seek an index instead of scanning.
+
+Run from the backend directory:
+    python -m benchmarks.bench_param_filters --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas
+
+MODELS = [f"model_{i:02d}.safetensors" for i in range(40)]
+SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m", "dpmpp_2m_sde", "dpmpp_3m_sde", "ddim",
+            "uni_pc", "lcm"]
+LORAS = [f"lora_{i:03d}.safetensors" for i in range(200)]
+
+FILTERS = [
+    {},
+    {"model": MODELS[3]},
+    {"sampler": "ddim"},
+    {"model": MODELS[3], "sampler": "ddim"},
+    {"seed": 123_456},
+    {"cfg_min": 7.0, "cfg_max": 7.5},
+    {"lora": LORAS[17]},
+    {"lora": LORAS[17], "model": MODELS[3]},
+]
+
+
+def make_batch(start: int, count: int, folder_id: int, rng: random.Random):
+    now = datetime.now(timezone.utc)
+    batch = []
+    for i in range(start, start + count):
+        nodes = {
+            "3": {"class_type": "KSampler", "inputs": {
+                "seed": rng.randrange(1 << 40) if i != 123 else 123_456,
+                "steps": rng.choice([20, 25, 30]), "cfg": rng.choice([4.0, 5.5, 7.0, 7.5, 9.0]),
+                "sampler_name": rng.choice(SAMPLERS), "scheduler": "karras", "denoise": 1.0}},
+            "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": rng.choice(MODELS)}},
+            "6": {"class_type": "CLIPTextEncode", "inputs": {"text": f"prompt {i}"}},
+        }
+        for n in range(rng.randrange(3)):
+            nodes[f"1{n}"] = {"class_type": "LoraLoader", "inputs": {
+                "lora_name": rng.choice(LORAS), "strength_model": 0.8}}
+        batch.append(schemas.ImageCreate(
+            filename=f"ComfyUI_{i:07d}_.png",
+            full_path=f"/comfy/output/{i // 1000:04d}/ComfyUI_{i:07d}_.png",
+            last_modified=now,
+            metadata_=nodes,
+            folder_id=folder_id,
+        ))
+    return batch
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        rng = random.Random(0)
+        async with Session() as db:
+            folder = models.Folder(path="/comfy/output")
+            db.add(folder)
+            await db.commit()
+            print(f"Inserting {args.rows} rows ...")
+            for start in range(0, args.rows, crud.BATCH_SIZE):
+                await crud.process_image_batch(
+                    db, make_batch(start, min(crud.BATCH_SIZE, args.rows - start), folder.id, rng))
+            await db.execute(text("ANALYZE"))
+
+            print(f"{'filter':<48} {'matches':>8} {'ms':>8}  plan")
+            for filters in FILTERS:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    result = await crud.get_images_by_folder(
+                        db, folder.id, limit=100, sort_by="date", sort_dir="desc", **filters)
+                    best = min(best, time.perf_counter() - t0)
+                query = select(func.count()).select_from(models.Image).filter(
+                    models.Image.folder_id == folder.id,
+                    *crud.generation_param_filters(**filters))
+                compiled = query.compile(compile_kwargs={"literal_binds": True})
+                plan = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+                label = ", ".join(f"{k}={v}" for k, v in filters.items()) or "(none)"
+                print(f"{label:<48} {result.total_count:>8} {best * 1000:>8.1f}  "
+                      f"{' | '.join(row[-1] for row in plan)}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""Benchmark reading ComfyUI metadata from PNGs: Pillow vs the header-only chunk reader.
+
+Both paths return the dimensions and the 'prompt'/'workflow' text chunks. The
+Pillow path is PILImage.open(...).info as the extractor used it; the chunk
+reader (app.png_chunks) only walks the chunks before the first IDAT. Results
+of both are compared for every file before timing.
+
+Without --dir, synthetic ComfyUI-like PNGs are generated: the text chunks are
+stored as tEXt, zTXt and iTXt (compressed) in turn, with noise pixel data so
+the files have a realistic IDAT size. Point --dir at a ComfyUI output folder
+to use real images.
+
+Run from the backend directory:
+    python -m benchmarks.bench_png_chunks --files 10000
+    python -m benchmarks.bench_png_chunks --dir /path/to/ComfyUI/output
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image as PILImage
+from PIL import PngImagePlugin
+
+from app import png_chunks
+from app.file_scanner import iter_image_files
+from app.metadata_extractor import COMFYUI_TEXT_KEYS
+
+
+def pillow_read(path: str):
+    with PILImage.open(path) as img:
+        text = {key: img.info[key] for key in COMFYUI_TEXT_KEYS if key in img.info}
+        return img.width, img.height, text
+
+
+def chunk_read(path: str):
+    with open(path, "rb", buffering=png_chunks.READ_BUFFER_SIZE) as f:
+        header = png_chunks.read_png_header(f, COMFYUI_TEXT_KEYS)
+    return header.width, header.height, header.text_chunks
+
+
+def comfyui_graph(seed: int) -> dict:
+    return {
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": seed, "steps": 30, "cfg": 7.0, "sampler_name": "euler",
+            "scheduler": "normal", "denoise": 1.0, "model": ["4", 0]}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {
+            "text": f"a lighthouse at dusk, seed {seed}, " * 10}, "_meta": {"title": "Positive"}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry, lowres"}},
+        "10": {"class_type": "LoraLoader", "inputs": {
+            "lora_name": "detail.safetensors", "strength_model": 0.8}},
+    }
+
+
+def build_files(root: str, count: int, side: int):
+    rng = random.Random(0)
+    # A few noise images to copy pixel data from; generating 10k is slow
+    pixels = [PILImage.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+              for _ in range(8)]
+    workflow = json.dumps({"nodes": [
+        {"id": i, "type": "KSampler", "widgets_values": [i, "fixed", 30, 7.0]}
+        for i in range(150)]})
+    for i in range(count):
+        info = PngImagePlugin.PngInfo()
+        prompt = json.dumps(comfyui_graph(i))
+        kind = i % 3
+        if kind == 0:
+            info.add_text("prompt", prompt)
+            info.add_text("workflow", workflow)
+        elif kind == 1:
+            info.add_text("prompt", prompt, zip=True)
+            info.add_text("workflow", workflow, zip=True)
+        else:
+            info.add_itxt("prompt", prompt, zip=True)
+            info.add_itxt("workflow", workflow, zip=True)
+        pixels[i % len(pixels)].save(
+            os.path.join(root, f"ComfyUI_{i:05d}_.png"), pnginfo=info, compress_level=1)
+
+
+def timed(fn, paths):
+    start = time.perf_counter()
+    for path in paths:
+        fn(path)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--side", type=int, default=256, help="Synthetic image size in pixels")
+    parser.add_argument("--dir", help="Folder with real ComfyUI PNGs to use instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            paths = [entry.path for entry in iter_image_files(args.dir, {".png"})][:args.files]
+        else:
+            print(f"Generating {args.files} PNGs in {tmp} ...")
+            build_files(tmp, args.files, args.side)
+            paths = sorted(os.path.join(tmp, name) for name in os.listdir(tmp))
+
+        mismatches = [path for path in paths if pillow_read(path) != chunk_read(path)]
+        if mismatches:
+            print(f"{len(mismatches)} files differ, e.g. {mismatches[0]}")
+
+        # Best of several runs, alternating so both see the same cache state
+        pillow_time = chunk_time = float("inf")
+        for _ in range(args.repeat):
+            pillow_time = min(pillow_time, timed(pillow_read, paths))
+            chunk_time = min(chunk_time, timed(chunk_read, paths))
+
+        print(f"files:         {len(paths)} ({len(mismatches)} mismatches)")
+        print(f"Pillow:        {pillow_time:7.3f}s  ({len(paths) / pillow_time:,.0f} files/s)")
+        print(f"chunk reader:  {chunk_time:7.3f}s  ({len(paths) / chunk_time:,.0f} files/s)")
+        print(f"speedup:       {pillow_time / chunk_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
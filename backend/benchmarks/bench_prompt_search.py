@@ -0,0 +1,128 @@
+"""Benchmark /api/search (FTS5 prompt search) on a large library.
+
+Fills a temporary SQLite database with synthetic images through the scan's
+bulk upsert, which also writes the search index, then times
+crud.search_images (count + ranked first page + loading that page) for
+common, rare and prefix queries, with and without folder scoping.
+Prompt words follow a Zipf-like distribution over a generated vocabulary,
+with a few "quality tag" words in most prompts, as in real ComfyUI output.
+
+Run from the backend directory:
+    python -m benchmarks.bench_prompt_search --rows 1000000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas
+
+COMMON = ["masterpiece", "best", "quality", "detailed", "portrait", "lighting"]
+SYLLABLES = ["ka", "lo", "mi", "ren", "sha", "tor", "vel", "dan", "qu", "ix", "bra", "nel"]
+
+QUERIES = [
+    "masterpiece",
+    "lighthouse",
+    "lighthouse dusk",
+    "lig*",
+    "light*",
+    "kalo*",
+    "lighthouse detail",
+    "zzzz",
+]
+
+
+def make_vocabulary(rng: random.Random, size: int):
+    words = {"lighthouse", "dusk", "lightning", "lightbulb", "light"}
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_batch(start, count, folder_ids, vocabulary, cum_weights, rng, now):
+    batch = []
+    for i in range(start, start + count):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(8, 30))
+        positive = ", ".join(rng.sample(COMMON, rng.randint(0, 4)) + words)
+        batch.append(schemas.ImageCreate(
+            filename=f"ComfyUI_{i:07d}_.png",
+            full_path=f"/comfy/output/{i // 1000:04d}/ComfyUI_{i:07d}_.png",
+            last_modified=now,
+            metadata_={
+                "3": {"class_type": "KSampler", "inputs": {"seed": i, "steps": 20, "cfg": 7.0,
+                                                           "sampler_name": "euler"}},
+                "4": {"class_type": "CheckpointLoaderSimple",
+                      "inputs": {"ckpt_name": f"model_{i % 40:02d}.safetensors"}},
+                "6": {"class_type": "CLIPTextEncode", "inputs": {"text": positive},
+                      "_meta": {"title": "Positive"}},
+                "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry, lowres"},
+                      "_meta": {"title": "Negative"}},
+                "10": {"class_type": "LoraLoader",
+                       "inputs": {"lora_name": f"detail_{i % 200:03d}.safetensors"}},
+            },
+            folder_id=folder_ids[i % len(folder_ids)],
+        ))
+    return batch
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--folders", type=int, default=4)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not models.FTS5_AVAILABLE:
+        raise SystemExit("This SQLite build has no FTS5 support")
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng, args.vocabulary)
+    rng.shuffle(vocabulary)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    now = datetime.now(timezone.utc)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        async with Session() as db:
+            folders = [models.Folder(path=f"/comfy/output{n}") for n in range(args.folders)]
+            db.add_all(folders)
+            await db.commit()
+            folder_ids = [folder.id for folder in folders]
+
+            print(f"Inserting {args.rows} rows ...")
+            started = time.perf_counter()
+            for start in range(0, args.rows, crud.BATCH_SIZE):
+                await crud.process_image_batch(db, make_batch(
+                    start, min(crud.BATCH_SIZE, args.rows - start), folder_ids,
+                    vocabulary, cum_weights, rng, now))
+            elapsed = time.perf_counter() - started
+            print(f"insert incl. search index: {elapsed:.1f}s ({args.rows / elapsed:,.0f} rows/s)")
+            db_size = os.path.getsize(os.path.join(tmp, "bench.db"))
+            print(f"database size: {db_size / 2**20:,.0f} MiB")
+
+            print(f"{'query':<22} {'folder':>6} {'matches':>9} {'best ms':>8} {'median ms':>10}")
+            for query in QUERIES:
+                for folder_id in (None, folder_ids[0]):
+                    times = []
+                    for _ in range(args.repeat):
+                        t0 = time.perf_counter()
+                        result = await crud.search_images(db, query, folder_id=folder_id, limit=100)
+                        times.append(time.perf_counter() - t0)
+                    times.sort()
+                    print(f"{query:<22} {folder_id or '-':>6} {result.total_count:>9} "
+                          f"{times[0] * 1000:>8.1f} {times[len(times) // 2] * 1000:>10.1f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
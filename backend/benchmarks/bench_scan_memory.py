@@ -0,0 +1,109 @@
+"""Benchmark peak memory of a full folder scan as the folder grows.
+
+Builds synthetic ComfyUI PNGs (one small file with a prompt chunk, copied) and
+scans them into a temporary SQLite database, each scan in a fresh process so
+peak RSS is comparable. The bounded pipeline (default queue sizes) is compared
+with effectively unbounded queues, which behaves like submitting every file
+to the workers up front.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scan_memory --sizes 10000 50000 100000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+UNBOUNDED = 10 ** 9
+
+
+def sample_png() -> bytes:
+    from PIL import Image, PngImagePlugin
+    prompt = {
+        "3": {"class_type": "KSampler", "inputs": {
+            "seed": 1, "steps": 30, "cfg": 7.0, "sampler_name": "euler",
+            "scheduler": "normal", "denoise": 1.0}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a lighthouse at dusk, " * 20}},
+    }
+    info = PngImagePlugin.PngInfo()
+    info.add_text("prompt", json.dumps(prompt))
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buffer, format="PNG", pnginfo=info)
+    return buffer.getvalue()
+
+
+def build_tree(root: str, files: int, per_dir: int):
+    data = sample_png()
+    for i in range(files):
+        directory = os.path.join(root, f"batch_{i // per_dir:05d}")
+        if i % per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"ComfyUI_{i:07d}_.png"), "wb") as f:
+            f.write(data)
+
+
+async def scan(root: str, db_path: str) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import crud, database, file_scanner, models
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with Session() as db:
+        folder = models.Folder(path=root)
+        db.add(folder)
+        await db.commit()
+        start = time.perf_counter()
+        status = await crud.scan_folder_and_update_db(db, folder, report_progress=False)
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    file_scanner.shutdown_probe_executor()
+    return {**status.model_dump(), "elapsed": elapsed}
+
+
+def run_child(root: str, queue_chunks: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, GALLERYFLOW_SCAN_QUEUE_CHUNKS=str(queue_chunks))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_scan_memory",
+             "--child", root, os.path.join(tmp, "bench.db")],
+            env=env, check=True, capture_output=True, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--per-dir", type=int, default=1000,
+                        help="Files per directory (use a huge value for one flat directory)")
+    parser.add_argument("--child", nargs=2, metavar=("ROOT", "DB"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(scan(*args.child))))
+        return
+
+    print(f"{'files':>8} {'queues':<10} {'files/s':>9} {'peak RSS MiB':>13} "
+          f"{'probe q':>8} {'write q':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as root:
+            build_tree(root, size, args.per_dir)
+            for label, queue_chunks in (("bounded", 0), ("unbounded", UNBOUNDED)):
+                result = run_child(root, queue_chunks)
+                assert result["added_count"] == size, result
+                peak = result["peak_memory_bytes"]
+                print(f"{size:>8} {label:<10} {size / result['elapsed']:>9,.0f} "
+                      f"{peak / 2 ** 20 if peak else float('nan'):>13,.1f} "
+                      f"{result['peak_probe_queue_depth']:>8} {result['peak_write_queue_depth']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark the folder walk used by scan_folder_and_update_db.
+
+Builds a synthetic tree of empty image files and compares the previous
+rglob-based enumeration (two rglob passes, two resolve() calls and a stat per
+file) with the single-pass os.scandir walker, and with a no-op incremental
+walk against a directory manifest.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scan_walk --dirs 200 --files 500
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from app.crud import SUPPORTED_EXTENSIONS
+from app.file_scanner import DirectoryDone, DirectoryListing, iter_image_files, walk_directories
+
+
+def build_tree(root: Path, dirs: int, files: int):
+    for d in range(dirs):
+        sub = root / f"2025-01-{d % 28 + 1:02d}" / f"batch_{d:04d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for f in range(files):
+            (sub / f"ComfyUI_{f:05d}_.png").touch()
+        # A few non-image files, like ComfyUI leaves behind
+        (sub / "workflow.json").touch()
+
+
+def legacy_walk(base_path: Path):
+    total_files = sum(1 for _ in base_path.rglob(
+        '*') if _.is_file() and _.suffix.lower() in SUPPORTED_EXTENSIONS)
+    image_files = [item for item in base_path.rglob(
+        '*') if item.is_file() and item.suffix.lower() in SUPPORTED_EXTENSIONS]
+    found_on_disk = {str(item.resolve()) for item in image_files}
+    for item in image_files:
+        str(item.resolve())
+        item.stat().st_mtime
+    return total_files, len(found_on_disk)
+
+
+def scandir_walk(base_path: Path):
+    found_on_disk = set()
+    for entry in iter_image_files(str(base_path), SUPPORTED_EXTENSIONS):
+        found_on_disk.add(entry.path)
+    return len(found_on_disk), len(found_on_disk)
+
+
+def build_manifest(base_path: Path):
+    manifest = {}
+    mtimes = {}
+    for item in walk_directories(str(base_path), SUPPORTED_EXTENSIONS):
+        if isinstance(item, DirectoryListing):
+            mtimes[item.path] = item.mtime
+        elif isinstance(item, DirectoryDone):
+            manifest[item.path] = (mtimes[item.path], item.entry_count)
+    return manifest
+
+
+def manifest_walk(base_path: Path, manifest):
+    total = 0
+    for item in walk_directories(str(base_path), SUPPORTED_EXTENSIONS, manifest):
+        if isinstance(item, DirectoryListing) and not item.listed:
+            total += item.entry_count
+    return total, total
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=100)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", help="Existing tree to walk instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(args.root) if args.root else Path(tmp)
+        if not args.root:
+            print(f"Building {args.dirs} dirs x {args.files} files in {root} ...")
+            build_tree(root, args.dirs, args.files)
+
+        legacy_time, (legacy_total, _) = timed(legacy_walk, root, repeat=args.repeat)
+        scandir_time, (scandir_total, _) = timed(scandir_walk, root, repeat=args.repeat)
+        manifest = build_manifest(root)
+        manifest_time, (manifest_total, _) = timed(
+            manifest_walk, root, manifest, repeat=args.repeat)
+        assert legacy_total == scandir_total == manifest_total, (
+            legacy_total, scandir_total, manifest_total)
+
+        print(f"files:   {scandir_total}")
+        print(f"rglob:   {legacy_time:8.3f}s  ({legacy_total / legacy_time:,.0f} files/s)")
+        print(f"scandir: {scandir_time:8.3f}s  ({scandir_total / scandir_time:,.0f} files/s)")
+        print(f"speedup: {legacy_time / scandir_time:.1f}x")
+        print(f"no-op incremental ({len(manifest)} dirs): {manifest_time:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
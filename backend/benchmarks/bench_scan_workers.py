@@ -0,0 +1,100 @@
+"""Benchmark scan probe throughput (images/sec) against worker count.
+
+Writes synthetic ComfyUI PNGs carrying large prompt/workflow graphs and runs
+file_scanner.probe_image_files over them in chunks, the way a scan does, with
+thread and process pools of increasing size.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scan_workers --images 2000 --nodes 300
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from PIL import Image as PILImage
+from PIL import PngImagePlugin
+
+from app.file_scanner import probe_image_files
+
+
+def build_graph(nodes: int, seed: int) -> dict:
+    graph = {}
+    for i in range(nodes):
+        graph[str(i)] = {
+            "class_type": "KSampler" if i % 50 == 0 else f"CustomNode{i % 17}",
+            "inputs": {
+                "seed": seed + i,
+                "steps": 30,
+                "cfg": 6.5,
+                "sampler_name": "dpmpp_2m",
+                "scheduler": "karras",
+                "denoise": 1.0,
+                "model": [str(max(i - 1, 0)), 0],
+                "text": "a highly detailed photograph of a lighthouse at dusk " * 4,
+            },
+            "_meta": {"title": f"Node {i}"},
+        }
+    return graph
+
+
+def write_images(directory: str, count: int, nodes: int):
+    paths = []
+    for i in range(count):
+        info = PngImagePlugin.PngInfo()
+        graph = build_graph(nodes, i)
+        info.add_text("prompt", json.dumps(graph))
+        info.add_text("workflow", json.dumps({"nodes": list(graph.values())}))
+        path = os.path.join(directory, f"ComfyUI_{i:05d}_.png")
+        PILImage.new("RGB", (64, 64)).save(path, pnginfo=info)
+        paths.append(path)
+    return paths
+
+
+def run(executor, paths, chunk_size):
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    start = time.perf_counter()
+    done = sum(len(result) for result in executor.map(probe_image_files, chunks))
+    elapsed = time.perf_counter() - start
+    assert done == len(paths)
+    return len(paths) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    worker_counts = []
+    workers = 1
+    while workers < args.max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+    worker_counts.append(args.max_workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {args.images} PNGs with {args.nodes}-node graphs ...")
+        paths = write_images(tmp, args.images, args.nodes)
+        print(f"{'mode':<8} {'workers':>7} {'images/s':>10}")
+        for mode in ("thread", "process"):
+            for workers in worker_counts:
+                if mode == "process":
+                    executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                    # Start the workers before timing
+                    list(executor.map(probe_image_files, [[]] * workers))
+                else:
+                    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+                with executor:
+                    rate = run(executor, paths, args.chunk_size)
+                print(f"{mode:<8} {workers:>7} {rate:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
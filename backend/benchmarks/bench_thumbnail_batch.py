@@ -0,0 +1,136 @@
+"""Benchmark time-to-full-grid: per-image /api/thumbnail vs the /api/thumbnails pack.
+
+Creates a folder of synthetic ComfyUI-sized PNGs, scans it into a temporary
+database and serves the app with uvicorn on a local port. A grid page is
+then fetched twice over HTTP: one /api/thumbnail request per image, with as
+many connections as a browser opens per host, and one /api/thumbnails
+request for the whole page. Each is timed with a cold cache (thumbnail
+directory emptied, so every thumbnail is generated) and a warm one (all
+thumbnails on disk).
+
+Run from the backend directory:
+    python -m benchmarks.bench_thumbnail_batch --images 200 --side 1024
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from PIL import Image as PILImage
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+# Browsers open at most 6 HTTP/1.1 connections per host
+CONNECTIONS = 6
+
+
+def make_images(directory: str, count: int, side: int):
+    os.makedirs(directory)
+    gradient = PILImage.linear_gradient("L").resize((side, side))
+    for i in range(count):
+        noise = PILImage.effect_noise((side, side), 16 + i % 32)
+        PILImage.merge("RGB", (gradient, noise, gradient.rotate(90 * (i % 4)))).save(
+            os.path.join(directory, f"ComfyUI_{i + 1:05d}_.png"), compress_level=1)
+
+
+async def per_image(client: httpx.AsyncClient, paths) -> int:
+    semaphore = asyncio.Semaphore(CONNECTIONS)
+    received = 0
+
+    async def fetch(path):
+        nonlocal received
+        async with semaphore:
+            response = await client.get("/api/thumbnail", params={"file_path": path, "size": "medium"})
+            response.raise_for_status()
+            received += len(response.content)
+
+    await asyncio.gather(*(fetch(path) for path in paths))
+    return received
+
+
+async def pack(client: httpx.AsyncClient, ids) -> int:
+    response = await client.get("/api/thumbnails", params={"ids": ",".join(map(str, ids)), "size": "medium"})
+    response.raise_for_status()
+    return len(response.content)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200, help="Images in the grid page")
+    parser.add_argument("--side", type=int, default=1024, help="Source image width and height")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm runs (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Thumbnails go to ./thumbnails, also in the spawned thumbnail workers
+        os.chdir(tmp)
+        from app import crud, database, schemas
+        from app.main import app
+        from app.thumbnail_cache import thumbnail_cache
+        from app.thumbnail_workers import thumbnail_workers
+
+        database.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        database.AsyncSessionLocal = sessionmaker(
+            bind=database.engine, class_=AsyncSession, expire_on_commit=False)
+        await database.create_db_and_tables()
+        image_dir = os.path.join(tmp, "output")
+        print(f"Creating {args.images} {args.side}x{args.side} PNGs ...")
+        make_images(image_dir, args.images, args.side)
+        async with database.AsyncSessionLocal() as db:
+            folder = await crud.create_folder(db, schemas.FolderCreate(path=image_dir))
+            await crud.scan_folder_and_update_db(db, folder, report_progress=False)
+            page = await crud.get_images_by_folder(db, folder_id=folder.id, skip=0, limit=args.images,
+                                                   sort_by="filename", sort_dir="asc")
+        ids = [image.id for image in page.images]
+        paths = [image.full_path for image in page.images]
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, port=port, lifespan="off", log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        # Start the worker processes before timing, as the running app would have them
+        await asyncio.gather(*(
+            asyncio.get_running_loop().run_in_executor(thumbnail_workers._get_executor(), sum, [])
+            for _ in range(thumbnail_workers.worker_count)))
+
+        limits = httpx.Limits(max_connections=CONNECTIONS, max_keepalive_connections=CONNECTIONS)
+        print(f"{args.images} thumbnails, {thumbnail_workers.worker_count} thumbnail workers, "
+              f"{os.cpu_count()} CPUs")
+        print(f"{'cache':<6} {'mode':<10} {'seconds':>8} {'KiB':>8}")
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                     timeout=600) as client:
+            for cache in ("cold", "warm"):
+                times = {}
+                for mode, fetch, items in (("per-image", per_image, paths), ("pack", pack, ids)):
+                    best = float("inf")
+                    for _ in range(1 if cache == "cold" else args.repeat):
+                        if cache == "cold":
+                            shutil.rmtree(thumbnail_cache.generator.thumbnail_dir, ignore_errors=True)
+                            thumbnail_cache.generator.thumbnail_dir.mkdir()
+                        started = time.perf_counter()
+                        received = await fetch(client, items)
+                        best = min(best, time.perf_counter() - started)
+                    times[mode] = best
+                    ratio = f"{times['per-image'] / best:.1f}x" if mode == "pack" else ""
+                    print(f"{cache:<6} {mode:<10} {best:>8.2f} {received / 1024:>8.0f} {ratio}")
+                if cache == "cold":
+                    # Leave every thumbnail on disk for the warm runs
+                    await per_image(client, paths)
+        server.should_exit = True
+        await serving
+        await thumbnail_workers.stop()
+        await database.engine.dispose()
+        os.chdir(sys.path[0] or "/")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""Benchmark API latency while a cold grid's thumbnails are generated.
+
+Creates a folder of synthetic ComfyUI-sized PNGs, scans it into a temporary
+database and serves the app with uvicorn on a local port. With an empty
+thumbnail directory, every thumbnail of a grid page is requested twice at
+once over 6 connections (the grid preloads each thumbnail while its <img>
+loads it too), while another client keeps calling GET /api/folders. Reports
+the grid time, the /api/folders latencies and how many thumbnails were
+generated: with generation on the event loop every API call waits behind
+the resize running, and each duplicate request generates again.
+
+Run from the backend directory:
+    python -m benchmarks.bench_thumbnail_requests --images 100 --side 2048
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_thumbnail_batch import CONNECTIONS, make_images
+
+
+async def grid(client: httpx.AsyncClient, paths):
+    semaphore = asyncio.Semaphore(CONNECTIONS)
+
+    async def fetch(path):
+        async with semaphore:
+            response = await client.get("/api/thumbnail", params={"file_path": path, "size": "medium"})
+            response.raise_for_status()
+
+    await asyncio.gather(*(fetch(path) for path in paths for _ in range(2)))
+
+
+async def poll(client: httpx.AsyncClient, done: asyncio.Event):
+    latencies = []
+    while not done.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/folders")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def poll_for(client: httpx.AsyncClient, seconds: float):
+    done = asyncio.Event()
+    asyncio.get_running_loop().call_later(seconds, done.set)
+    return await poll(client, done)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=100, help="Images in the grid page")
+    parser.add_argument("--side", type=int, default=2048, help="Source image width and height")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Thumbnails go to ./thumbnails, also in the spawned thumbnail workers
+        os.chdir(tmp)
+        from app import crud, database, schemas
+        from app.main import app
+        from app.thumbnail_cache import thumbnail_cache
+        from app.thumbnail_workers import thumbnail_workers
+
+        database.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        database.AsyncSessionLocal = sessionmaker(
+            bind=database.engine, class_=AsyncSession, expire_on_commit=False)
+        await database.create_db_and_tables()
+        image_dir = os.path.join(tmp, "output")
+        print(f"Creating {args.images} {args.side}x{args.side} PNGs ...")
+        make_images(image_dir, args.images, args.side)
+        async with database.AsyncSessionLocal() as db:
+            folder = await crud.create_folder(db, schemas.FolderCreate(path=image_dir))
+            await crud.scan_folder_and_update_db(db, folder, report_progress=False)
+            page = await crud.get_images_by_folder(db, folder_id=folder.id, skip=0, limit=args.images,
+                                                   sort_by="filename", sort_dir="asc")
+        paths = [image.full_path for image in page.images]
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, port=port, lifespan="off", log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        # Start the worker processes before timing, as the running app would have them
+        await asyncio.gather(*(
+            asyncio.get_running_loop().run_in_executor(thumbnail_workers._get_executor(), sum, [])
+            for _ in range(thumbnail_workers.worker_count)))
+
+        base_url = f"http://127.0.0.1:{port}"
+        limits = httpx.Limits(max_connections=CONNECTIONS, max_keepalive_connections=CONNECTIONS)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as grid_client, \
+                httpx.AsyncClient(base_url=base_url, timeout=600) as api_client:
+            idle = await poll_for(api_client, 1.0)
+            done = asyncio.Event()
+            polling = asyncio.create_task(poll(api_client, done))
+            started = time.perf_counter()
+            await grid(grid_client, paths)
+            elapsed = time.perf_counter() - started
+            done.set()
+            busy = await polling
+
+        print(f"{args.images} thumbnails requested twice each, {thumbnail_workers.worker_count} "
+              f"thumbnail workers, {os.cpu_count()} CPUs")
+        print(f"grid: {elapsed:.2f}s, {thumbnail_cache.generated} thumbnails generated")
+        for label, latencies in (("idle", idle), ("during grid", busy)):
+            latencies.sort()
+            print(f"/api/folders {label:<12} median {statistics.median(latencies) * 1000:7.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.1f} ms, "
+                  f"max {latencies[-1] * 1000:7.1f} ms ({len(latencies)} calls)")
+        server.should_exit = True
+        await serving
+        await thumbnail_workers.stop()
+        await database.engine.dispose()
+        os.chdir(sys.path[0] or "/")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
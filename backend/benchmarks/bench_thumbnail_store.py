@@ -0,0 +1,120 @@
+"""Benchmark the file and packed thumbnail stores on a large cache.
+
+Writes the same thumbnails (WebP data of a few KB, random keys) to each
+store in a temporary directory, then times: writing them; serving random
+thumbnails the way /api/thumbnail does (lookup, then read the data); the
+cache's measuring pass over all thumbnails (startup, before eviction);
+evicting a share of them; and compaction (packed store). Reports the files
+and bytes each store leaves on disk. Reads hit the page cache; from a cold
+cache the file store also pays an inode and directory lookup per thumbnail.
+
+Run from the backend directory:
+    python -m benchmarks.bench_thumbnail_store --thumbnails 200000
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image
+
+from app.thumbnail_cache import ThumbnailCache
+from app.thumbnail_store import PackedThumbnailStore, ThumbnailFiles
+
+
+def sample_thumbnails(count: int):
+    """WebP images of a few KB (noise compresses poorly, like real thumbnails)."""
+    random.seed(1)
+    data = []
+    for i in range(count):
+        img = Image.frombytes("RGB", (64, 48), random.randbytes(64 * 48 * 3))
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=85)
+        data.append(out.getvalue())
+    return data
+
+
+def disk_usage(directory: str):
+    files = used = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            files += 1
+            used += os.stat(os.path.join(root, name)).st_blocks * 512
+    return files, used
+
+
+class _Generator:
+    """The part of ThumbnailGenerator ThumbnailCache uses."""
+
+    def __init__(self, store):
+        self.store = store
+
+
+def run(store, keys, samples, reads: int, evict_share: float, directory: str):
+    started = time.perf_counter()
+    for i, key in enumerate(keys):
+        store.write(key, samples[i % len(samples)])
+    written = time.perf_counter() - started
+
+    started = time.perf_counter()
+    served = 0
+    for key in random.sample(keys, reads):
+        if store.stat(key) is not None:
+            served += len(store.read(key))
+    read = time.perf_counter() - started
+
+    cache = ThumbnailCache(_Generator(store), max_gb=0)
+    # Last use spread over the keys, so eviction takes the first share
+    for i, key in enumerate(keys[:int(len(keys) * evict_share)]):
+        if isinstance(store, ThumbnailFiles):
+            os.utime(store.path(key), (1000 + i, 1000 + i))
+    if isinstance(store, PackedThumbnailStore):
+        store._db().executemany("UPDATE thumbnails SET last_used = ? WHERE key = ?",
+                                [(1000 + i, bytes.fromhex(key))
+                                 for i, key in enumerate(keys[:int(len(keys) * evict_share)])])
+    started = time.perf_counter()
+    total, files, _, _ = cache._scan_and_evict(None)
+    measured = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, _, freed, removed = cache._scan_and_evict(int(total * (1 - evict_share)))
+    evicted = time.perf_counter() - started
+    started = time.perf_counter()
+    packs, pack_freed = store.compact()
+    compacted = time.perf_counter() - started
+
+    disk_files, disk_bytes = disk_usage(directory)
+    print(f"{store.name:>5}: write {written:6.1f}s ({len(keys) / written:8,.0f}/s), "
+          f"serve {read / reads * 1e6:5.0f} us/thumbnail, measure {measured:5.1f}s, "
+          f"evict {removed:,} in {evicted:5.1f}s, compact {packs} packs in {compacted:5.1f}s; "
+          f"{disk_files:,} files, {disk_bytes / 2**20:,.0f} MiB on disk")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--thumbnails", type=int, default=200_000)
+    parser.add_argument("--reads", type=int, default=20_000, help="Random thumbnails served")
+    parser.add_argument("--evict", type=float, default=0.6, help="Share of the thumbnails evicted")
+    parser.add_argument("--pack-mb", type=int, default=64, help="Pack size (PACK_MAX_BYTES) in MiB")
+    args = parser.parse_args()
+
+    import app.thumbnail_store as thumbnail_store
+    thumbnail_store.PACK_MAX_BYTES = args.pack_mb * 2**20
+    # Packs written by this run are sealed at once, as if their writer had exited
+    thumbnail_store.PACK_IDLE_SECONDS = -1
+    samples = sample_thumbnails(64)
+    random.seed(2)
+    keys = [random.randbytes(16).hex() for _ in range(args.thumbnails)]
+    print(f"{args.thumbnails:,} thumbnails of ~{sum(map(len, samples)) // len(samples):,} bytes, "
+          f"{args.reads:,} served, {args.evict:.0%} evicted")
+    for store_class in (ThumbnailFiles, PackedThumbnailStore):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = store_class(tmp)
+            run(store, keys, samples, args.reads, args.evict, tmp)
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
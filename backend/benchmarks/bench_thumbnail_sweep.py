@@ -0,0 +1,156 @@
+"""Benchmark the thumbnail orphan sweep on a million-thumbnail cache.
+
+Fills a temporary database with synthetic images spread over ComfyUI-like
+output folders (every folder has ComfyUI_00001_.png, ...), creates an empty
+thumbnail file for each image in each size under the sharded layout plus a
+share of orphans (thumbnails of deleted images and of older versions), then
+times the sweep: reading (full_path, last_modified) from the database and
+collecting the live keys, and listing and pruning the shard directories.
+Checks that exactly the orphans were removed and no key collided.
+
+The sweep it replaced compared every thumbnail's file name against every
+image path until one matched (and could not tell images with the same file
+name apart). Its time is extrapolated from full scans of the image paths:
+one per orphan and, with unique file names, half a scan per live thumbnail.
+
+Run from the backend directory:
+    python -m benchmarks.bench_thumbnail_sweep --images 500000  # 1M thumbnails
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models
+from app.thumbnail_generator import LiveThumbnailKeys, ThumbnailGenerator, thumbnail_key
+
+SIZES = ("medium", "small")
+
+
+def legacy_is_orphaned(thumb_name: str, valid_image_paths) -> bool:
+    """The per-thumbnail check of the old cleanup_orphaned_thumbnails."""
+    original_name = '_'.join(thumb_name.split('_')[:-1])
+    for image_path in valid_image_paths:
+        if Path(image_path).stem == original_name:
+            return False
+    return True
+
+
+def image_rows(root: str, count: int, per_folder: int, folder_id: int):
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        directory = os.path.join(root, f"run{i // per_folder:04d}")
+        filename = f"ComfyUI_{i % per_folder + 1:05d}_.png"
+        yield {"filename": filename, "full_path": os.path.join(directory, filename),
+               "folder_id": folder_id, "has_thumbnail": True,
+               # Many images written within the same second, like a batch run
+               "last_modified": base + timedelta(seconds=i // 4, microseconds=i % 4 * 1000)}
+
+
+def touch(path: Path):
+    try:
+        path.touch()
+    except FileNotFoundError:
+        path.parent.mkdir()
+        path.touch()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=500_000,
+                        help=f"Images in the database; each has {len(SIZES)} thumbnails")
+    parser.add_argument("--per-folder", type=int, default=2000, help="Images per output folder")
+    parser.add_argument("--orphans", type=float, default=0.1,
+                        help="Orphaned thumbnails, as a share of the live ones")
+    parser.add_argument("--legacy-sample", type=int, default=20,
+                        help="Full scans timed for the old cleanup")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        database.AsyncSessionLocal = sessionmaker(
+            bind=database.engine, class_=AsyncSession, expire_on_commit=False)
+        async with database.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        root = os.path.join(tmp, "output")
+        generator = ThumbnailGenerator(thumbnail_dir=os.path.join(tmp, "thumbnails"), store="files")
+        orphan_count = int(args.images * len(SIZES) * args.orphans)
+
+        started = time.perf_counter()
+        async with database.AsyncSessionLocal() as db:
+            folder = models.Folder(path=root)
+            db.add(folder)
+            await db.commit()
+            rows = list(image_rows(root, args.images + orphan_count, args.per_folder, folder.id))
+            for start in range(0, args.images, 50_000):
+                await db.execute(insert(models.Image), rows[start:min(start + 50_000, args.images)])
+            await db.commit()
+        keys = set()
+        for row in rows:
+            for size in SIZES:
+                keys.add(thumbnail_key(row["full_path"], size, row["last_modified"]))
+        assert len(keys) == len(rows) * len(SIZES), "thumbnail key collision"
+        live = set()
+        for i, row in enumerate(rows):
+            if i < args.images:
+                for size in SIZES:
+                    key = thumbnail_key(row["full_path"], size, row["last_modified"])
+                    live.add(key)
+                    touch(generator.thumbnail_path(key))
+            else:
+                # Images no longer in the database, and older versions of live ones
+                if i % 2:
+                    path, modified = row["full_path"], row["last_modified"]
+                else:
+                    source = rows[i - args.images]
+                    path, modified = source["full_path"], source["last_modified"] - timedelta(hours=1)
+                touch(generator.thumbnail_path(thumbnail_key(path, SIZES[0], modified)))
+        total = len(live) + orphan_count
+        shard_sizes = [len(os.listdir(entry.path)) for entry in os.scandir(generator.thumbnail_dir)]
+        print(f"{args.images:,} images, {len(live):,} live + {orphan_count:,} orphaned thumbnails "
+              f"in {len(shard_sizes)} shards of {min(shard_sizes):,}-{max(shard_sizes):,} files "
+              f"(setup {time.perf_counter() - started:.0f}s)")
+
+        # Files written before the sweep starts are candidates
+        time.sleep(0.05)
+        started = time.perf_counter()
+        sweep_started = time.time()
+        keys = LiveThumbnailKeys(SIZES)
+        after_id = 0
+        while True:
+            async with database.AsyncSessionLocal() as db:
+                batch = await crud.get_thumbnail_sources(db, after_id, 20_000)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            keys.add([(path, modified) for _, path, modified in batch])
+        collected = time.perf_counter()
+        removed, _ = generator.sweep_orphaned_thumbnails(keys, sweep_started)
+        swept = time.perf_counter()
+        remaining = {entry.name[:-5] for shard in os.scandir(generator.thumbnail_dir)
+                     for entry in os.scandir(shard.path)}
+        print(f"sweep: collect keys {collected - started:.1f}s, prune shards {swept - collected:.1f}s, "
+              f"total {swept - started:.1f}s ({total / (swept - started):,.0f} thumbnails/s); "
+              f"removed {removed:,}, live kept: {remaining == live}")
+        sweep_time = swept - started
+
+        paths = [row["full_path"] for row in rows[:args.images]]
+        started = time.perf_counter()
+        for i in range(args.legacy_sample):
+            legacy_is_orphaned(f"deleted_{i}_1735689600", paths)
+        full_scan = (time.perf_counter() - started) / args.legacy_sample
+        legacy = full_scan * (orphan_count + len(live) / 2)
+        print(f"old cleanup: {full_scan * 1000:.0f} ms per full scan of the image paths, "
+              f"~{legacy / 3600:.1f} h ({legacy / sweep_time:,.0f}x)")
+        await database.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
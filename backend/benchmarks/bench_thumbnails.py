@@ -0,0 +1,142 @@
+"""Benchmark thumbnail generation: thumbnails/sec and peak memory per source resolution.
+
+Generates synthetic sources (smooth gradients with noise, like upscaled
+outputs) as PNG, PNG with alpha and JPEG at each resolution, then makes
+thumbnails of them with the code ThumbnailGenerator used before the fast
+path ("legacy": non-RGB sources converted at full resolution before resizing,
+one decode per size) and with each thumbnail profile. Every combination runs in a fresh
+process, so the peak resident memory above the process's baseline can be
+reported.
+
+Run from the backend directory:
+    python -m benchmarks.bench_thumbnails --resolutions 1024 2048 4096 8192
+    python -m benchmarks.bench_thumbnails --sizes medium small  # pre-generation
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+MODES = ("legacy", "quality", "balanced", "fast")
+
+
+def make_source(path: str, side: int, image_format: str):
+    width, height = side, side * 9 // 16 if side >= 2048 else side
+    gradient = PILImage.linear_gradient("L").resize((width, height))
+    noise = PILImage.effect_noise((width, height), 24)
+    image = PILImage.merge("RGB", (gradient, noise, gradient.transpose(PILImage.Transpose.ROTATE_180)))
+    if image_format == "RGBA":
+        image.putalpha(gradient)
+        image.save(path, "PNG", compress_level=1)
+    elif image_format == "PNG":
+        image.save(path, "PNG", compress_level=1)
+    else:
+        image.save(path, "JPEG", quality=92)
+
+
+SIZES = {"small": (150, 150), "medium": (300, 300)}
+
+
+def legacy_thumbnail(source: str, target: str, box=(300, 300)):
+    """ThumbnailGenerator.generate_thumbnail's processing before the fast path."""
+    with PILImage.open(source) as img:
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = PILImage.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail(box, PILImage.Resampling.LANCZOS)
+        img = ImageOps.exif_transpose(img)
+        img.save(target, 'WEBP', quality=85, optimize=True)
+
+
+def peak_rss() -> int:
+    try:
+        # ru_maxrss survives exec, so it can still be the parent's peak
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def child(mode: str, source: str, count: int, sizes):
+    """Make `count` sets of thumbnails of `source`; print sets/sec and peak memory as JSON."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if mode != "legacy":
+            from app.thumbnail_generator import ThumbnailGenerator
+            generator = ThumbnailGenerator(thumbnail_dir=tmp, profile=mode)
+        baseline = peak_rss()
+        size = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            if mode == "legacy":
+                targets = [os.path.join(tmp, f"{name}.webp") for name in sizes]
+                for target, name in zip(targets, sizes):
+                    legacy_thumbnail(source, target, SIZES[name])
+            else:
+                targets = generator.generate_thumbnails(source, sizes)
+            size = os.path.getsize(targets[0])
+            for target in targets:
+                os.unlink(target)
+        elapsed = time.perf_counter() - started
+    print(json.dumps({"rate": count / elapsed, "peak": peak_rss() - baseline, "bytes": size}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[1024, 2048, 4096, 8192],
+                        help="Source widths")
+    parser.add_argument("--formats", nargs="+", default=["PNG", "RGBA", "JPEG"],
+                        help="PNG, RGBA (PNG with alpha) or JPEG")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["medium"],
+                        help="Thumbnail sizes made per source (webp KiB is of the first)")
+    parser.add_argument("--count", type=int, default=5, help="Sources per measurement")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "SOURCE", "COUNT"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1], int(args.child[2]), args.sizes)
+        return
+
+    print(f"{'source':<16} {'mode':<9} {'images/s':>9} {'peak MiB':>9} {'webp KiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for side in args.resolutions:
+            for image_format in args.formats:
+                extension = "jpg" if image_format == "JPEG" else "png"
+                source = os.path.join(tmp, f"source_{side}_{image_format}.{extension}")
+                make_source(source, side, image_format)
+                with PILImage.open(source) as img:
+                    label = f"{image_format} {img.width}x{img.height}"
+                # Scale the count down for large sources so every run takes similar time
+                count = max(2, args.count * 4096 * 4096 // (side * side))
+                rates = {}
+                for mode in MODES:
+                    output = subprocess.run(
+                        [sys.executable, "-m", "benchmarks.bench_thumbnails",
+                         "--child", mode, source, str(count), "--sizes", *args.sizes],
+                        check=True, capture_output=True, text=True).stdout
+                    result = json.loads(output.strip().splitlines()[-1])
+                    rates[mode] = result["rate"]
+                    speedup = f"{result['rate'] / rates['legacy']:.1f}x" if mode != "legacy" else ""
+                    print(f"{label:<16} {mode:<9} {result['rate']:>9.1f} "
+                          f"{result['peak'] / 2**20:>9.1f} {result['bytes'] / 1024:>9.1f} {speedup}")
+                os.unlink(source)
+
+
+if __name__ == "__main__":
+    main()
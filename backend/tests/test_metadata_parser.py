@@ -0,0 +1,45 @@
+"""Golden-output tests for metadata_extractor.extract_generation_params.
+
+tests/data/metadata_parser_corpus.json holds ComfyUI graphs (a full
+text-to-image prompt, then graphs from benchmarks/bench_metadata_parser's
+generator: built-in node types and their variants, workflow-format node
+lists, repeated node ids, nodes no handler matches) with the result of the
+if-chain the node-handler registry replaced, or the exception it raised.
+
+Run from the backend directory:
+    python -m unittest discover tests
+"""
+import json
+import unittest
+from pathlib import Path
+
+from app.metadata_extractor import extract_generation_params
+
+CORPUS_PATH = Path(__file__).parent / "data" / "metadata_parser_corpus.json"
+
+
+class GoldenCorpusTest(unittest.TestCase):
+    def test_corpus(self):
+        corpus = json.loads(CORPUS_PATH.read_text())
+        for index, entry in enumerate(corpus):
+            with self.subTest(graph=index):
+                if "raises" in entry:
+                    with self.assertRaises(Exception) as raised:
+                        extract_generation_params(entry["graph"])
+                    self.assertEqual(type(raised.exception).__name__, entry["raises"])
+                else:
+                    self.assertEqual(extract_generation_params(entry["graph"]), entry["expected"])
+
+    def test_repeated_workflow_node_ids(self):
+        # The last node with an id counts, as in the if-chain
+        graph = {"nodes": [
+            {"id": 3, "class_type": "KSampler", "inputs": {"seed": 1, "steps": 20}},
+            {"id": 3, "class_type": "KSampler", "inputs": {"seed": 2}},
+        ]}
+        result = extract_generation_params(graph)
+        self.assertEqual(result["seed"], 2)
+        self.assertIsNone(result["steps"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@ import {
   Snackbar,
   Alert,
 } from '@mui/material';
-import { revealInExplorer, getThumbnailUrl } from '../../services/api';
+import { revealInExplorer, getThumbnailPack, getThumbnailUrl } from '../../services/api';
 import ImageGridItem from './ImageGridItem';
 import ImagePreviewModal from './ImagePreviewModal';
 import ImageModal from './ImageModal';
@@ -26,6 +26,8 @@ const ImageGrid: React.FC<ImageGridProps> = ({ images, thumbnailSize }) => {
   const modalImageRef = useRef<HTMLImageElement>(null);
   const [isRevealing, setIsRevealing] = useState(false);
   const [loadedImages, setLoadedImages] = useState<Set<string>>(new Set());
+  // Image id -> thumbnail URL, set once the page's thumbnail pack has arrived
+  const [thumbnailUrls, setThumbnailUrls] = useState<Map<number, string>>(new Map());
   const [workflowModalOpen, setWorkflowModalOpen] = React.useState(false);
   const [workflowModalImage, setWorkflowModalImage] = React.useState<Image | null>(null);
 
@@ -35,8 +37,15 @@ const ImageGrid: React.FC<ImageGridProps> = ({ images, thumbnailSize }) => {
     setLoadedImages(new Set());
   }, [images]);
 
-  // Preload all thumbnails for current page (pagination already limits to ~100 images)
+  // Fetch the thumbnails of the current page in one request (pagination
+  // already limits it to ~100 images) and preload them. Images the pack has
+  // no thumbnail for use the single thumbnail endpoint, which serves the
+  // original instead. The pack's object URLs are revoked when the page is left.
   useEffect(() => {
+    if (images.length === 0) return;
+    let cancelled = false;
+    let packUrls = new Map<number, string>();
+
     const preloadThumbnail = (src: string) => {
       const img = new Image();
       img.onload = () => {
@@ -50,12 +59,29 @@ const ImageGrid: React.FC<ImageGridProps> = ({ images, thumbnailSize }) => {
       img.src = src;
     };
 
-    images.forEach(image => {
-      const thumbnailUrl = getThumbnailUrl(image.full_path, 'medium');
-      if (!loadedImages.has(thumbnailUrl)) {
-        preloadThumbnail(thumbnailUrl);
-      }
-    });
+    getThumbnailPack(images.map(image => image.id), 'medium')
+      .catch((error: unknown) => {
+        console.error('Failed to load the thumbnail pack:', error);
+        return new Map<number, string>();
+      })
+      .then(urls => {
+        packUrls = urls;
+        if (cancelled) {
+          urls.forEach(url => URL.revokeObjectURL(url));
+          return;
+        }
+        const pageUrls = new Map(images.map((image): [number, string] => [
+          image.id,
+          urls.get(image.id) ?? getThumbnailUrl(image.full_path, 'medium'),
+        ]));
+        setThumbnailUrls(pageUrls);
+        pageUrls.forEach(preloadThumbnail);
+      });
+
+    return () => {
+      cancelled = true;
+      packUrls.forEach(url => URL.revokeObjectURL(url));
+    };
   }, [images]);
 
   // Helper function to get field ignoring case
@@ -231,6 +257,7 @@ const ImageGrid: React.FC<ImageGridProps> = ({ images, thumbnailSize }) => {
             <ImageGridItem
               key={image.id}
               image={image}
+              thumbnailUrl={thumbnailUrls.get(image.id)}
               thumbnailSize={thumbnailSize}
               loadedImages={loadedImages}
               handleImageClick={handleImageClick}
@@ -1,12 +1,12 @@
 import React from 'react';
 import { Box, CircularProgress, IconButton } from '@mui/material';
-import { getThumbnailUrl } from '../../services/api';
 import type { Image } from './types';
 import InfoIcon from '@mui/icons-material/InfoOutlined';
 import WorkflowIcon from '@mui/icons-material/AccountTree';
 
 interface ImageGridItemProps {
   image: Image;
+  thumbnailUrl?: string; // Undefined until the grid's thumbnail pack has arrived
   thumbnailSize: number; // Kept for future use even if not currently used
   loadedImages: Set<string>;
   handleImageClick: (image: Image) => void;
@@ -16,13 +16,13 @@ interface ImageGridItemProps {
 
 const ImageGridItem: React.FC<ImageGridItemProps> = ({
   image,
+  thumbnailUrl,
   loadedImages,
   handleImageClick,
   handleOpenWorkflowModal,
   handleOpenMetadata = handleImageClick, // Default to handleImageClick for backward compatibility
 }) => {
-  // Use thumbnail for grid display, full image for preview
-  const thumbnailUrl = getThumbnailUrl(image.full_path, 'medium');
+  const isLoaded = thumbnailUrl !== undefined && loadedImages.has(thumbnailUrl);
 
   return (
     <Box
@@ -50,8 +50,16 @@ const ImageGridItem: React.FC<ImageGridItemProps> = ({
       }}
       onClick={() => handleImageClick(image)}
     >
-      <Box sx={{ position: 'absolute', top: 0, left: 0, width: '100%', height: '100%', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
-        <img
+      <Box sx={{
+        position: 'absolute', top: 0, left: 0, width: '100%', height: '100%', display: 'flex', alignItems: 'center', justifyContent: 'center',
+        // The placeholder, upscaled (smoothly blurred) by the browser, until the thumbnail fades in
+        ...(image.placeholder && {
+          backgroundImage: `url(data:image/webp;base64,${image.placeholder})`,
+          backgroundSize: 'cover',
+          backgroundPosition: 'center',
+        }),
+      }}>
+        {thumbnailUrl && <img
           src={thumbnailUrl}
           alt={image.filename}
           style={{
@@ -59,7 +67,7 @@ const ImageGridItem: React.FC<ImageGridItemProps> = ({
             height: '100%',
             objectFit: 'cover',
             objectPosition: 'center',
-            opacity: loadedImages.has(thumbnailUrl) ? 1 : 0,
+            opacity: isLoaded ? 1 : 0,
             transition: 'opacity 0.3s ease-in-out',
             borderRadius: 'inherit',
             display: 'block',
@@ -73,8 +81,8 @@ const ImageGridItem: React.FC<ImageGridItemProps> = ({
           onError={() => {
             // The parent's preload effect handles updating loadedImages Set
           }}
-        />
-        {!loadedImages.has(thumbnailUrl) && (
+        />}
+        {!isLoaded && !image.placeholder && (
           <Box
             sx={{
               position: 'absolute',
@@ -16,7 +16,7 @@ import CloseIcon from '@mui/icons-material/Close';
 import ContentCopyIcon from '@mui/icons-material/ContentCopy';
 import FolderOpenIcon from '@mui/icons-material/FolderOpen';
 import { borders, colors, typography, spacing } from '../../theme/themeConstants';
-import { getImageUrl } from '../../services/api';
+import { getImageUrl, getPreviewUrl } from '../../services/api';
 import type { Image } from './types';
 import { useImageMetadata } from '../../hooks/useImageMetadata';
 import { useImageModalNavigationHelpers } from '../../hooks/useImageModalNavigationHelpers';
@@ -185,7 +185,7 @@ const ImageModalContent: React.FC<ImageModalProps> = ({
             ref={modalImageRef}
             onLoad={onModalImageLoad}
             onClick={handleImageClick}
-            src={getImageUrl(selectedImage?.full_path || '')}
+            src={getPreviewUrl(selectedImage?.full_path || '')}
             alt={selectedImage?.filename || ''}
             style={{
               maxWidth: '100%',
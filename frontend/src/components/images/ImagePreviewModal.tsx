@@ -8,7 +8,7 @@ import {
 import CloseIcon from '@mui/icons-material/Close';
 import InfoIcon from '@mui/icons-material/InfoOutlined';
 import WorkflowIcon from '@mui/icons-material/AccountTree';
-import { getImageUrl } from '../../services/api';
+import { getPreviewUrl } from '../../services/api';
 
 import ModalSlideTransition from '../common/ModalSlideTransition';
 import ModalNavArrow from '../../theme/ModalNavArrow';
@@ -166,7 +166,7 @@ const ImagePreviewModal: React.FC<ImagePreviewModalProps> = ({
       >
         <img
           onClick={e => e.stopPropagation()}
-          src={`${getImageUrl(selectedImage.full_path)}&t=${selectedImage.last_modified || Date.now()}`}
+          src={`${getPreviewUrl(selectedImage.full_path)}&t=${selectedImage.last_modified || Date.now()}`}
           alt={selectedImage.filename}
           style={{
             maxWidth: '100%',
@@ -12,4 +12,8 @@ export const FILE_TYPE_OPTIONS = SUPPORTED_FILE_TYPES.map(type => ({
 
 export const IMAGES_PER_PAGE = 200;
 
-export const DEFAULT_THUMBNAIL_SIZE = 150;
\ No newline at end of file
+export const DEFAULT_THUMBNAIL_SIZE = 150;
+
+// Width buckets the backend snaps /api/thumbnail?width= to (its default
+// GALLERYFLOW_THUMBNAIL_WIDTHS); requesting exactly these keeps one URL per bucket
+export const THUMBNAIL_WIDTHS = [128, 256, 512, 1024, 2048];
@@ -1,7 +1,8 @@
 // File: frontend/src/services/api.ts
 import axios from 'axios';
 import { imageCache } from './cache';
-import type { Image, Folder, ScanProgress } from '../types/index';
+import { thumbnailWidthBucket } from '../utils/fileUtils';
+import type { Image, Folder, ScanJob } from '../types/index';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
@@ -36,10 +37,13 @@ export const deleteFolder = async (folderId: number): Promise<void> => {
     await apiClient.delete(`/folders/${folderId}`);
 };
 
-export const refreshFolder = async (folderId: number): Promise<ScanProgress> => {
+export const refreshFolder = async (folderId: number): Promise<ScanJob> => {
     // Invalidate cache before refresh
     imageCache.invalidate(folderId);
-    const response = await apiClient.post<ScanProgress>(`/folders/${folderId}/scan`);
+    // Wait for the scan job so the caller can reload folders afterwards
+    const response = await apiClient.post<ScanJob>(`/folders/${folderId}/scan`, null, {
+        params: { wait: true },
+    });
     return response.data;
 };
 
@@ -91,12 +95,50 @@ export const getImageUrl = (imagePath: string): string => {
     return `${API_BASE_URL}/image?file_path=${encodeURIComponent(imagePath)}&cache=true`;
 };
 
+// Thumbnail width for the grid: the displayed width in device pixels, snapped
+// to a width bucket so HiDPI screens get sharp thumbnails
+const getThumbnailWidth = (size: 'small' | 'medium'): number => {
+    const cssWidth = size === 'small' ? 150 : 300;
+    return thumbnailWidthBucket(Math.round(cssWidth * (window.devicePixelRatio || 1)));
+};
+
 // Function to get optimized thumbnail URL for faster grid loading
-export const getThumbnailUrl = (imagePath: string, _size: 'small' | 'medium' = 'medium'): string => {
-    // For now, fallback to regular image URL until thumbnails are generated
-    // TODO: Switch back to thumbnail endpoint once database is migrated and uncomment _size parameter
-    return getImageUrl(imagePath);
-    // return `${API_BASE_URL}/thumbnail?file_path=${encodeURIComponent(imagePath)}&size=${_size}`;
+export const getThumbnailUrl = (imagePath: string, size: 'small' | 'medium' = 'medium'): string => {
+    return `${API_BASE_URL}/thumbnail?file_path=${encodeURIComponent(imagePath)}&width=${getThumbnailWidth(size)}`;
+};
+
+// Screen-sized rendition for the image modals, instead of the original
+export const getPreviewUrl = (imagePath: string): string => {
+    return `${API_BASE_URL}/thumbnail?file_path=${encodeURIComponent(imagePath)}&size=preview`;
+};
+
+// Thumbnails of a whole grid page in one request: image id -> object URL of
+// its WebP thumbnail. Images without a thumbnail are left out (getThumbnailUrl
+// falls back to the original); revoke the URLs with URL.revokeObjectURL when
+// the page is left.
+export const getThumbnailPack = async (
+    imageIds: number[],
+    size: 'small' | 'medium' = 'medium'
+): Promise<Map<number, string>> => {
+    const response = await apiClient.get<ArrayBuffer>('/thumbnails', {
+        params: { ids: imageIds.join(','), width: getThumbnailWidth(size) },
+        responseType: 'arraybuffer',
+    });
+    // Entries: image id and length (little-endian uint32), then the WebP bytes
+    const view = new DataView(response.data);
+    const urls = new Map<number, string>();
+    let offset = 0;
+    while (offset + 8 <= view.byteLength) {
+        const imageId = view.getUint32(offset, true);
+        const length = view.getUint32(offset + 4, true);
+        offset += 8;
+        if (length > 0) {
+            const data = new Uint8Array(response.data, offset, length);
+            urls.set(imageId, URL.createObjectURL(new Blob([data], { type: 'image/webp' })));
+        }
+        offset += length;
+    }
+    return urls;
 };
 
 // Function to reveal file in system's file explorer
@@ -106,6 +148,6 @@ export const revealInExplorer = async (filePath: string): Promise<{ message: str
 };
 
 // Add export for Image, Folder, ScanProgress from types
-export type { Image, Folder, ScanProgress } from '../types/index';
+export type { Image, Folder, ScanProgress, ScanJob } from '../types/index';
 
 export default apiClient;
@@ -17,6 +17,18 @@ export interface ScanProgress {
   total_files: number;
 }
 
+export interface ScanJob {
+  id: number;
+  folder_id: number;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+  force_full: boolean;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  error: string | null;
+  result: ScanProgress | null;
+}
+
 export interface Folder {
   id: number;
   path: string;
@@ -29,4 +41,6 @@ export interface Image {
   last_modified: string;
   metadata_: Record<string, unknown> | null;
   folder_id: number;
+  // Base64 WebP of a few pixels, shown scaled up until the thumbnail loads
+  placeholder?: string | null;
 }
\ No newline at end of file
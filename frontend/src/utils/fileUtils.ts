@@ -1,3 +1,5 @@
+import { THUMBNAIL_WIDTHS } from '../constants';
+
 export const getFileExtension = (filename: string): string => {
   const ext = filename.toLowerCase().split('.').pop();
   return ext ? `.${ext}` : '';
@@ -17,10 +19,9 @@ export const isImageFile = (filename: string): boolean => {
   return supportedFormats.includes(ext);
 };
 
-export const generateThumbnailUrl = (path: string, width: number): string => {
-  const encodedPath = encodeURIComponent(path);
-  return `/api/thumbnail?path=${encodedPath}&width=${width}`;
-};
+// Narrowest thumbnail width bucket at least `width` wide (else the widest)
+export const thumbnailWidthBucket = (width: number): number =>
+  THUMBNAIL_WIDTHS.find(bucket => bucket >= width) ?? THUMBNAIL_WIDTHS[THUMBNAIL_WIDTHS.length - 1];
 
 export const copyToClipboard = async (text: string): Promise<boolean> => {
   try {